@@ -7,10 +7,44 @@
 // Flags y variables de control
 uint8_t flag = 0, i, cont = 0;
 unsigned char d;
-char text[64]; // Buffer para mensajes
+char text[160]; // Buffer para mensajes (STATUS completo cabe holgado)
 char cmd_buffer[32]; // Buffer para comandos recibidos
 uint8_t cmd_index = 0;
 
+// Cola de comandos completos: el ISR del USART3 solo recibe y encola, el bucle
+// principal los procesa en orden. Así el host puede enviar varios comandos
+// seguidos sin esperar, y la recepción no se pierde mientras se responde.
+#define CMD_COLA 8
+char cola_cmd[CMD_COLA][32];
+volatile uint8_t cola_cmd_escr = 0;
+volatile uint8_t cola_cmd_leer = 0;
+volatile uint32_t cmd_descartados = 0; // comandos perdidos por cola llena
+
+// Transmisión por DMA1 Stream3 (canal 4 = USART3_TX) desde un buffer circular.
+// Solo el bucle principal escribe en el buffer y el ISR del DMA lo vacía, así
+// ningún ISR espera al USART. La latencia máxima es TX_TAM bytes a la velocidad
+// del enlace; si no hay espacio, el mensaje se descarta entero y se cuenta.
+#define TX_TAM 1024
+uint8_t tx_buf[TX_TAM];
+volatile uint16_t tx_escr = 0;       // próxima posición a escribir
+volatile uint16_t tx_leer = 0;       // inicio de los bytes pendientes de enviar
+volatile uint16_t tx_en_curso = 0;   // bytes de la transferencia DMA activa
+volatile uint32_t tx_desbordes = 0;  // mensajes o muestras descartados (STATUS: TXO)
+
+// Muestras que toman los ISR de los timers; el bucle principal las convierte,
+// filtra y formatea. TIM2 y TIM5 tienen la misma prioridad y no se interrumpen
+// entre sí, así que la cola tiene en la práctica un único productor.
+#define MUESTRAS_COLA 64
+struct Muestra {
+    uint8_t canal;
+    uint16_t raw;
+    uint32_t tick; // tick_ms en el instante de la conversión
+};
+Muestra cola_muestras[MUESTRAS_COLA];
+volatile uint8_t muestras_escr = 0;
+volatile uint8_t muestras_leer = 0;
+volatile uint8_t evento_boton = 0; // 1: el botón cambió la adquisición, falta avisar
+
 // Variables ADC2 - distancia sharp
 volatile uint16_t data_value_adc2;
 volatile float voltaje1;
@@ -24,46 +58,346 @@ volatile double intensidadLuz;
 // Variables para control de tiempos
 uint32_t tiempo1 = 1; // Tiempo de muestreo para ADC2 (distancia sharp)
 uint32_t tiempo2 = 1; // Tiempo de muestreo para ADC1 (intensidad lumínica)
-char time_unit = 's'; // 'm' para ms, 's' para segundos, 'M' para minutos
+char time_unit = 's'; // 'u' para µs, 'm' para ms, 's' para segundos, 'M' para minutos
+uint32_t periodo_us[2] = {1000000, 1000000}; // periodo efectivo por canal (TIM2, TIM5 a 1 MHz)
 
-// Variables para filtro promedio
+// Variables para filtro promedio: media móvil con suma acumulada (O(1) por muestra)
 #define MAX_SAMPLES 50
-float temp_buffer[MAX_SAMPLES];
-float luz_buffer[MAX_SAMPLES];
-uint8_t temp_index = 0;
-uint8_t luz_index = 0;
+struct Promedio {
+    float buffer[MAX_SAMPLES];
+    double suma;    // suma de las muestras válidas del buffer
+    uint8_t indice; // próxima posición a escribir
+    uint8_t llenas; // muestras válidas: hasta completar la ventana no se promedian ceros
+};
+Promedio prom_temp;
+Promedio prom_luz;
 uint8_t temp_samples = 10; // Número de muestras por defecto para distancia sharp
 uint8_t luz_samples = 10; // Número de muestras por defecto para intensidad lumínica
 uint8_t filtro_temp = 0;   // 0: Sin filtro, 1: Con filtro
 uint8_t filtro_luz = 0;   // 0: Sin filtro, 1: Con filtro
 
-// Función para calcular promedio
-float calcularPromedio(float buffer[], uint8_t num_samples) {
-    float sum = 0.0f;
-    for (uint8_t i = 0; i < num_samples; i++) {
-        sum += buffer[i];
-    }
-    return sum / num_samples;
+// Diezmado en el dispositivo (DT/DL): se promedian n conversiones crudas y se
+// transmite un único valor, con el tick del instante central
+#define MAX_DECIM 1000
+struct Diezmado {
+    uint32_t suma_raw;
+    uint16_t cuenta;
+    uint32_t tick_inicio;
+};
+uint16_t decim[2] = {1, 1}; // [CANAL_DISTANCIA, CANAL_LUZ], 1 = sin diezmado
+Diezmado diezmado[2];
+
+// Base de tiempo del dispositivo: SysTick a 1 ms
+volatile uint32_t tick_ms = 0;
+// 1: las muestras en texto llevan ",<tick_ms>" del instante de conversión
+uint8_t enviar_tick = 1;
+
+// Formato de transmisión de muestras: 'A' = texto ASCII, 'B' = tramas binarias
+char formato = 'A';
+
+// Trama binaria (little-endian, 14 bytes):
+// [0xA5][0x5A][canal u8][flags u8][seq u16][tick u32][raw u16][crc u16]
+// El CRC-16/CCITT (poly 0x1021, init 0xFFFF) cubre desde canal hasta raw.
+#define FRAME_SYNC0 0xA5
+#define FRAME_SYNC1 0x5A
+#define FRAME_LEN 14
+#define CANAL_DISTANCIA 0
+#define CANAL_LUZ 1
+uint16_t seq_canal[2] = {0, 0};
+
+// Modo de adquisición: 'S' = muestra a muestra (ISR de TIM2/TIM5 con conversión
+// por software), 'B' = bloques: TRGO de TIM2/TIM5 dispara ADC2/ADC1 por hardware
+// y el DMA2 llena un buffer circular por canal; cada mitad completa (ping-pong
+// con las interrupciones HT/TC) se envía entera como una trama de bloque:
+// [0xA5][0x5B][canal u8][flags u8][seq u16][tick u32][sub_us u16][periodo_us u32]
+// [n u16][raw u16 x n][crc u16]. tick + sub_us/1000 es el instante de la primera
+// muestra en ms; el CRC cubre desde canal hasta la última muestra.
+char modo_adq = 'S';
+#define BLOCK_SYNC1 0x5B
+#define BLOCK_HDR 18
+#define BLOQUE 64 // muestras por mitad del buffer ping-pong
+uint16_t adc_bloque[2][2 * BLOQUE]; // [canal][mitad * BLOQUE + i], escrito por DMA2
+uint16_t seq_bloque[2] = {0, 0};
+struct Bloque {
+    uint8_t canal;
+    uint8_t mitad;
+    uint32_t tick;   // ms de la primera muestra
+    uint16_t sub_us; // fracción en µs
+};
+#define BLOQUES_COLA 8
+Bloque cola_bloques[BLOQUES_COLA];
+volatile uint8_t bloques_escr = 0;
+volatile uint8_t bloques_leer = 0;
+
+// Velocidad del USART3 y negociación (BR:<baudios> + PING de confirmación)
+#define PCLK_HZ 16000000UL
+#define BR_TIMEOUT_MS 2000
+uint32_t baud_rate = 9600;
+volatile uint32_t baud_anterior = 9600;
+volatile uint8_t br_pendiente = 0;   // 1: nueva velocidad sin confirmar por PING
+volatile uint32_t br_limite = 0;     // tick_ms límite para recibir el PING
+
+// Vaciar el filtro (al activarlo o cambiar su número de muestras)
+void reiniciarPromedio(Promedio& p) {
+    p.suma = 0.0;
+    p.indice = 0;
+    p.llenas = 0;
 }
 
-void SysTick_Wait(uint32_t n) {
-    SysTick->LOAD = n - 1;
-    SysTick->VAL = 0; 
-    while (((SysTick->CTRL & 0x00010000) >> 16) == 0); 
+// Añadir una muestra a la media móvil de num_samples y devolver el promedio
+float calcularPromedio(Promedio& p, float x, uint8_t num_samples) {
+    if (p.llenas == num_samples) {
+        p.suma -= p.buffer[p.indice]; // sale la muestra más antigua
+    } else {
+        p.llenas++;
+    }
+    p.buffer[p.indice] = x;
+    p.suma += x;
+    p.indice = (p.indice + 1) % num_samples;
+    if (p.indice == 0) {
+        // Una vez por vuelta se recalcula la suma: sin deriva de redondeo y
+        // un valor no finito sale de la suma al salir de la ventana
+        p.suma = 0.0;
+        for (uint8_t i = 0; i < p.llenas; i++) {
+            p.suma += p.buffer[i];
+        }
+    }
+    return (float)(p.suma / p.llenas);
 }
 
 void SysTick_ms(uint32_t x) {
-    for (uint32_t i = 0; i < x; i++) {
-        SysTick_Wait(16000); // Para un reloj de 16 MHz, esto da 1 ms
+    uint32_t inicio = tick_ms;
+    while ((tick_ms - inicio) < x) {} // tick_ms lo incrementa SysTick_Handler cada 1 ms
+}
+
+// CRC-16/CCITT (poly 0x1021, init 0xFFFF)
+uint16_t crc16_ccitt(const uint8_t* data, uint32_t len) {
+    uint16_t crc = 0xFFFF;
+    for (uint32_t i = 0; i < len; i++) {
+        crc ^= (uint16_t)data[i] << 8;
+        for (uint8_t b = 0; b < 8; b++) {
+            crc = (crc & 0x8000) ? (uint16_t)((crc << 1) ^ 0x1021) : (uint16_t)(crc << 1);
+        }
+    }
+    return crc;
+}
+
+// Lanzar por DMA el tramo contiguo pendiente del buffer de transmisión.
+// Se llama con interrupciones deshabilitadas o desde el ISR del DMA.
+void tx_iniciar_dma(void) {
+    if (tx_en_curso != 0 || tx_leer == tx_escr) return;
+    uint16_t fin = (tx_escr > tx_leer) ? tx_escr : TX_TAM;
+    tx_en_curso = fin - tx_leer;
+    DMA1->LIFCR = (0x3D << 22); // Limpiar flags del stream 3
+    DMA1_Stream3->M0AR = (uint32_t)(uintptr_t)&tx_buf[tx_leer];
+    DMA1_Stream3->NDTR = tx_en_curso;
+    DMA1_Stream3->CR |= (1<<0); // Habilitar stream
+}
+
+// Copiar bytes al buffer de transmisión (solo desde el bucle principal).
+// Devuelve 0 si no caben: se descarta el mensaje completo, nunca a medias.
+uint8_t UART_Send_Bytes(const uint8_t* data, uint32_t len) {
+    uint16_t libre = (tx_leer + TX_TAM - tx_escr - 1) % TX_TAM; // un hueco distingue lleno de vacío
+    if (len > libre) {
+        tx_desbordes++;
+        return 0;
     }
+    uint16_t pos = tx_escr;
+    for (uint32_t i = 0; i < len; i++) {
+        tx_buf[pos] = data[i];
+        pos = (pos + 1) % TX_TAM;
+    }
+    tx_escr = pos;
+    
+    uint32_t primask = __get_PRIMASK();
+    __disable_irq();
+    tx_iniciar_dma();
+    __set_PRIMASK(primask);
+    return 1;
 }
 
 // Función para enviar cadena por UART
 void UART_Send_String(const char* str) {
-    for (uint32_t i = 0; i < strlen(str); i++) {
-        USART3->TDR = str[i];
-        while (((USART3->ISR & 0x80) >> 7) == 0) {} // Esperar a que se complete la transmisión
+    UART_Send_Bytes((const uint8_t*)str, strlen(str));
+}
+
+// Esperar a que el DMA y el USART terminen de enviar todo lo pendiente
+void UART_Flush(void) {
+    while (tx_en_curso != 0 || tx_leer != tx_escr) {}
+    while (((USART3->ISR & (1<<6)) >> 6) == 0) {} // Esperar TC
+}
+
+// Guardar una muestra para el bucle principal (llamado desde TIM2/TIM5)
+void encolar_muestra(uint8_t canal, uint16_t raw, uint32_t tick) {
+    uint8_t siguiente = (muestras_escr + 1) % MUESTRAS_COLA;
+    if (siguiente == muestras_leer) {
+        tx_desbordes++;
+        return;
+    }
+    cola_muestras[muestras_escr].canal = canal;
+    cola_muestras[muestras_escr].raw = raw;
+    cola_muestras[muestras_escr].tick = tick;
+    muestras_escr = siguiente;
+}
+
+// Encolar un comando recibido (llamado desde el ISR del USART3)
+void encolar_comando(const char* cmd) {
+    uint8_t siguiente = (cola_cmd_escr + 1) % CMD_COLA;
+    if (siguiente == cola_cmd_leer) {
+        cmd_descartados++;
+        return;
+    }
+    strcpy(cola_cmd[cola_cmd_escr], cmd);
+    cola_cmd_escr = siguiente;
+}
+
+// Instante actual con resolución de µs: tick_ms más la cuenta de SysTick
+void instante_us(uint32_t* ms, uint16_t* us) {
+    uint32_t t, val;
+    do {
+        t = tick_ms;
+        val = SysTick->VAL;
+    } while (t != tick_ms);
+    *ms = t;
+    *us = (uint16_t)((SysTick->LOAD - val) / 16); // 16 ciclos por µs a 16 MHz
+}
+
+// Registrar una mitad llena del buffer de un canal (llamado desde DMA2)
+void bloque_listo(uint8_t canal, uint8_t mitad) {
+    if (!flag) return; // sin adquisición activa los bloques se descartan
+    uint8_t siguiente = (bloques_escr + 1) % BLOQUES_COLA;
+    if (siguiente == bloques_leer) {
+        tx_desbordes++;
+        return;
+    }
+    // La última conversión del bloque acaba de terminar: retroceder n-1 periodos
+    uint32_t ms;
+    uint16_t us;
+    instante_us(&ms, &us);
+    uint64_t fin = (uint64_t)ms * 1000 + us;
+    uint64_t atras = (uint64_t)(BLOQUE - 1) * periodo_us[canal];
+    uint64_t inicio = (fin > atras) ? fin - atras : 0;
+    cola_bloques[bloques_escr].canal = canal;
+    cola_bloques[bloques_escr].mitad = mitad;
+    cola_bloques[bloques_escr].tick = (uint32_t)(inicio / 1000);
+    cola_bloques[bloques_escr].sub_us = (uint16_t)(inicio % 1000);
+    bloques_escr = siguiente;
+}
+
+// Cambiar la velocidad del USART3 (espera a que salga todo lo pendiente)
+void UART_Set_Baud(uint32_t baudios) {
+    UART_Flush();
+    USART3->CR1 &= ~(1<<0); // Deshabilitar USART
+    USART3->BRR = (PCLK_HZ + baudios / 2) / baudios; // Sobremuestreo x16, redondeado
+    USART3->CR1 |= (1<<0); // Habilitar USART
+    baud_rate = baudios;
+}
+
+// Velocidades aceptadas por BR (BRR >= 16 con PCLK de 16 MHz)
+uint8_t baud_valido(uint32_t baudios) {
+    switch (baudios) {
+        case 9600: case 19200: case 38400: case 57600:
+        case 115200: case 230400: case 460800: case 921600:
+            return 1;
     }
+    return 0;
+}
+
+// Enviar una muestra cruda como trama binaria
+void enviar_trama(uint8_t canal, uint16_t raw, uint32_t tick) {
+    uint8_t trama[FRAME_LEN];
+    uint16_t seq = seq_canal[canal]++;
+    trama[0] = FRAME_SYNC0;
+    trama[1] = FRAME_SYNC1;
+    trama[2] = canal;
+    trama[3] = 0; // flags (reservado)
+    trama[4] = seq & 0xFF;
+    trama[5] = seq >> 8;
+    trama[6] = tick & 0xFF;
+    trama[7] = (tick >> 8) & 0xFF;
+    trama[8] = (tick >> 16) & 0xFF;
+    trama[9] = tick >> 24;
+    trama[10] = raw & 0xFF;
+    trama[11] = raw >> 8;
+    uint16_t crc = crc16_ccitt(&trama[2], 10);
+    trama[12] = crc & 0xFF;
+    trama[13] = crc >> 8;
+    UART_Send_Bytes(trama, FRAME_LEN);
+}
+
+// Enviar una mitad del buffer DMA de un canal como trama de bloque
+void enviar_bloque(const Bloque& b) {
+    uint8_t trama[BLOCK_HDR + 2 * BLOQUE + 2];
+    uint16_t seq = seq_bloque[b.canal]++;
+    uint32_t periodo = periodo_us[b.canal];
+    trama[0] = FRAME_SYNC0;
+    trama[1] = BLOCK_SYNC1;
+    trama[2] = b.canal;
+    trama[3] = 0; // flags (reservado)
+    trama[4] = seq & 0xFF;
+    trama[5] = seq >> 8;
+    trama[6] = b.tick & 0xFF;
+    trama[7] = (b.tick >> 8) & 0xFF;
+    trama[8] = (b.tick >> 16) & 0xFF;
+    trama[9] = b.tick >> 24;
+    trama[10] = b.sub_us & 0xFF;
+    trama[11] = b.sub_us >> 8;
+    trama[12] = periodo & 0xFF;
+    trama[13] = (periodo >> 8) & 0xFF;
+    trama[14] = (periodo >> 16) & 0xFF;
+    trama[15] = periodo >> 24;
+    trama[16] = BLOQUE & 0xFF;
+    trama[17] = BLOQUE >> 8;
+    memcpy(&trama[BLOCK_HDR], &adc_bloque[b.canal][b.mitad * BLOQUE], 2 * BLOQUE); // Cortex-M: little-endian
+    uint16_t crc = crc16_ccitt(&trama[2], BLOCK_HDR - 2 + 2 * BLOQUE);
+    trama[BLOCK_HDR + 2 * BLOQUE] = crc & 0xFF;
+    trama[BLOCK_HDR + 2 * BLOQUE + 1] = crc >> 8;
+    UART_Send_Bytes(trama, sizeof(trama));
+}
+
+// Cambiar entre muestra a muestra ('S') y bloques por DMA ('B')
+void configurar_adquisicion(char modo) {
+    // Parar streams, disparo externo del ADC y TRGO antes de reconfigurar
+    DMA2_Stream0->CR &= ~(1<<0);
+    DMA2_Stream2->CR &= ~(1<<0);
+    while ((DMA2_Stream0->CR & (1<<0)) || (DMA2_Stream2->CR & (1<<0))) {}
+    ADC1->CR2 &= ~((0b11<<28) | (0b1111<<24) | (1<<9) | (1<<8)); // EXTEN, EXTSEL, DDS, DMA
+    ADC2->CR2 &= ~((0b11<<28) | (0b1111<<24) | (1<<9) | (1<<8));
+    TIM2->CR2 &= ~(0b111<<4); // MMS
+    TIM5->CR2 &= ~(0b111<<4);
+    bloques_leer = bloques_escr; // descartar bloques pendientes del modo anterior
+    
+    if (modo == 'B') {
+        TIM2->DIER &= ~(1<<0); // Sin interrupción por muestra
+        TIM5->DIER &= ~(1<<0);
+        TIM2->CR2 |= (0b010<<4); // TRGO = update
+        TIM5->CR2 |= (0b010<<4);
+        
+        // DMA2 Stream2 canal 1: ADC2 (distancia) -> adc_bloque[CANAL_DISTANCIA]
+        DMA2->LIFCR = (0x3D << 16);
+        DMA2_Stream2->PAR = (uint32_t)(uintptr_t)&ADC2->DR;
+        DMA2_Stream2->M0AR = (uint32_t)(uintptr_t)adc_bloque[CANAL_DISTANCIA];
+        DMA2_Stream2->NDTR = 2 * BLOQUE;
+        // Canal 1, 16 bits periférico/memoria, MINC, circular, HTIE, TCIE
+        DMA2_Stream2->CR = (1UL<<25) | (0b01<<13) | (0b01<<11) | (1<<10) | (1<<8) | (1<<4) | (1<<3);
+        DMA2_Stream2->CR |= (1<<0);
+        
+        // DMA2 Stream0 canal 0: ADC1 (luz) -> adc_bloque[CANAL_LUZ]
+        DMA2->LIFCR = (0x3D << 0);
+        DMA2_Stream0->PAR = (uint32_t)(uintptr_t)&ADC1->DR;
+        DMA2_Stream0->M0AR = (uint32_t)(uintptr_t)adc_bloque[CANAL_LUZ];
+        DMA2_Stream0->NDTR = 2 * BLOQUE;
+        DMA2_Stream0->CR = (0UL<<25) | (0b01<<13) | (0b01<<11) | (1<<10) | (1<<8) | (1<<4) | (1<<3);
+        DMA2_Stream0->CR |= (1<<0);
+        
+        // Disparo por flanco de subida: ADC2 <- TIM2_TRGO (1011), ADC1 <- TIM5_TRGO (0100)
+        ADC2->CR2 |= (0b01<<28) | (0b1011<<24) | (1<<9) | (1<<8);
+        ADC1->CR2 |= (0b01<<28) | (0b0100<<24) | (1<<9) | (1<<8);
+    } else {
+        TIM2->DIER |= (1<<0);
+        TIM5->DIER |= (1<<0);
+    }
+    modo_adq = modo;
 }
 
 // Función para procesar los comandos recibidos por UART
@@ -78,8 +412,9 @@ void procesar_comando(const char* cmd) {
     
     // Manejo especial para el comando STATUS que no requiere valor
     if (strcmp(tipo, "STATUS") == 0) {
-        sprintf(text, "INFO:STATUS:T1=%lu,T2=%lu,TU=%c,FT=%d,FL=%d,ST=%d,SL=%d,RUN=%d\r\n", 
-                tiempo1, tiempo2, time_unit, filtro_temp, filtro_luz, temp_samples, luz_samples, flag);
+        sprintf(text, "INFO:STATUS:T1=%lu,T2=%lu,TU=%c,FT=%d,FL=%d,ST=%d,SL=%d,RUN=%d,FMT=%c,BR=%lu,TS=%d,TXO=%lu,ACQ=%c,DT=%d,DL=%d\r\n", 
+                tiempo1, tiempo2, time_unit, filtro_temp, filtro_luz, temp_samples, luz_samples, flag, formato, baud_rate, enviar_tick, tx_desbordes, modo_adq,
+                decim[CANAL_DISTANCIA], decim[CANAL_LUZ]);
         UART_Send_String(text);
         return;
     }
@@ -101,7 +436,7 @@ void procesar_comando(const char* cmd) {
     
     // Para el resto de comandos, validar que tengan valor
     if (valor == NULL) {
-        sprintf(text, "ERROR:Valor requerido para %s\r\n", tipo);
+        sprintf(text, "ERROR:%s:Valor requerido\r\n", tipo);
         UART_Send_String(text);
         return;
     }
@@ -132,8 +467,8 @@ void procesar_comando(const char* cmd) {
             UART_Send_String(text);
         }
     } else if (strcmp(tipo, "TU") == 0) {
-        // Cambiar unidad de tiempo (m, s, M)
-        if (valor[0] == 'm' || valor[0] == 's' || valor[0] == 'M') {
+        // Cambiar unidad de tiempo (u, m, s, M)
+        if (valor[0] == 'u' || valor[0] == 'm' || valor[0] == 's' || valor[0] == 'M') {
             time_unit = valor[0];
             sprintf(text, "OK:TU:%c\r\n", time_unit);
             UART_Send_String(text);
@@ -145,11 +480,13 @@ void procesar_comando(const char* cmd) {
     } else if (strcmp(tipo, "FT") == 0) {
         // Filtro distancia sharp (0=off, 1=on)
         filtro_temp = (atoi(valor) == 0) ? 0 : 1;
+        reiniciarPromedio(prom_temp);
         sprintf(text, "OK:FT:%d\r\n", filtro_temp);
         UART_Send_String(text);
     } else if (strcmp(tipo, "FL") == 0) {
         // Filtro intensidad lumínica (0=off, 1=on)
         filtro_luz = (atoi(valor) == 0) ? 0 : 1;
+        reiniciarPromedio(prom_luz);
         sprintf(text, "OK:FL:%d\r\n", filtro_luz);
         UART_Send_String(text);
     } else if (strcmp(tipo, "ST") == 0) {
@@ -157,6 +494,7 @@ void procesar_comando(const char* cmd) {
         int val = atoi(valor);
         if (val > 0 && val <= MAX_SAMPLES) {
             temp_samples = val;
+            reiniciarPromedio(prom_temp); // el índice actual puede quedar fuera de la nueva ventana
             sprintf(text, "OK:ST:%d\r\n", temp_samples);
             UART_Send_String(text);
         }
@@ -165,31 +503,100 @@ void procesar_comando(const char* cmd) {
         int val = atoi(valor);
         if (val > 0 && val <= MAX_SAMPLES) {
             luz_samples = val;
+            reiniciarPromedio(prom_luz);
             sprintf(text, "OK:SL:%d\r\n", luz_samples);
             UART_Send_String(text);
         }
+    } else if (strcmp(tipo, "DT") == 0 || strcmp(tipo, "DL") == 0) {
+        // Diezmado: promediar n conversiones y enviar un solo valor
+        uint8_t canal = (tipo[1] == 'T') ? CANAL_DISTANCIA : CANAL_LUZ;
+        int val = atoi(valor);
+        if (val > 0 && val <= MAX_DECIM) {
+            decim[canal] = val;
+            diezmado[canal].suma_raw = 0;
+            diezmado[canal].cuenta = 0;
+            sprintf(text, "OK:%s:%d\r\n", tipo, val);
+        } else {
+            sprintf(text, "ERROR:%s:Fuera de rango (1-%d)\r\n", tipo, MAX_DECIM);
+        }
+        UART_Send_String(text);
+    } else if (strcmp(tipo, "BR") == 0) {
+        // Cambio de velocidad: se confirma a la velocidad actual, se cambia y
+        // el host debe enviar PING a la nueva velocidad antes de BR_TIMEOUT_MS;
+        // si no llega, el bucle principal vuelve a la velocidad anterior.
+        uint32_t val = strtoul(valor, NULL, 10);
+        if (baud_valido(val)) {
+            sprintf(text, "OK:BR:%lu\r\n", val);
+            UART_Send_String(text);
+            if (!br_pendiente) {
+                baud_anterior = baud_rate;
+            }
+            UART_Set_Baud(val);
+            br_limite = tick_ms + BR_TIMEOUT_MS;
+            br_pendiente = 1;
+        } else {
+            sprintf(text, "ERROR:BR:Baudios no soportados: %s\r\n", valor);
+            UART_Send_String(text);
+        }
+    } else if (strcmp(tipo, "PING") == 0) {
+        // Eco para la prueba de ida y vuelta; confirma un cambio de velocidad
+        br_pendiente = 0;
+        sprintf(text, "OK:PING:%.24s\r\n", valor);
+        UART_Send_String(text);
+    } else if (strcmp(tipo, "TS") == 0) {
+        // Tick del dispositivo en las muestras de texto (0=off, 1=on)
+        int val = atoi(valor);
+        if (val == 0 || val == 1) {
+            enviar_tick = val;
+            sprintf(text, "OK:TS:%d\r\n", val);
+        } else {
+            sprintf(text, "ERROR:TS:Valor invalido: %s\r\n", valor);
+        }
+        UART_Send_String(text);
+    } else if (strcmp(tipo, "ACQ") == 0) {
+        // Modo de adquisición: S = muestra a muestra, B = bloques por DMA
+        if (valor[0] == 'S' || valor[0] == 'B') {
+            configurar_adquisicion(valor[0]);
+            sprintf(text, "OK:ACQ:%c\r\n", modo_adq);
+        } else {
+            sprintf(text, "ERROR:ACQ:Modo de adquisicion invalido: %s\r\n", valor);
+        }
+        UART_Send_String(text);
+    } else if (strcmp(tipo, "FMT") == 0) {
+        // Formato de muestras: A = texto, B = tramas binarias
+        if (valor[0] == 'A' || valor[0] == 'B') {
+            // La confirmación sale en texto, antes de cambiar de formato
+            sprintf(text, "OK:FMT:%c\r\n", valor[0]);
+            UART_Send_String(text);
+            if (formato != valor[0]) {
+                seq_canal[CANAL_DISTANCIA] = 0;
+                seq_canal[CANAL_LUZ] = 0;
+            }
+            formato = valor[0];
+        } else {
+            sprintf(text, "ERROR:FMT:Formato invalido: %s\r\n", valor);
+            UART_Send_String(text);
+        }
     } else {
         // Comando desconocido
-        sprintf(text, "ERROR:Comando desconocido: %s\r\n", tipo);
+        sprintf(text, "ERROR:%s:Comando desconocido\r\n", tipo);
         UART_Send_String(text);
     }
 }
 
 extern "C" {
+    // Interrupción de SysTick - base de tiempo de 1 ms
+    void SysTick_Handler(void) {
+        tick_ms++;
+    }
+
     // Interrupción del botón de usuario
     void EXTI15_10_IRQHandler(void) {
         EXTI->PR |= (1<<13); // Limpiar flag de interrupción para EXTI13
         if (((GPIOC->IDR & (1<<13)) >> 13) == 1) {
-            // Cambiar estado de adquisición
+            // Cambiar estado de adquisición; el aviso sale desde el bucle principal
             flag = !flag;
-            
-            // Notificar cambio
-            if (flag) {
-                sprintf(text, "INFO:Button pressed - acquisition started\r\n");
-            } else {
-                sprintf(text, "INFO:Button pressed - acquisition stopped\r\n");
-            }
-            UART_Send_String(text);
+            evento_boton = 1;
         }
     }
 
@@ -204,19 +611,7 @@ extern "C" {
             while (((ADC2->SR & (1<<1)) >> 1) == 0) {} // Esperar a que termine la conversión
             ADC2->SR &= ~(1<<1); // Limpiar el flag EOC
             data_value_adc2 = ADC2->DR;
-            voltaje2 = (float)data_value_adc2 * (3.3f / 4095.0f); // Corrección para resolución completa de 12 bits
-            distancesharp=25.63f*pow(voltaje2, -1.268f); // Conversión a distancia en cm
-            
-            // Aplicar filtro promedio si está activado
-            if (filtro_temp) {
-                temp_buffer[temp_index] = distancesharp;
-                temp_index = (temp_index + 1) % temp_samples;
-                distancesharp = calcularPromedio(temp_buffer, temp_samples);
-            }
-            
-            // Enviar datos formateados por UART
-            sprintf(text, "TEMP:%.2f\r\n", distancesharp);
-            UART_Send_String(text);
+            encolar_muestra(CANAL_DISTANCIA, data_value_adc2, tick_ms);
             
             // Toggle LED PB7 para indicar actividad de muestreo
             GPIOB->ODR ^= (1<<7);
@@ -234,44 +629,57 @@ extern "C" {
             while (((ADC1->SR & (1<<1)) >> 1) == 0) {} // Esperar a que termine la conversión
             ADC1->SR &= ~(1<<1); // Limpiar el flag EOC
             data_value_adc1 = ADC1->DR;
-            voltaje1 = data_value_adc1 * (3.3 / 990); // Corrección para resolución completa de 10 bits
-            intensidadLuz = (3.3-voltaje1) /0.03; // Conversión a lux (ajustar según la fórmula real)
-            
-            // Aplicar filtro promedio si está activado
-            if (filtro_luz) {
-                luz_buffer[luz_index] = intensidadLuz;
-                luz_index = (luz_index + 1) % luz_samples;
-                intensidadLuz = calcularPromedio(luz_buffer, luz_samples);
-            }
-            
-            // Enviar datos formateados por UART
-            sprintf(text, "intensidad lumínica:%.2f\r\n", intensidadLuz);
-            UART_Send_String(text);
+            encolar_muestra(CANAL_LUZ, data_value_adc1, tick_ms);
+        }
+    }
+    
+    // Interrupción del DMA2 Stream0 - ADC1 (luz) en modo bloques
+    void DMA2_Stream0_IRQHandler(void) {
+        uint32_t isr = DMA2->LISR;
+        DMA2->LIFCR = (0x3D << 0);
+        if (isr & (1<<4)) bloque_listo(CANAL_LUZ, 0); // HTIF0: primera mitad llena
+        if (isr & (1<<5)) bloque_listo(CANAL_LUZ, 1); // TCIF0: segunda mitad llena
+    }
+    
+    // Interrupción del DMA2 Stream2 - ADC2 (distancia) en modo bloques
+    void DMA2_Stream2_IRQHandler(void) {
+        uint32_t isr = DMA2->LISR;
+        DMA2->LIFCR = (0x3D << 16);
+        if (isr & (1<<20)) bloque_listo(CANAL_DISTANCIA, 0); // HTIF2
+        if (isr & (1<<21)) bloque_listo(CANAL_DISTANCIA, 1); // TCIF2
+    }
+    
+    // Interrupción del DMA1 Stream3 - fin de un tramo de transmisión
+    void DMA1_Stream3_IRQHandler(void) {
+        // TCIF3 (fin) o TEIF3 (error): el tramo se da por enviado y sigue el resto
+        if (DMA1->LISR & ((1<<27) | (1<<25))) {
+            DMA1->LIFCR = (0x3D << 22);
+            tx_leer = (tx_leer + tx_en_curso) % TX_TAM;
+            tx_en_curso = 0;
+            tx_iniciar_dma();
         }
     }
     
     // Interrupción del USART3 - Recepción de comandos
     void USART3_IRQHandler(void) { 
+        // Overrun: limpiar ORE para que la recepción continúe
+        if (((USART3->ISR & (1<<3)) >> 3) == 1) {
+            USART3->ICR = (1<<3);
+        }
         if (((USART3->ISR & 0x20) >> 5) == 1) { // Comprobar RXNE flag
             d = USART3->RDR;
             
             if (d == 'a') {
-                flag = 1; // Comando para iniciar
-                // Enviar confirmación explícita
-                UART_Send_String("OK:a\r\n");
-                // Debug - confirmar activación
-                UART_Send_String("DEBUG:Adquisicion activada\r\n");
+                flag = 1; // Comando para iniciar (la confirmación sale desde el bucle principal)
+                encolar_comando("a");
             } else if (d == 'b') {
                 flag = 0; // Comando para detener
-                // Enviar confirmación explícita
-                UART_Send_String("OK:b\r\n");
-                // Debug - confirmar desactivación
-                UART_Send_String("DEBUG:Adquisicion detenida\r\n");
+                encolar_comando("b");
             } else if (d == '\n' || d == '\r') {
-                // Fin de comando, procesarlo
+                // Fin de comando, encolarlo para el bucle principal
                 if (cmd_index > 0) {
                     cmd_buffer[cmd_index] = '\0';
-                    procesar_comando(cmd_buffer);
+                    encolar_comando(cmd_buffer);
                     cmd_index = 0;
                 }
             } else {
@@ -284,11 +692,121 @@ extern "C" {
     }
 }
 
+// Diezmar, convertir, filtrar y transmitir una muestra tomada por TIM2/TIM5
+void procesar_muestra(const Muestra& m) {
+    uint16_t raw = m.raw;
+    uint32_t tick = m.tick;
+    if (decim[m.canal] > 1) {
+        // Acumular hasta n conversiones; solo la media sigue adelante
+        Diezmado& dz = diezmado[m.canal];
+        if (dz.cuenta == 0) {
+            dz.tick_inicio = m.tick;
+        }
+        dz.suma_raw += m.raw;
+        dz.cuenta++;
+        if (dz.cuenta < decim[m.canal]) return;
+        raw = (dz.suma_raw + dz.cuenta / 2) / dz.cuenta;
+        tick = dz.tick_inicio + (m.tick - dz.tick_inicio) / 2;
+        dz.suma_raw = 0;
+        dz.cuenta = 0;
+    }
+    
+    // Modo binario: se envía la conversión cruda; el host aplica la fórmula
+    if (formato == 'B') {
+        enviar_trama(m.canal, raw, tick);
+        return;
+    }
+    
+    if (m.canal == CANAL_DISTANCIA) {
+        voltaje2 = (float)raw * (3.3f / 4095.0f); // Corrección para resolución completa de 12 bits
+        distancesharp=25.63f*pow(voltaje2, -1.268f); // Conversión a distancia en cm
+        
+        // Aplicar filtro promedio si está activado
+        if (filtro_temp) {
+            distancesharp = calcularPromedio(prom_temp, distancesharp, temp_samples);
+        }
+        
+        if (enviar_tick) {
+            sprintf(text, "TEMP:%.2f,%lu\r\n", distancesharp, tick);
+        } else {
+            sprintf(text, "TEMP:%.2f\r\n", distancesharp);
+        }
+    } else {
+        voltaje1 = raw * (3.3 / 990); // Corrección para resolución completa de 10 bits
+        intensidadLuz = (3.3-voltaje1) /0.03; // Conversión a lux (ajustar según la fórmula real)
+        
+        // Aplicar filtro promedio si está activado
+        if (filtro_luz) {
+            intensidadLuz = calcularPromedio(prom_luz, intensidadLuz, luz_samples);
+        }
+        
+        if (enviar_tick) {
+            sprintf(text, "intensidad lumínica:%.2f,%lu\r\n", intensidadLuz, tick);
+        } else {
+            sprintf(text, "intensidad lumínica:%.2f\r\n", intensidadLuz);
+        }
+    }
+    UART_Send_String(text);
+}
+
+// Actualizar periodos de muestreo de timers (solo si han cambiado)
+void actualizar_timers(void) {
+    // TIM2/TIM5 cuentan a 1 MHz: periodo en µs, limitado a 32 bits (~71 min)
+    uint64_t factor = 1000;
+    
+    switch (time_unit) {
+        case 'u': // microsegundos
+            factor = 1;
+            break;
+        case 'm': // milisegundos
+            factor = 1000;
+            break;
+        case 's': // segundos
+            factor = 1000000;
+            break;
+        case 'M': // minutos
+            factor = 60000000;
+            break;
+    }
+    
+    uint64_t p1 = tiempo1 * factor;
+    uint64_t p2 = tiempo2 * factor;
+    periodo_us[CANAL_DISTANCIA] = (p1 < 1) ? 1 : (p1 > 0xFFFFFFFFULL) ? 0xFFFFFFFFUL : (uint32_t)p1;
+    periodo_us[CANAL_LUZ] = (p2 < 1) ? 1 : (p2 > 0xFFFFFFFFULL) ? 0xFFFFFFFFUL : (uint32_t)p2;
+    uint32_t arr_value1 = periodo_us[CANAL_DISTANCIA] - 1; // update cada ARR+1 cuentas
+    uint32_t arr_value2 = periodo_us[CANAL_LUZ] - 1;
+    
+    // Actualizar periodos de los timers solo si han cambiado
+    if (TIM2->ARR != arr_value1) {
+        TIM2->CR1 &= ~(1<<0); // Deshabilitar timer
+        TIM2->ARR = arr_value1;
+        TIM2->CNT = 0; // Reiniciar contador
+        TIM2->CR1 |= (1<<0); // Habilitar timer
+        
+        // Informar del cambio
+        sprintf(text, "INFO:Timer temp actualizado: %lu us\r\n", periodo_us[CANAL_DISTANCIA]);
+        UART_Send_String(text);
+    }
+    
+    if (TIM5->ARR != arr_value2) {
+        TIM5->CR1 &= ~(1<<0); // Deshabilitar timer
+        TIM5->ARR = arr_value2;
+        TIM5->CNT = 0; // Reiniciar contador
+        TIM5->CR1 |= (1<<0); // Habilitar timer
+        
+        // Informar del cambio
+        sprintf(text, "INFO:Timer intensidad lumínica actualizado: %lu us\r\n", periodo_us[CANAL_LUZ]);
+        UART_Send_String(text);
+    }
+}
+
 int main() {
-    // Inicializar buffers para filtros
-    for (int i = 0; i < MAX_SAMPLES; i++) {
-        temp_buffer[i] = 0.0f;
-        luz_buffer[i] = 0.0f;
+    // Inicializar filtros y diezmado
+    reiniciarPromedio(prom_temp);
+    reiniciarPromedio(prom_luz);
+    for (int i = 0; i < 2; i++) {
+        diezmado[i].suma_raw = 0;
+        diezmado[i].cuenta = 0;
     }
     
     // ----- Configuración de GPIOs -----
@@ -308,8 +826,9 @@ int main() {
     GPIOC->PUPDR |= (1<<27); // Pull-up
     
     // ----- Configuración de SysTick -----
-    SysTick->LOAD = 0x00FFFFFF; 
-    SysTick->CTRL |= (0b101); // Habilitar SysTick
+    SysTick->LOAD = 16000 - 1; // 1 ms a 16 MHz
+    SysTick->VAL = 0;
+    SysTick->CTRL |= (0b111); // Reloj del procesador, interrupción y habilitar
     
     // ----- Configuración de interrupciones externas -----
     RCC->APB2ENR |= (1<<14); // Habilitar reloj SYSCFG
@@ -333,12 +852,22 @@ int main() {
     RCC->APB1ENR |= (1<<18); // Habilitar reloj USART3
     
     // Configurar USART3
-    USART3->BRR = 0x683; // 9600 baud a 16MHz
+    USART3->BRR = (PCLK_HZ + baud_rate / 2) / baud_rate; // 9600 baud a 16MHz (0x683)
     USART3->CR1 |= ((1<<5) | (1<<3) | (1<<2) | (1<<0)); // Habilitar RX, TX, RXNEIE y enable
     
     // Habilitar interrupción USART3 en NVIC
     NVIC_EnableIRQ(USART3_IRQn); 
     
+    // ----- Configuración de DMA1 Stream3 (canal 4 = USART3_TX) -----
+    // La D-cache no se habilita, así que el DMA lee tx_buf directamente de SRAM
+    RCC->AHB1ENR |= (1<<21); // Habilitar reloj DMA1
+    DMA1_Stream3->CR &= ~(1<<0); // Deshabilitar stream antes de configurarlo
+    while (DMA1_Stream3->CR & (1<<0)) {}
+    DMA1_Stream3->PAR = (uint32_t)(uintptr_t)&USART3->TDR;
+    DMA1_Stream3->CR = (4UL<<25) | (1<<10) | (0b01<<6) | (1<<4) | (1<<2); // Canal 4, MINC, memoria->periférico, TCIE, TEIE
+    USART3->CR3 |= (1<<7); // DMAT: el USART pide bytes al DMA
+    NVIC_EnableIRQ(DMA1_Stream3_IRQn);
+    
     // ----- Configuración de ADC2 para PB1 (distancia) -----
     GPIOB->MODER |= (0b11<<2); // PB1 como entrada analógica
     
@@ -360,8 +889,8 @@ int main() {
     
     // ----- Configuración de Timer 2 para muestreo de distancia -----
     RCC->APB1ENR |= (1<<0); // Habilitar reloj TIM2
-    TIM2->PSC = 16000 - 1; // Prescaler para 1ms a 16MHz
-    TIM2->ARR = 1000; // Periodo inicial (1s)
+    TIM2->PSC = 16 - 1; // Prescaler para 1 µs a 16MHz (TIM2/TIM5 son de 32 bits)
+    TIM2->ARR = 1000000 - 1; // Periodo inicial (1s)
     TIM2->DIER |= (1<<0); // Habilitar interrupción de update
     TIM2->CR1 |= (1<<0); // Habilitar contador
     
@@ -370,73 +899,77 @@ int main() {
     
     // ----- Configuración de Timer 5 para muestreo de intensidad lumínica -----
     RCC->APB1ENR |= (1<<3); // Habilitar reloj TIM5
-    TIM5->PSC = 16000 - 1; // Prescaler para 1ms a 16MHz
-    TIM5->ARR = 1000; // Periodo inicial (1s)
+    TIM5->PSC = 16 - 1; // Prescaler para 1 µs a 16MHz (TIM2/TIM5 son de 32 bits)
+    TIM5->ARR = 1000000 - 1; // Periodo inicial (1s)
     TIM5->DIER |= (1<<0); // Habilitar interrupción de update
     TIM5->CR1 |= (1<<0); // Habilitar contador
     
     // Habilitar interrupción TIM5 en NVIC
     NVIC_EnableIRQ(TIM5_IRQn); 
     
+    // ----- DMA2 para el modo de adquisición por bloques (ACQ:B) -----
+    RCC->AHB1ENR |= (1<<22); // Habilitar reloj DMA2
+    NVIC_EnableIRQ(DMA2_Stream0_IRQn);
+    NVIC_EnableIRQ(DMA2_Stream2_IRQn);
+    
     // Mensaje de inicio
     UART_Send_String("Sistema iniciado v3.0\r\n");
     UART_Send_String("Enviar 'a' para iniciar, 'b' para detener\r\n");
-    UART_Send_String("Comandos: T1:tiempo, T2:tiempo, TU:[m,s,M], FT:[0,1], FL:[0,1], ST:muestras, SL:muestras\r\n");
+    UART_Send_String("Comandos: T1:tiempo, T2:tiempo, TU:[u,m,s,M], FT:[0,1], FL:[0,1], ST:muestras, SL:muestras, DT:n, DL:n, FMT:[A,B], BR:baudios, PING:dato, TS:[0,1], ACQ:[S,B]\r\n");
+    
+    actualizar_timers();
+    uint32_t ultimo_led = tick_ms;
     
     // Bucle principal
     while(1) {
-        // Actualizar periodos de muestreo de timers
-        uint32_t factor = 1;
-        
-        switch (time_unit) {
-            case 'm': // milisegundos
-                factor = 1;
-                break;
-            case 's': // segundos
-                factor = 1000;
-                break;
-            case 'M': // minutos
-                factor = 60000;
-                break;
+        // Comandos pendientes: respuestas en orden de llegada
+        if (cola_cmd_leer != cola_cmd_escr) {
+            while (cola_cmd_leer != cola_cmd_escr) {
+                procesar_comando(cola_cmd[cola_cmd_leer]);
+                cola_cmd_leer = (cola_cmd_leer + 1) % CMD_COLA;
+            }
+            actualizar_timers();
         }
         
-        uint32_t arr_value1 = tiempo1 * factor;
-        if (arr_value1 < 1) arr_value1 = 1;
+        // Muestras pendientes de los timers
+        while (muestras_leer != muestras_escr) {
+            procesar_muestra(cola_muestras[muestras_leer]);
+            muestras_leer = (muestras_leer + 1) % MUESTRAS_COLA;
+        }
         
-        uint32_t arr_value2 = tiempo2 * factor;
-        if (arr_value2 < 1) arr_value2 = 1;
+        // Bloques DMA completos: se envían crudos, sin conversión ni filtro
+        while (bloques_leer != bloques_escr) {
+            enviar_bloque(cola_bloques[bloques_leer]);
+            bloques_leer = (bloques_leer + 1) % BLOQUES_COLA;
+            GPIOB->ODR ^= (1<<7); // LED PB7: actividad por bloque
+        }
         
-        // Actualizar periodos de los timers solo si han cambiado
-        if (TIM2->ARR != arr_value1) {
-            TIM2->CR1 &= ~(1<<0); // Deshabilitar timer
-            TIM2->ARR = arr_value1;
-            TIM2->CNT = 0; // Reiniciar contador
-            TIM2->CR1 |= (1<<0); // Habilitar timer
-            
-            // Informar del cambio
-            sprintf(text, "INFO:Timer temp actualizado: %lu ms\r\n", arr_value1);
-            UART_Send_String(text);
+        if (evento_boton) {
+            evento_boton = 0;
+            if (flag) {
+                UART_Send_String("INFO:Button pressed - acquisition started\r\n");
+            } else {
+                UART_Send_String("INFO:Button pressed - acquisition stopped\r\n");
+            }
         }
         
-        if (TIM5->ARR != arr_value2) {
-            TIM5->CR1 &= ~(1<<0); // Deshabilitar timer
-            TIM5->ARR = arr_value2;
-            TIM5->CNT = 0; // Reiniciar contador
-            TIM5->CR1 |= (1<<0); // Habilitar timer
-            
-            // Informar del cambio
-            sprintf(text, "INFO:Timer intensidad lumínica actualizado: %lu ms\r\n", arr_value2);
+        // Cambio de velocidad sin PING de confirmación: volver a la anterior
+        if (br_pendiente && (int32_t)(tick_ms - br_limite) > 0) {
+            br_pendiente = 0;
+            UART_Set_Baud(baud_anterior);
+            sprintf(text, "INFO:BR revertido a %lu\r\n", baud_rate);
             UART_Send_String(text);
         }
         
+        // LED PB0: parpadea cada 500 ms en adquisición, apagado en reposo.
+        // Sin esperas bloqueantes para atender los comandos al momento.
         if (flag == 1) {
-            // Modo de adquisición activo - LED PB0 parpadea
-            GPIOB->ODR ^= (1<<0);
-            SysTick_ms(500);
+            if ((tick_ms - ultimo_led) >= 500) {
+                GPIOB->ODR ^= (1<<0);
+                ultimo_led = tick_ms;
+            }
         } else {
-            // Modo inactivo - LED PB0 apagado
             GPIOB->ODR &= ~(1<<0);
-            SysTick_ms(200);
         }
     }
 }
\ No newline at end of file
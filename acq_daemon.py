@@ -0,0 +1,335 @@
+"""Headless acquisition daemon: STM32 serial stream to session files, without Qt or matplotlib.
+
+    python acq_daemon.py --port /dev/ttyACM0 --unit m --t1 1 --t2 1 --fmt B --baud auto
+    python acq_daemon.py --port /tmp/stm32 --rotate 3600 --keep 48 --stats 10
+
+Uses the GUI's ingest path unchanged: SerialReader (blocking bulk reads,
+the same ASCII/binary parsers and clock mapping), CommandChannel and
+SessionRecorder. On every connect it negotiates the baud rate, pushes the
+configuration (TU, T1, T2, filters, decimation, format, acquisition mode)
+and starts the board; if the port disappears or goes silent it reconnects
+with backoff and pushes the configuration again. Recording rotates to a
+new session directory by age or size.
+"""
+import argparse
+import os
+import shutil
+import signal
+import threading
+import time
+
+import serial
+
+from command_channel import CommandChannel, gather
+from metrics import MetricsRegistry, append_report
+from recorder import SessionRecorder, new_session_dir
+from serial_ingest import SerialReader
+from serial_link import STANDARD_BAUD_RATES, detect_baud_rate, negotiate_baud_rate, try_baud_rate
+
+# Segundos por unidad de TU, para el vigilante de silencio
+UNIT_SECONDS = {"u": 1e-6, "m": 1e-3, "s": 1.0, "M": 60.0}
+
+MAX_BACKOFF_S = 30.0   # espera máxima entre intentos de reconexión
+CONFIG_TIMEOUT_S = 5.0  # respuestas a la configuración enviada al conectar
+
+
+class SampleCounter:
+    """Stand-in for the GUI's ingest queue: counts samples instead of keeping batches.
+
+    SerialReader only calls ``put``; the samples themselves reach disk
+    through the recorder, so nothing accumulates in memory.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.dropped = 0
+        self.last_data = time.monotonic()  # última muestra recibida
+
+    def put(self, batch):
+        if batch.channels:
+            for name, (times, _) in batch.channels.items():
+                self.metrics.count(f"samples.{name}", len(times))
+            self.last_data = time.monotonic()
+        return True
+
+
+def config_commands(unit="m", t1=1, t2=1, ft=0, fl=0, st=10, sl=10, dt=1, dl=1, fmt="A", acq="S"):
+    """Commands pushed on connect, in the order the GUI's Sincronizar sends them."""
+    return [f"TU:{unit}", f"T1:{t1}", f"T2:{t2}", f"FT:{ft}", f"FL:{fl}", f"ST:{st}", f"SL:{sl}",
+            f"DT:{dt}", f"DL:{dl}", f"FMT:{fmt}", f"ACQ:{acq}"]
+
+
+def unique_session_dir(root):
+    """new_session_dir(), with a suffix if a rotation lands in the same second."""
+    path = base = new_session_dir(root)
+    n = 1
+    while os.path.exists(path):
+        path = f"{base}_{n}"
+        n += 1
+    return path
+
+
+class AcquisitionDaemon:
+    """Connect, configure, record and reconnect until ``stop`` is called.
+
+    ``run`` blocks on the reader thread (join with a 1 s timeout), so the
+    main thread wakes once per second for statistics, rotation and the
+    silence watchdog and never polls the port itself.
+    """
+
+    def __init__(self, port, commands, baud="auto", binary=False, out_dir="sesiones", record=True,
+                 rotate_s=3600.0, rotate_bytes=0, keep=0, stats_s=10.0, stall_s=10.0, metrics_dump=None):
+        self.port = port
+        self.commands = list(commands)
+        self.baud = baud              # "auto" o una velocidad fija
+        self.baud_rate = 9600         # velocidad con la que se abre el puerto
+        self.binary = binary
+        self.out_dir = out_dir
+        self.record = record
+        self.rotate_s = rotate_s
+        self.rotate_bytes = rotate_bytes
+        self.keep = keep              # sesiones de este proceso que se conservan (0 = todas)
+        self.stats_s = stats_s
+        self.stall_s = stall_s
+        self.metrics_dump = metrics_dump
+        self.metrics = MetricsRegistry()
+        self.running = False
+        self.reader = None
+        self.counter = None
+        self.recorder = None
+        self.sessions = []            # directorios creados, el más antiguo primero
+        self.reconnects = 0
+        self._retiring = None         # recorder rotado, se cierra en la vuelta siguiente
+        self._rotated_at = 0.0
+        self._next_stats = 0.0
+        self._wake = threading.Event()
+
+    def run(self):
+        self.running = True
+        self._next_stats = time.monotonic() + self.stats_s
+        if self.record:
+            self.rotate()
+        backoff = 1.0
+        try:
+            while self.running:
+                try:
+                    self.connect()
+                    backoff = 1.0
+                except Exception as e:
+                    print(f"Error connecting to {self.port}: {e}; retrying in {backoff:.0f} s", flush=True)
+                    self.disconnect(clean=False)
+                    self._wait(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF_S)
+                    continue
+                self.supervise()
+                self.disconnect(clean=not self.running)
+                if self.running:
+                    self.reconnects += 1
+        finally:
+            self.disconnect(clean=True)
+            for recorder in (self._retiring, self.recorder):
+                if recorder is not None:
+                    recorder.stop()
+            self._retiring = self.recorder = None
+
+    def connect(self):
+        """Open the port, settle the baud rate, push the configuration and start the board."""
+        conn = serial.Serial(port=self.port, baudrate=self.baud_rate, timeout=0.1)
+        self.counter = SampleCounter(self.metrics)
+        self.reader = SerialReader(conn, self.counter)
+        self.reader.set_binary(self.binary)
+        self.reader.recorder = self.recorder
+        self.reader.metrics = self.metrics
+        # La velocidad se negocia antes de que el lector tome el puerto
+        if self.baud == "auto":
+            rate = negotiate_baud_rate(conn)
+        else:
+            current = detect_baud_rate(conn)
+            if current is not None and current != self.baud and not try_baud_rate(conn, self.baud):
+                print(f"Link failed the echo test at {self.baud} baud, staying at {conn.baudrate}")
+            rate = conn.baudrate
+        self.baud_rate = rate
+        print(f"Connected to {self.port} at {rate} baud", flush=True)
+
+        self.reader.commands = CommandChannel(conn)
+        self.reader.commands.metrics = self.metrics
+        self.reader.start()
+        commands = self.commands + ["a"]
+        futures = self.reader.commands.send_all(commands)
+        gather(futures).result(CONFIG_TIMEOUT_S)
+        failed = [cmd for cmd, future in zip(commands, futures) if future.exception() is not None]
+        if len(failed) == len(commands):
+            raise ConnectionError("no reply to the configuration")
+        if failed:
+            print(f"Configuration not applied: {', '.join(failed)}", flush=True)
+        self.counter.last_data = time.monotonic()
+
+    def supervise(self):
+        """Wait on the reader until the link drops, goes silent or the daemon stops."""
+        while self.running and self.reader.is_alive():
+            self.reader.join(1.0)
+            self.housekeeping()
+            if time.monotonic() - self.counter.last_data > self.stall_s:
+                print(f"No data for {self.stall_s:.0f} s, reconnecting", flush=True)
+                return
+        if self.running:
+            print(f"Lost {self.port}, reconnecting", flush=True)
+
+    def disconnect(self, clean):
+        """Stop the reader and close the port; ``clean`` first stops the board ('b')."""
+        reader, self.reader = self.reader, None
+        if reader is None:
+            return
+        if clean and reader.commands is not None and reader.is_alive():
+            try:
+                reader.commands.send("b").result(0.3)
+            except Exception as e:
+                print(f"Error sending stop command: {e}")
+        reader.stop()
+        if reader.commands is not None:
+            reader.commands.cancel_all()
+        try:
+            reader.serial_conn.close()
+        except Exception as e:
+            print(f"Error closing serial port: {e}")
+
+    def _wait(self, seconds):
+        """Sleep ``seconds`` (waking early on stop) while keeping stats and rotation going."""
+        deadline = time.monotonic() + seconds
+        while self.running and time.monotonic() < deadline:
+            self._wake.wait(min(1.0, max(deadline - time.monotonic(), 0.0)))
+            self.housekeeping()
+
+    def housekeeping(self):
+        """Once-per-second duties: close the rotated recorder, rotate, print stats."""
+        now = time.monotonic()
+        if self._retiring is not None:
+            self._retiring.stop()
+            self._retiring = None
+            self.prune()
+        # Sin muestras (p. ej. desconectado) no se abren sesiones vacías
+        if self.recorder is not None and self.recorder.samples and (
+                (self.rotate_s and now - self._rotated_at >= self.rotate_s)
+                or (self.rotate_bytes and self.recorder.bytes_written >= self.rotate_bytes)):
+            self.rotate()
+        if now >= self._next_stats:
+            self._next_stats = now + self.stats_s
+            self.report()
+
+    def rotate(self):
+        """Start a new session directory; the previous recorder is closed on the next tick."""
+        path = unique_session_dir(self.out_dir)
+        recorder = SessionRecorder(path)
+        recorder.start()
+        self._retiring, self.recorder = self.recorder, recorder
+        reader = self.reader
+        if reader is not None:
+            reader.recorder = recorder
+        self.sessions.append(path)
+        self._rotated_at = time.monotonic()
+        print(f"Recording to {path}", flush=True)
+
+    def prune(self):
+        """Delete this process's oldest sessions beyond ``keep``."""
+        while self.keep and len(self.sessions) > self.keep:
+            path = self.sessions.pop(0)
+            try:
+                shutil.rmtree(path)
+            except OSError as e:
+                print(f"Error removing session {path}: {e}")
+
+    def report(self):
+        """Print one stats line for the last interval (and append it to the metrics dump)."""
+        recorder = self.recorder
+        self.metrics.set("daemon.reconnects", self.reconnects)
+        self.metrics.set("daemon.baud_rate", self.baud_rate)
+        if recorder is not None:
+            self.metrics.set("recorder.samples", recorder.samples)
+            self.metrics.set("recorder.bytes", recorder.bytes_written)
+            self.metrics.set("recorder.dropped", recorder.dropped)
+        report = self.metrics.interval()
+        rates, counters, gauges = report["rates"], report["counters"], report["gauges"]
+        parse = report["histograms"].get("serial.parse_ms", {})
+        parts = [time.strftime("%Y-%m-%d %H:%M:%S")]
+        parts += [f"{name.split('.', 1)[1]}={rate:.0f}/s" for name, rate in sorted(rates.items())
+                  if name.startswith("samples.")]
+        parts += [
+            f"rx={rates.get('serial.bytes', 0.0) / 1000:.1f}kB/s",
+            f"parse_p99={parse.get('p99', 0.0):.2f}ms",
+            f"unparsed={counters.get('serial.unparsed', 0)}",
+            f"lost_frames={int(gauges.get('serial.dropped_frames', 0))}",
+            f"crc={int(gauges.get('serial.crc_errors', 0))}",
+            f"reconnects={self.reconnects}",
+        ]
+        if recorder is not None:
+            parts.append(f"rec={recorder.samples} ({recorder.bytes_written / 1e6:.1f}MB, {recorder.dropped} dropped)")
+        print(" ".join(parts), flush=True)
+        if self.metrics_dump:
+            try:
+                append_report(self.metrics_dump, report)
+            except Exception as e:
+                print(f"Error writing metrics: {e}")
+                self.metrics_dump = None
+
+    def stop(self):
+        """Ask ``run`` to stop the board, flush the recording and return (signal-safe)."""
+        self.running = False
+        self._wake.set()  # supervise vuelve como mucho en 1 s y envía 'b' antes de cerrar
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adquisición sin interfaz gráfica: puerto serie a sesiones en disco")
+    parser.add_argument("--port", required=True,
+                        help="puerto serie; mejor una ruta estable (/dev/serial/by-id/...) para reconectar")
+    parser.add_argument("--baud", default="auto",
+                        help="'auto' negocia la más alta que pase la prueba de eco, o una de "
+                             + ", ".join(str(r) for r in sorted(STANDARD_BAUD_RATES)))
+    parser.add_argument("--unit", choices=sorted(UNIT_SECONDS), default="m", help="TU")
+    parser.add_argument("--t1", type=int, default=1)
+    parser.add_argument("--t2", type=int, default=1)
+    parser.add_argument("--ft", type=int, choices=(0, 1), default=0, help="filtro de la placa, distancia")
+    parser.add_argument("--fl", type=int, choices=(0, 1), default=0, help="filtro de la placa, luz")
+    parser.add_argument("--st", type=int, default=10)
+    parser.add_argument("--sl", type=int, default=10)
+    parser.add_argument("--dt", type=int, default=1, help="diezmado en placa, distancia")
+    parser.add_argument("--dl", type=int, default=1, help="diezmado en placa, luz")
+    parser.add_argument("--fmt", choices=("A", "B"), default="B")
+    parser.add_argument("--acq", choices=("S", "B"), default="S")
+    parser.add_argument("--out", default="sesiones", help="directorio de las sesiones")
+    parser.add_argument("--no-record", action="store_true", help="solo estadísticas")
+    parser.add_argument("--rotate", type=float, default=3600.0, help="segundos por sesión (0 = sin límite)")
+    parser.add_argument("--rotate-mb", type=float, default=0.0, help="MB por sesión (0 = sin límite)")
+    parser.add_argument("--keep", type=int, default=0, help="sesiones que se conservan (0 = todas)")
+    parser.add_argument("--stats", type=float, default=10.0, help="segundos entre líneas de estadísticas")
+    parser.add_argument("--stall", type=float, default=10.0, help="segundos sin muestras antes de reconectar")
+    parser.add_argument("--metrics-dump", default=None, metavar="FICHERO",
+                        help="añadir cada intervalo de estadísticas como una línea JSON")
+    args = parser.parse_args()
+
+    baud = "auto" if args.baud == "auto" else int(args.baud)
+    if baud != "auto" and baud not in STANDARD_BAUD_RATES:
+        parser.error(f"velocidad no soportada: {baud}")
+    # Con periodos largos el silencio entre muestras es normal
+    period_s = max(args.t1 * args.dt, args.t2 * args.dl) * UNIT_SECONDS[args.unit]
+    daemon = AcquisitionDaemon(
+        args.port,
+        config_commands(args.unit, args.t1, args.t2, args.ft, args.fl, args.st, args.sl, args.dt, args.dl,
+                        args.fmt, args.acq),
+        baud=baud,
+        binary=args.fmt == "B" or args.acq == "B",
+        out_dir=args.out,
+        record=not args.no_record,
+        rotate_s=args.rotate,
+        rotate_bytes=int(args.rotate_mb * 1e6),
+        keep=args.keep,
+        stats_s=args.stats,
+        stall_s=max(args.stall, 3 * period_s),
+        metrics_dump=args.metrics_dump,
+    )
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: daemon.stop())
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()
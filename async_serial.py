@@ -0,0 +1,331 @@
+"""asyncio transport for the serial link: ingest and commands as coroutines.
+
+Alternative to the thread-per-port design (SerialReader + CommandChannel):
+the port's descriptor is registered with an asyncio event loop, reads are
+awaited from a ``StreamReader`` and commands are written with
+``StreamWriter.write`` + ``drain``. Any number of ports share the loop's
+thread, and nothing is shared with another thread, so there are no locks.
+
+Inside the GUI the loop runs on the Qt thread through ``qt_asyncio``;
+headless, ``asyncio.run`` is enough (see ``main``). POSIX only: Windows
+event loops cannot wait on serial handles.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from command_channel import CommandError, error_key, match_reply, reply_key
+from serial_ingest import SerialReader
+from serial_link import reply_timeout
+
+
+async def open_streams(conn, limit=65536):
+    """``(StreamReader, StreamWriter, read transport)`` over an open pyserial port.
+
+    pyserial has already configured the tty (speed, raw mode); asyncio only
+    needs its descriptor. Each transport gets its own ``dup`` so closing
+    them leaves ``conn`` open for the blocking helpers in serial_link.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=limit)
+    read_pipe = os.fdopen(os.dup(conn.fileno()), "rb", buffering=0)
+    write_pipe = os.fdopen(os.dup(conn.fileno()), "wb", buffering=0)
+    read_transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), read_pipe)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, write_pipe)
+    return reader, asyncio.StreamWriter(transport, protocol, reader, loop), read_transport
+
+
+class _AsyncPending:
+    __slots__ = ("command", "key", "error_key", "future", "t_sent")
+
+    def __init__(self, command, future):
+        self.command = command
+        self.key = reply_key(command)
+        self.error_key = error_key(command)
+        self.future = future
+        self.t_sent = None  # instante del último envío (monotonic)
+
+
+class AsyncCommandChannel:
+    """Coroutine counterpart of ``command_channel.CommandChannel``.
+
+    Same protocol and matching rules (replies complete the oldest in-flight
+    command with their key, ``ERROR:<cmd>:`` fails it, at most
+    ``max_in_flight`` commands on the wire), but each step is an await:
+    ``request`` writes the command, awaits ``drain`` and then the reply,
+    resending after ``timeout`` seconds up to ``retries`` times. ``send``
+    wraps ``request`` in a Task, which has the Future interface the GUI
+    callbacks use (``add_done_callback``, ``result``, ``exception``).
+
+    Every method runs on the event loop's thread.
+    """
+
+    def __init__(self, writer, loop, timeout=0.5, retries=2, max_in_flight=4):
+        self.writer = writer
+        self.loop = loop
+        self.timeout = timeout
+        self.retries = retries
+        self._window = asyncio.Semaphore(max_in_flight)
+        self._in_flight = []
+        self._tasks = set()
+        self.timeouts = 0  # reenvíos por falta de respuesta
+        self.metrics = None  # metrics.MetricsRegistry cuando la instrumentación está activa
+
+    def send(self, command):
+        """Schedule ``request(command)``; returns its Task."""
+        task = self.loop.create_task(self.request(command))
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+        return task
+
+    def _finished(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled():
+            task.exception()  # como concurrent.futures: un fallo que nadie consulta no se registra
+
+    def send_all(self, commands):
+        """Schedule several commands in order; returns their Tasks."""
+        return [self.send(cmd) for cmd in commands]
+
+    async def request(self, command):
+        """Send ``command`` (without line ending) and return its reply line."""
+        pending = _AsyncPending(command, self.loop.create_future())
+        # Sin hueco libre se espera aquí; con hueco no se cede el bucle, así
+        # que los comandos salen en el orden en que se pidieron
+        async with self._window:
+            self._in_flight.append(pending)
+            try:
+                for _ in range(self.retries + 1):
+                    await self._write(pending)
+                    try:
+                        return await asyncio.wait_for(asyncio.shield(pending.future), self.timeout)
+                    except asyncio.TimeoutError:
+                        self.timeouts += 1
+            finally:
+                if pending in self._in_flight:
+                    self._in_flight.remove(pending)
+        if self.metrics is not None:
+            self.metrics.count("commands.failed")
+        raise TimeoutError(f"Sin respuesta a {command}")
+
+    async def _write(self, pending):
+        pending.t_sent = time.monotonic()
+        self.writer.write(f"{pending.command}\r\n".encode())
+        await self.writer.drain()
+        if self.metrics is not None:
+            self.metrics.observe("async.drain_ms", (time.monotonic() - pending.t_sent) * 1000)
+
+    def handle_message(self, message):
+        """Complete the command a firmware reply belongs to; False if unrelated."""
+        match = match_reply(self._in_flight, message)
+        if match is None:
+            return False
+        self._in_flight.remove(match)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.observe("commands.rtt_ms", (time.monotonic() - match.t_sent) * 1000)
+            metrics.count("commands.errors" if message.startswith("ERROR:") else "commands.ok")
+        if message.startswith("ERROR:"):
+            match.future.set_exception(CommandError(f"{match.command}: {message}"))
+        else:
+            match.future.set_result(message)
+        return True
+
+    def poll(self, now=None):
+        """Nothing to do: every ``request`` awaits its own timeout."""
+
+    def cancel_all(self):
+        """Cancel every queued and in-flight command (port closing)."""
+        for task in list(self._tasks):
+            task.cancel()
+        self._in_flight = []
+
+
+class AsyncSerialLink:
+    """One serial port read and commanded from an asyncio event loop.
+
+    ``open`` starts ``_read_loop``, which awaits whatever the driver has
+    buffered and hands each chunk to ``SerialReader.feed`` (parse, clock
+    mapping, replies, recorder, pipeline, queue), the same code path as the
+    reader thread, plus a watchdog that measures how late the loop wakes up
+    (``async.loop_lag_ms``): every await point on the loop waits at least
+    that long past its event.
+
+    The link stands in for the GUI's SerialReader: ``set_binary``, the
+    ``pipeline``, ``recorder`` and ``metrics`` attributes and ``stop``;
+    ``commands`` is its AsyncCommandChannel once open.
+    """
+
+    def __init__(self, serial_conn, queue, max_chunk=65536, lag_interval=0.1):
+        self.serial_conn = serial_conn
+        self.max_chunk = max_chunk
+        self.lag_interval = lag_interval
+        self.parser = SerialReader(serial_conn, queue, max_chunk)
+        self.commands = None
+        self.running = False
+        self.lost = False  # el puerto falló (placa desconectada)
+        self._reader = self._writer = self._read_transport = None
+        self._tasks = []
+
+    async def open(self):
+        """Hand the port to the running loop and start reading it."""
+        loop = asyncio.get_running_loop()
+        self._reader, self._writer, self._read_transport = await open_streams(self.serial_conn, self.max_chunk)
+        # Los baudios no cambian con el enlace abierto (update_baud_rate lo vuelve a abrir)
+        self.commands = AsyncCommandChannel(self._writer, loop, timeout=reply_timeout(self.serial_conn.baudrate))
+        self.commands.metrics = self.parser.metrics
+        self.parser.commands = self.commands
+        self.running = True
+        self._tasks = [loop.create_task(self._read_loop()), loop.create_task(self._watch_lag())]
+        return self
+
+    async def _read_loop(self):
+        reader, feed = self._reader, self.parser.feed
+        try:
+            while True:
+                data = await reader.read(self.max_chunk)
+                if not data:
+                    raise ConnectionError("fin de datos del puerto")
+                feed(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.running:
+                print(f"Error reading serial data: {e}")
+            self.lost = True
+            self.commands.cancel_all()
+
+    async def _watch_lag(self):
+        while True:
+            t_due = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            metrics = self.parser.metrics
+            if metrics is not None:
+                metrics.observe("async.loop_lag_ms", max(time.monotonic() - t_due, 0.0) * 1000)
+
+    def set_binary(self, enabled):
+        self.parser.set_binary(enabled)
+
+    @property
+    def pipeline(self):
+        return self.parser.pipeline
+
+    @pipeline.setter
+    def pipeline(self, pipeline):
+        self.parser.pipeline = pipeline
+
+    @property
+    def recorder(self):
+        return self.parser.recorder
+
+    @recorder.setter
+    def recorder(self, recorder):
+        self.parser.recorder = recorder
+
+    @property
+    def metrics(self):
+        return self.parser.metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self.parser.metrics = metrics
+        if self.commands is not None:
+            self.commands.metrics = metrics
+
+    def stop(self, timeout=None):
+        """Stop reading and release the port's descriptors (``serial_conn`` stays open).
+
+        Callable from outside the loop; the cancelled tasks finish on the
+        loop's next iteration.
+        """
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        if self.commands is not None:
+            self.commands.cancel_all()
+        if self._writer is not None:
+            self._writer.close()
+            self._read_transport.close()
+            self._reader = self._writer = self._read_transport = None
+            try:
+                # Los dup comparten el O_NONBLOCK que puso asyncio con el puerto
+                os.set_blocking(self.serial_conn.fileno(), True)
+            except (OSError, ValueError):
+                pass
+
+
+async def run_links(ports, seconds, baud=921600, period=1, unit="m"):
+    """Stream from every port on one loop for ``seconds``; samples/s and command RTTs per port."""
+    import serial
+
+    from serial_ingest import SPSCQueue
+    from serial_link import try_baud_rate
+
+    links = {}
+    try:
+        for port in ports:
+            conn = serial.Serial(port, baudrate=9600, timeout=0.05)
+            if baud != conn.baudrate and not try_baud_rate(conn, baud):
+                print(f"{port}: sin eco a {baud} baudios, se queda en {conn.baudrate}")
+            links[port] = await AsyncSerialLink(conn, SPSCQueue(maxlen=1 << 16)).open()
+        config = (f"TU:{unit}", f"T1:{period}", f"T2:{period}", "a")
+        await asyncio.gather(*(link.commands.request(cmd) for link in links.values() for cmd in config))
+
+        counts = dict.fromkeys(links, 0)
+        rtts = {port: [] for port in links}
+
+        def on_reply(task, port, sent):
+            if not task.cancelled() and task.exception() is None:
+                rtts[port].append((time.monotonic() - sent) * 1000)
+
+        start = time.monotonic()
+        while time.monotonic() - start < seconds:
+            for port, link in links.items():
+                task = link.commands.send("PING:0001")
+                task.add_done_callback(lambda t, port=port, sent=time.monotonic(): on_reply(t, port, sent))
+            await asyncio.sleep(0.1)
+            for port, link in links.items():
+                for batch in link.parser.queue.drain():
+                    counts[port] += sum(len(times) for times, _ in batch.channels.values())
+        elapsed = time.monotonic() - start
+        await asyncio.gather(*(link.commands.request("b") for link in links.values()), return_exceptions=True)
+    finally:
+        for link in links.values():
+            link.stop()
+            link.serial_conn.close()
+    return {port: {"samples_per_s": counts[port] / elapsed, "pings": len(rtts[port]),
+                   "ping_max_ms": max(rtts[port], default=None)} for port in links}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leer varios puertos desde un único bucle asyncio")
+    parser.add_argument("ports", nargs="*", help="puertos serie (por defecto, placas virtuales)")
+    parser.add_argument("--virtual", type=int, default=4, help="placas virtuales si no se dan puertos")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--baud", type=int, default=921600)
+    parser.add_argument("--period", type=int, default=1, help="T1/T2 en ms")
+    args = parser.parse_args()
+
+    devices = []
+    ports = args.ports
+    if not ports:
+        from virtual_device import VirtualDevice
+
+        devices = [VirtualDevice(seed=i) for i in range(args.virtual)]
+        for device in devices:
+            device.start()
+        ports = [device.port for device in devices]
+    try:
+        results = asyncio.run(run_links(ports, args.seconds, args.baud, args.period))
+    finally:
+        for device in devices:
+            device.stop()
+    for port, result in results.items():
+        ping = result["ping_max_ms"]
+        print(f"{port}: {result['samples_per_s']:.0f} muestras/s, {result['pings']} PING, "
+              f"máx {'-' if ping is None else f'{ping:.1f} ms'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Shared helpers for the benchmark suite: timing, metric records and result files."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def best_of(func, repeat=5, number=1):
+    """Best wall time in seconds of ``number`` calls to ``func``, over ``repeat`` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """``{"p50": ..., ..., "max": ...}`` of a list of measurements."""
+    import numpy as np
+
+    samples = np.asarray(samples, dtype=np.float64)
+    out = {f"p{p}": float(np.percentile(samples, p)) for p in points}
+    out["max"] = float(samples.max())
+    return out
+
+
+def metric(value, unit, better):
+    """One result entry; ``better`` is "higher" or "lower"."""
+    return {"value": float(value), "unit": unit, "better": better}
+
+
+def git_commit():
+    """(short hash, dirty) of the working tree, or ("unknown", False) outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def environment():
+    import numpy as np
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_results(metrics, path=None, quick=False):
+    """Write a result file (``results/<date>-<commit>.json`` by default) and return its path."""
+    commit, dirty = git_commit()
+    stamp = time.localtime()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S', stamp)}-{commit}{'-dirty' if dirty else ''}{'-quick' if quick else ''}"
+        path = os.path.join(RESULTS_DIR, name + ".json")
+    doc = {
+        "commit": commit,
+        "dirty": dirty,
+        "quick": quick,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", stamp),
+        "environment": environment(),
+        "metrics": metrics,
+    }
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=1, sort_keys=True)
+    return path
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def latest_results(exclude=None, quick=None):
+    """Most recent result file in RESULTS_DIR other than ``exclude`` (same quick flag if given)."""
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    candidates = []
+    for name in os.listdir(RESULTS_DIR):
+        path = os.path.join(RESULTS_DIR, name)
+        if not name.endswith(".json") or (exclude and os.path.abspath(path) == os.path.abspath(exclude)):
+            continue
+        if quick is not None and name.endswith("-quick.json") != quick:
+            continue
+        candidates.append(path)
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def compare(old, new, threshold=0.10):
+    """Rows (name, old, new, relative change, regressed) for metrics present in both.
+
+    The change is signed so that positive means better; a metric regresses
+    when it got worse by more than ``threshold``.
+    """
+    rows = []
+    for name, entry in sorted(new["metrics"].items()):
+        before = old["metrics"].get(name)
+        if before is None or not before["value"]:
+            continue
+        change = (entry["value"] - before["value"]) / abs(before["value"])
+        if entry["better"] == "lower":
+            change = -change
+        rows.append((name, before["value"], entry["value"], change, change < -threshold))
+    return rows
+
+
+def make_window(backend=None):
+    """Offscreen RealTimeGraph (QT_QPA_PLATFORM=offscreen unless set) and its QApplication."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication([])
+    from interface import RealTimeGraph
+
+    window = RealTimeGraph(plot_backend=backend)
+    window.resize(1400, 1000)
+    window.show()
+    app.processEvents()
+    return app, window
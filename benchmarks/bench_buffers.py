@@ -0,0 +1,90 @@
+"""Micro-benchmark: buffer append and window-extract cost versus history length.
+
+    python benchmarks/bench_buffers.py [--quick]
+
+Covers the RingBuffer behind every channel and the PyramidHistory levels
+used for long windows: appending a GUI tick's batch, extracting the
+visible window (view, no copy) and a pyramid view of the whole history.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from _common import best_of, metric
+
+from history import PyramidHistory
+from ring_buffer import RingBuffer
+
+RATE_HZ = 1000.0  # muestras/s del canal simulado (T1 = 1 ms)
+
+
+def filled(cls, n):
+    """A buffer of class ``cls`` holding ``n`` samples at RATE_HZ ending now."""
+    buf = cls(max(n, 1))
+    times = np.arange(n) / RATE_HZ
+    buf.extend(times, np.sin(times).astype(np.float32))
+    return buf
+
+
+def bench_append(cls, n, batch, repeat):
+    """Seconds per appended sample, extending a full buffer by ``batch`` samples."""
+    buf = filled(cls, n)
+    t = [n / RATE_HZ]
+
+    def append():
+        times = t[0] + np.arange(batch) / RATE_HZ
+        t[0] = times[-1] + 1 / RATE_HZ
+        buf.extend(times, np.zeros(batch, dtype=np.float32))
+        buf.expire_before(t[0] - n / RATE_HZ)
+
+    return best_of(append, repeat, number=20) / batch
+
+
+def check_oversized_extend(capacity=1000):
+    """A batch longer than the buffer must leave exactly its newest ``capacity`` samples."""
+    ring = RingBuffer(capacity)
+    ring.extend([-1.0], [-1.0])
+    times = np.arange(3 * capacity + 7, dtype=np.float64)
+    ring.extend(times, times.astype(np.float32))
+    kept, values = ring.window()
+    if not (np.array_equal(kept, times[-capacity:]) and np.array_equal(values, times[-capacity:])):
+        raise AssertionError("RingBuffer.extend no conservó las últimas muestras de un lote mayor que la capacidad")
+
+
+def run(quick=False, lengths=None, repeat=None):
+    """Buffer metrics for the suite runner, one set per history length."""
+    # Un resultado rápido pero erróneo no vale: se comprueba antes de medir
+    check_oversized_extend()
+    lengths = lengths or ((1_000, 100_000) if quick else (1_000, 10_000, 100_000, 1_000_000))
+    repeat = repeat or (3 if quick else 5)
+    results = {}
+    for n in lengths:
+        ring = filled(RingBuffer, n)
+        pyramid = filled(PyramidHistory, n)
+        span = n / RATE_HZ
+        results[f"buffers.ring_append_ns_per_sample.n{n}"] = metric(
+            bench_append(RingBuffer, n, 100, repeat) * 1e9, "ns", "lower")
+        results[f"buffers.pyramid_append_ns_per_sample.n{n}"] = metric(
+            bench_append(PyramidHistory, n, 100, repeat) * 1e9, "ns", "lower")
+        # Ventana visible: vista sin copia, con búsqueda del inicio
+        results[f"buffers.ring_window_us.n{n}"] = metric(
+            best_of(lambda: ring.window(span / 2), repeat, number=100) * 1e6, "us", "lower")
+        results[f"buffers.pyramid_view_us.n{n}"] = metric(
+            best_of(lambda: pyramid.view(0.0, span, 2000), repeat, number=20) * 1e6, "us", "lower")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args()
+    for name, entry in run(args.quick).items():
+        print(f"{name:48s} {entry['value']:12,.2f} {entry['unit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Micro-benchmark: lines/sec of the bulk frame parser vs. a per-line baseline.
+
+    python benchmarks/bench_frame_parser.py [--lines 100000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _common import metric
+
+from binary_protocol import BinaryDecoder
+from frame_parser import CHANNEL_PREFIXES, CONTROL_PREFIXES, parse_frames
+
+
+def make_stream(n_lines, seed=0, ticks=True):
+    """Build a realistic firmware byte stream (mostly data, some control lines)."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n_lines):
+        r = rng.random()
+        tick = f",{1000 + i}" if ticks else ""
+        if r < 0.49:
+            lines.append(f"TEMP:{rng.uniform(10, 80):.2f}{tick}".encode())
+        elif r < 0.98:
+            lines.append(f"intensidad lumínica:{rng.uniform(0, 110):.2f}{tick}".encode())
+        else:
+            lines.append(b"OK:T1:5")
+    return b"\r\n".join(lines) + b"\r\n"
+
+
+def make_binary_stream(n_frames, seed=0):
+    """FMT:B frames of both channels, as the firmware sends them."""
+    import numpy as np
+
+    from virtual_device import encode_frames
+
+    rng = np.random.default_rng(seed)
+    half = n_frames // 2
+    ticks = np.arange(half, dtype=np.int64)
+    dist = encode_frames(0, ticks & 0xFFFF, ticks, rng.integers(400, 3000, half))
+    light = encode_frames(1, ticks & 0xFFFF, ticks, rng.integers(0, 990, half))
+    # Intercaladas trama a trama
+    frames = np.stack([np.frombuffer(dist, np.uint8).reshape(half, -1), np.frombuffer(light, np.uint8).reshape(half, -1)], 1)
+    return frames.tobytes()
+
+
+def parse_per_line(buf, t_recv):
+    """Baseline: decode and dispatch one line at a time (debug_serial.py style)."""
+    channels, messages = {}, []
+    for line in buf.split(b"\r\n"):
+        for prefix, channel in CHANNEL_PREFIXES.items():
+            if line.startswith(prefix):
+                value, _, tick = line[len(prefix):].partition(b",")
+                channels.setdefault(channel, []).append((t_recv, float(value), int(tick) if tick else -1))
+                break
+        else:
+            if line.startswith(CONTROL_PREFIXES):
+                messages.append(line.decode("latin1"))
+    return channels, messages
+
+
+def bench(func, buf, n_lines, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(buf, time.time())
+        best = min(best, time.perf_counter() - start)
+    return n_lines / best
+
+
+def chunked_parser(buf, chunk):
+    """Parse ``buf`` in reads of ``chunk`` bytes, carrying the partial line like SerialReader."""
+    chunks = [buf[i:i + chunk] for i in range(0, len(buf), chunk)]
+
+    def parse(_, t_recv):
+        pending = b""
+        for data in chunks:
+            pending = parse_frames(pending + data, t_recv).remainder
+
+    return parse
+
+
+def chunked_decoder(buf, chunk):
+    """Decode binary frames in reads of ``chunk`` bytes with one BinaryDecoder."""
+    chunks = [buf[i:i + chunk] for i in range(0, len(buf), chunk)]
+
+    def decode(_, t_recv):
+        decoder = BinaryDecoder()
+        for data in chunks:
+            decoder.feed(data, t_recv)
+
+    return decode
+
+
+def check_rejected_lines():
+    """Non-finite values and extra fields must be counted as unparsed, like the binary decoder does."""
+    batch = parse_frames(b"TEMP:inf\r\nTEMP:-inf,5\r\nTEMP:nan\r\nTEMP:1,2,3\r\nTEMP:4.5,10\r\n", 0.0)
+    times, values = batch.channels["dist"]
+    if values.tolist() != [4.5] or batch.ticks["dist"].tolist() != [10.0] or batch.unparsed != 4:
+        raise AssertionError("parse_frames aceptó un valor no finito o una línea con campos de más")
+
+
+def run(quick=False, lines=None, chunk=4096, repeat=None):
+    """Parser metrics for the suite runner (lines or frames per second)."""
+    # Un resultado rápido pero erróneo no vale: se comprueba antes de medir
+    check_rejected_lines()
+    lines = lines or (20_000 if quick else 100_000)
+    repeat = repeat or (3 if quick else 5)
+    buf = make_stream(lines)
+    binary = make_binary_stream(lines)
+    return {
+        "parse.per_line_lines_per_s": metric(bench(parse_per_line, buf, lines, repeat), "lines/s", "higher"),
+        "parse.bulk_lines_per_s": metric(bench(parse_frames, buf, lines, repeat), "lines/s", "higher"),
+        "parse.chunked_lines_per_s": metric(bench(chunked_parser(buf, chunk), buf, lines, repeat), "lines/s", "higher"),
+        "parse.binary_frames_per_s": metric(bench(chunked_decoder(binary, chunk), binary, lines, repeat),
+                                            "frames/s", "higher"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--chunk", type=int, default=4096, help="bytes per simulated serial read")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-ticks", action="store_true", help="lines without the ',<tick>' suffix (TS:0)")
+    args = parser.parse_args()
+
+    buf = make_stream(args.lines, ticks=not args.no_ticks)
+    print(f"{args.lines} lines, {len(buf)} bytes")
+    print(f"per-line baseline : {bench(parse_per_line, buf, args.lines, args.repeat):12,.0f} lines/s")
+    print(f"bulk (one buffer) : {bench(parse_frames, buf, args.lines, args.repeat):12,.0f} lines/s")
+
+    # Lecturas de tamaño realista: el parser se llama una vez por bloque
+    rate = bench(chunked_parser(buf, args.chunk), buf, args.lines, args.repeat)
+    print(f"bulk ({args.chunk} B reads): {rate:12,.0f} lines/s")
+
+    binary = make_binary_stream(args.lines)
+    rate = bench(chunked_decoder(binary, args.chunk), binary, args.lines, args.repeat)
+    print(f"binary ({args.chunk} B reads): {rate:10,.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark: end-to-end sample-to-pixel latency with the simulated source.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_latency.py [--seconds 10] [--period-ms 1]
+
+Runs the GUI in "Simulado" mode (SimulatorSource thread -> host pipeline
+-> ingest queue -> buffers -> decimation -> plot) and, after every GUI
+tick has painted, measures for each newly shown distance sample the time
+since it was sampled. Includes the simulator tick, the wait for the next
+GUI tick and the frame itself.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from _common import make_window, metric, percentiles
+
+
+def measure(app, window, seconds, period_ms, tick_s=0.1):
+    """(per-sample latencies in ms, frame times in ms) over ``seconds`` of acquisition."""
+    window.time_unit_combo.setCurrentText("ms")
+    window.t1_spinbox.setValue(period_ms)
+    window.t2_spinbox.setValue(period_ms)
+    if hasattr(window.plot_backend, "blit_renderer"):
+        window.plot_backend.blit_renderer.frame_budget_ms = float("inf")
+    window.start_acquisition()
+    # Los ticks de la GUI los marca este bucle para medir justo tras pintar
+    window.timer.stop()
+
+    latencies, frames = [], []
+    shown_until = time.time()
+    start = next_tick = time.monotonic()
+    try:
+        while time.monotonic() - start < seconds:
+            next_tick += tick_s
+            while time.monotonic() < next_tick:
+                app.processEvents()
+                time.sleep(0.002)
+            t_frame = time.perf_counter()
+            window.update_graphs()
+            app.processEvents()
+            painted = time.time()
+            frames.append((time.perf_counter() - t_frame) * 1000)
+            with window.data_lock:
+                times, _ = window.buffers["dist"].window(shown_until)
+                times = np.array(times[times > shown_until])
+            if len(times):
+                latencies.append((painted - times) * 1000)
+                shown_until = float(times[-1])
+    finally:
+        window.stop_acquisition()
+    return np.concatenate(latencies) if latencies else np.empty(0), frames
+
+
+def run(quick=False, seconds=None, period_ms=1, backend=None):
+    """Latency metrics for the suite runner."""
+    seconds = seconds or (3.0 if quick else 10.0)
+    app, window = make_window(backend)
+    try:
+        latencies, frames = measure(app, window, seconds, period_ms)
+    finally:
+        window.close()
+    if len(latencies) == 0:
+        return {}
+    stats = percentiles(latencies)
+    frame_stats = percentiles(frames)
+    key = f"latency.sim_{period_ms}ms"
+    return {
+        f"{key}.p50_ms": metric(stats["p50"], "ms", "lower"),
+        f"{key}.p95_ms": metric(stats["p95"], "ms", "lower"),
+        f"{key}.p99_ms": metric(stats["p99"], "ms", "lower"),
+        f"{key}.frame_p95_ms": metric(frame_stats["p95"], "ms", "lower"),
+        f"{key}.samples_per_s": metric(len(latencies) / seconds, "samples/s", "higher"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--period-ms", type=int, default=1, help="T1/T2 de la simulación")
+    parser.add_argument("--backend", default=None)
+    args = parser.parse_args()
+    for name, entry in run(seconds=args.seconds, period_ms=args.period_ms, backend=args.backend).items():
+        print(f"{name:40s} {entry['value']:10,.2f} {entry['unit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark: ``update_graphs`` frame time versus points per channel, rendered offscreen.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_render.py [--quick] [--backend matplotlib]
+
+Each frame queues one GUI tick (100 ms) of new samples for the four
+channels and times ``update_graphs`` plus the Qt paint it triggers, in
+steady state (the first, full draw is excluded). Points per channel is
+the density of the visible 60 s window.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from _common import make_window, metric, percentiles
+
+from frame_parser import ParsedBatch
+
+CHANNELS = ("dist", "lux", "temp", "intensity")
+WINDOW_S = 60.0
+TICK_S = 0.1
+
+
+def make_batch(t_start, t_end, points, rng):
+    """ParsedBatch with ``points`` per WINDOW_S density for every channel over [t_start, t_end)."""
+    batch = ParsedBatch(t_end)
+    n = max(int(round((t_end - t_start) * points / WINDOW_S)), 1)
+    times = t_start + np.arange(n) * ((t_end - t_start) / n)
+    for name in CHANNELS:
+        batch.add(name, times, 50 + np.cumsum(rng.normal(0, 1, n)))
+    return batch
+
+
+def frame_times(app, window, points, frames, decimation="minmax", render="blit"):
+    """Milliseconds per steady-state frame for ``points`` per channel."""
+    backend = window.plot_backend
+    if getattr(backend, "render_mode", render) != render:
+        window.toggle_render_mode()
+    if hasattr(backend, "blit_renderer"):
+        backend.blit_renderer.frame_budget_ms = float("inf")  # sin saltar frames al medir
+    window.decimation_mode = decimation
+    window.clear_buffers()
+    rng = np.random.default_rng(0)
+    now = time.time()
+    window.ingest_queue.put(make_batch(now - WINDOW_S, now, points, rng))
+    window.update_graphs()
+    app.processEvents()
+
+    times = []
+    last = now
+    for _ in range(frames):
+        now = last + TICK_S
+        window.ingest_queue.put(make_batch(last, now, points, rng))
+        last = now
+        start = time.perf_counter()
+        window.update_graphs()
+        app.processEvents()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def run(quick=False, backend=None, sizes=None, frames=None):
+    """Frame-time metrics for the suite runner (p50 and p95 per size and path)."""
+    sizes = sizes or ((1_000, 100_000) if quick else (1_000, 10_000, 100_000, 600_000))
+    frames = frames or (10 if quick else 30)
+    app, window = make_window(backend)
+    cases = [("minmax", "blit"), ("lttb", "blit"), (None, "blit")]
+    if window.plot_backend.name == "matplotlib":
+        cases.append(("minmax", "full"))
+    results = {}
+    try:
+        for decimation, render in cases:
+            for points in sizes:
+                if decimation is None and points > 100_000:
+                    continue  # sin diezmado solo es útil como referencia
+                stats = percentiles(frame_times(app, window, points, frames, decimation, render))
+                key = f"render.{window.plot_backend.name}.{render}.{decimation or 'none'}.n{points}"
+                results[f"{key}.p50_ms"] = metric(stats["p50"], "ms", "lower")
+                results[f"{key}.p95_ms"] = metric(stats["p95"], "ms", "lower")
+    finally:
+        window.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--backend", default=None, help="matplotlib (por defecto) o pyqtgraph")
+    args = parser.parse_args()
+    for name, entry in run(args.quick, args.backend).items():
+        print(f"{name:56s} {entry['value']:10,.2f} {entry['unit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Benchmark: cold start of interface.py against a time budget.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_startup.py [--runs 5] [--top 10]
+                                                                 [--budget-shown-ms 1000] [--budget-ready-ms 2500]
+
+Each run is a fresh interpreter, as when an operator relaunches the tool:
+``-X importtime`` gives the import cost of ``interface`` and its heaviest
+dependencies, and a child process that starts the GUI like ``__main__``
+(lazy window, then ``finish_startup``) reports when the window was shown and
+when the plots and port list were ready, counted from the launch of the
+process. Exits with status 1 if the medians exceed the budget.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from _common import ROOT, metric
+
+# Presupuesto en ms de un portátil de laboratorio lento (la medida es la mediana)
+BUDGET_SHOWN_MS = 1000.0
+BUDGET_READY_MS = 2500.0
+
+# Arranca la GUI como __main__ y devuelve los instantes (time.time) de cada fase
+_CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from PyQt5.QtWidgets import QApplication
+app = QApplication([])
+import interface
+window = interface.RealTimeGraph(lazy=True)
+window.show()
+app.processEvents()
+shown = time.time()
+window.finish_startup()
+app.processEvents()
+ready = time.time()
+print(json.dumps({{"shown": shown, "ready": ready}}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+
+def import_times(module="interface"):
+    """``{module: (self_us, cumulative_us)}`` from ``python -X importtime -c 'import module'``."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            env=child_env(), capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue  # cabecera
+        # Con varias apariciones (no debería) se queda la primera, la real
+        times.setdefault(fields[2].strip(), (int(fields[0]), int(fields[1])))
+    return times
+
+
+def startup_times():
+    """(ms until the window is shown, ms until plots and ports are ready) for one launch."""
+    t_launch = time.time()
+    result = subprocess.run([sys.executable, "-c", _CHILD.format(root=ROOT)], cwd=ROOT, env=child_env(),
+                            capture_output=True, text=True, check=True)
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    return (phases["shown"] - t_launch) * 1000, (phases["ready"] - t_launch) * 1000
+
+
+def measure(runs):
+    """Median import, window-shown and ready times in ms plus the last -X importtime table."""
+    imports, shown, ready = [], [], []
+    table = {}
+    for _ in range(runs):
+        table = import_times()
+        imports.append(table["interface"][1] / 1000)
+        s, r = startup_times()
+        shown.append(s)
+        ready.append(r)
+    return float(np.median(imports)), float(np.median(shown)), float(np.median(ready)), table
+
+
+def heaviest(table, top):
+    """The ``top`` modules with the highest cumulative import time, excluding interface itself."""
+    rows = [(cumulative, own, name) for name, (own, cumulative) in table.items() if name != "interface"]
+    return sorted(rows, reverse=True)[:top]
+
+
+def run(quick=False, runs=None):
+    """Startup metrics for the suite runner."""
+    import_ms, shown_ms, ready_ms, _ = measure(runs or (2 if quick else 5))
+    return {
+        "startup.import_interface_ms": metric(import_ms, "ms", "lower"),
+        "startup.window_shown_ms": metric(shown_ms, "ms", "lower"),
+        "startup.ready_ms": metric(ready_ms, "ms", "lower"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="módulos más lentos a listar")
+    parser.add_argument("--budget-shown-ms", type=float, default=BUDGET_SHOWN_MS)
+    parser.add_argument("--budget-ready-ms", type=float, default=BUDGET_READY_MS)
+    args = parser.parse_args()
+
+    import_ms, shown_ms, ready_ms, table = measure(args.runs)
+    print("Imports más lentos (acumulado, -X importtime):")
+    for cumulative, own, name in heaviest(table, args.top):
+        print(f"  {name:48s} {cumulative / 1000:8.1f} ms  (propio {own / 1000:.1f} ms)")
+    print(f"import interface         {import_ms:8.1f} ms")
+    print(f"ventana visible          {shown_ms:8.1f} ms  (presupuesto {args.budget_shown_ms:.0f} ms)")
+    print(f"gráficas y puertos listos {ready_ms:7.1f} ms  (presupuesto {args.budget_ready_ms:.0f} ms)")
+    over = shown_ms > args.budget_shown_ms or ready_ms > args.budget_ready_ms
+    print("FUERA DE PRESUPUESTO" if over else "Dentro del presupuesto")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Run the benchmark suite, save the results as JSON and compare against a previous run.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/run_benchmarks.py [--quick] [--only parse,buffers,startup]
+                                                             [--compare latest|FILE] [--threshold 0.1]
+
+Results go to benchmarks/results/<date>-<commit>[-dirty][-quick].json. With
+--compare the run is checked against an earlier file (by default the most
+recent one with the same --quick setting) and the exit status is 1 if any
+metric got worse by more than the threshold.
+"""
+import argparse
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _common import compare, latest_results, load_results, save_results
+
+SUITES = {
+    "parse": "bench_frame_parser",
+    "buffers": "bench_buffers",
+    "render": "bench_render",
+    "latency": "bench_latency",
+    "startup": "bench_startup",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="tamaños reducidos para una comprobación rápida")
+    parser.add_argument("--only", default=",".join(SUITES), help="suites separadas por comas: " + ",".join(SUITES))
+    parser.add_argument("--output", default=None, help="fichero JSON de resultados")
+    parser.add_argument("--compare", default=None, metavar="latest|FILE", help="resultados de referencia")
+    parser.add_argument("--threshold", type=float, default=0.10, help="empeoramiento relativo tolerado")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SUITES]
+    if unknown:
+        parser.error(f"suites desconocidas: {', '.join(unknown)}")
+
+    metrics = {}
+    for name in names:
+        print(f"== {name}")
+        results = importlib.import_module(SUITES[name]).run(quick=args.quick)
+        for key, entry in results.items():
+            print(f"  {key:56s} {entry['value']:14,.2f} {entry['unit']}")
+        metrics.update(results)
+
+    path = save_results(metrics, args.output, quick=args.quick)
+    print(f"Resultados guardados en {path}")
+
+    if args.compare is None:
+        return 0
+    baseline = latest_results(exclude=path, quick=args.quick) if args.compare == "latest" else args.compare
+    if baseline is None:
+        print("Sin resultados previos con los que comparar")
+        return 0
+
+    rows = compare(load_results(baseline), load_results(path), args.threshold)
+    print(f"Comparación con {baseline} (umbral {args.threshold:.0%}):")
+    for key, old, new, change, regressed in rows:
+        flag = "  REGRESIÓN" if regressed else ""
+        print(f"  {key:56s} {old:14,.2f} -> {new:14,.2f} {change:+7.1%}{flag}")
+    regressions = sum(row[4] for row in rows)
+    if regressions:
+        print(f"{regressions} métricas empeoraron más de un {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import numpy as np
+
+from frame_parser import parse_frames
+
+# Trama binaria del firmware (little-endian, 14 bytes):
+# [0xA5][0x5A][canal u8][flags u8][seq u16][tick u32][raw u16][crc u16]
+# El CRC-16/CCITT (poly 0x1021, init 0xFFFF) cubre desde canal hasta raw.
+FRAME_SYNC = b"\xa5\x5a"
+FRAME_LEN = 14
+FRAME_DTYPE = np.dtype([
+    ("sync", "<u2"),
+    ("channel", "u1"),
+    ("flags", "u1"),
+    ("seq", "<u2"),
+    ("tick", "<u4"),
+    ("raw", "<u2"),
+    ("crc", "<u2"),
+])
+CRC_SPAN = slice(2, 12)
+
+# Trama de bloque del modo ACQ:B (n muestras consecutivas de un canal por DMA):
+# [0xA5][0x5B][canal u8][flags u8][seq u16][tick u32][sub_us u16][periodo_us u32]
+# [n u16][raw u16 x n][crc u16]. La muestra i ocurre en tick + sub_us/1000 +
+# i * periodo_us/1000 ms. El CRC cubre desde canal hasta la última muestra.
+BLOCK_SYNC = b"\xa5\x5b"
+BLOCK_HEADER_DTYPE = np.dtype([
+    ("sync", "<u2"),
+    ("channel", "u1"),
+    ("flags", "u1"),
+    ("seq", "<u2"),
+    ("tick", "<u4"),
+    ("sub_us", "<u2"),
+    ("period_us", "<u4"),
+    ("count", "<u2"),
+])
+BLOCK_HEADER_LEN = BLOCK_HEADER_DTYPE.itemsize
+MAX_BLOCK_SAMPLES = 1024  # un n mayor es un falso sync
+
+
+def _crc_table():
+    table = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[i] = crc & 0xFFFF
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def crc16_ccitt(rows):
+    """CRC-16/CCITT of every row of a 2-D uint8 array, vectorized across rows."""
+    crc = np.full(len(rows), 0xFFFF, dtype=np.uint16)
+    for col in range(rows.shape[1]):
+        crc = (crc << 8) ^ _CRC_TABLE[(crc >> 8) ^ rows[:, col]]
+    return crc
+
+
+def raw_to_distance(raw):
+    """Sharp ADC2 (12 bits) to cm, same formula as the firmware."""
+    with np.errstate(divide="ignore"):
+        return 25.63 * np.power(raw * (3.3 / 4095.0), -1.268)
+
+
+def raw_to_intensity(raw):
+    """Light sensor ADC1 (10 bits) to lux, same formula as the firmware."""
+    return (3.3 - raw * (3.3 / 990.0)) / 0.03
+
+
+# canal del firmware -> (canal de la GUI, conversión)
+CHANNEL_IDS = {
+    0: ("dist", raw_to_distance),
+    1: ("intensity", raw_to_intensity),
+}
+
+
+def block_length(count):
+    """Total bytes of a block frame carrying ``count`` samples."""
+    return BLOCK_HEADER_LEN + 2 * count + 2
+
+
+class BinaryDecoder:
+    """Stateful decoder for the binary sample stream (``FMT:B`` / ``ACQ:B``).
+
+    Block frames are few and long, so they are validated one by one; each
+    becomes a single array append. Sample frames are located by sync word
+    and CRC over the rest of the buffer at once. Bytes between frames (the
+    ``OK:FMT:B`` reply, ``INFO``/``ERROR`` messages, or text data sent
+    before the switch) go through the text parser. Corrupted bytes are
+    skipped, so the decoder resyncs on the next valid frame. Sequence-number
+    gaps count dropped frames per channel.
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self._last_seq = {}      # (tipo, canal) -> último número de secuencia visto
+        self.frames = 0
+        self.dropped_frames = 0  # tramas perdidas según huecos de secuencia
+        self.crc_errors = 0      # candidatos con sync válido y CRC incorrecto
+
+    def reset(self):
+        self._pending = b""
+        self._last_seq = {}
+
+    def feed(self, data, t_recv, t_prev=None):
+        """Decode ``data`` (plus any pending bytes) into a ParsedBatch."""
+        buf = self._pending + data
+        arr = np.frombuffer(buf, dtype=np.uint8)
+        n = len(arr)
+
+        sync0 = arr[:-1] == FRAME_SYNC[0]
+        blocks, block_cut = self._find_blocks(buf, np.flatnonzero(sync0 & (arr[1:] == BLOCK_SYNC[1])), n)
+        in_block = np.zeros(n + 1, dtype=np.int32)
+        for start, length, _, _ in blocks:
+            in_block[start] += 1
+            in_block[start + length] -= 1
+        in_block = np.cumsum(in_block[:n]) > 0
+
+        # Lo que sigue a un bloque incompleto se decodifica en la próxima lectura
+        cand = np.flatnonzero(sync0 & (arr[1:] == FRAME_SYNC[1]))
+        cand = cand[(cand < block_cut) & ~in_block[cand]]
+        complete = cand[cand + FRAME_LEN <= block_cut]
+        rows = arr[complete[:, None] + np.arange(FRAME_LEN)] if len(complete) else np.empty((0, FRAME_LEN), np.uint8)
+        crc_ok = crc16_ccitt(rows[:, CRC_SPAN]) == (rows[:, 12].astype(np.uint16) | (rows[:, 13].astype(np.uint16) << 8))
+        # Un sync casual dentro de otra trama válida no puede solaparla
+        starts = complete[crc_ok]
+        keep = np.r_[True, np.diff(starts) >= FRAME_LEN] if len(starts) else np.zeros(0, dtype=bool)
+        starts, frame_rows = starts[keep], rows[crc_ok][keep]
+        self.crc_errors += int(np.count_nonzero(~crc_ok))
+
+        # Lo que queda tras la última trama: una trama incompleta se guarda
+        # para la próxima lectura; el texto hasta el último \n se procesa ya.
+        tail_start = int(starts[-1]) + FRAME_LEN if len(starts) else 0
+        if blocks:
+            tail_start = max(tail_start, blocks[-1][0] + blocks[-1][1])
+        incomplete = cand[(cand >= tail_start) & (cand + FRAME_LEN > block_cut)]
+        cut = min(int(incomplete[0]) if len(incomplete) else n, block_cut)
+        covered = np.zeros(n + 1, dtype=np.int32)
+        np.add.at(covered, starts, 1)
+        np.add.at(covered, starts + FRAME_LEN, -1)
+        covered = (np.cumsum(covered[:n]) > 0) | in_block
+        text = arr[:cut][~covered[:cut]].tobytes()
+
+        batch = parse_frames(text, t_recv, t_prev)
+        self._pending = batch.remainder + buf[cut:]
+        batch.remainder = b""
+        self._add_frames(batch, frame_rows, starts, n, t_recv, t_prev)
+        self._add_blocks(batch, blocks, n, t_recv, t_prev)
+        return batch
+
+    def _find_blocks(self, buf, cand, n):
+        """Valid block frames as (start, length, header, raw), plus where an incomplete one begins."""
+        blocks = []
+        end = 0
+        for start in cand.tolist():
+            if start < end:
+                continue  # sync casual dentro de un bloque ya validado
+            if start + BLOCK_HEADER_LEN > n:
+                return blocks, start
+            header = np.frombuffer(buf, dtype=BLOCK_HEADER_DTYPE, count=1, offset=start)[0]
+            count = int(header["count"])
+            if count == 0 or count > MAX_BLOCK_SAMPLES:
+                continue
+            length = block_length(count)
+            if start + length > n:
+                return blocks, start
+            body = np.frombuffer(buf, dtype=np.uint8, count=length, offset=start)
+            crc = int(body[-2]) | (int(body[-1]) << 8)
+            if int(crc16_ccitt(body[None, 2:-2])[0]) != crc:
+                self.crc_errors += 1
+                continue
+            raw = body[BLOCK_HEADER_LEN:-2].view("<u2")
+            blocks.append((start, length, header, raw))
+            end = start + length
+        return blocks, n
+
+    def _count_gap(self, key, seq):
+        """Add sequence-number gaps of ``seq`` (one stream) to dropped_frames."""
+        prev = self._last_seq.get(key)
+        expected = np.r_[seq[0] if prev is None else prev + 1, seq[:-1] + 1] % 65536
+        self.dropped_frames += int(((seq - expected) % 65536).sum())
+        self._last_seq[key] = int(seq[-1])
+
+    def _add_blocks(self, batch, blocks, n, t_recv, t_prev):
+        for start, length, header, raw in blocks:
+            self.frames += 1
+            channel_id = int(header["channel"])
+            self._count_gap(("block", channel_id), np.array([header["seq"]], dtype=np.int64))
+            if channel_id not in CHANNEL_IDS:
+                batch.unparsed += len(raw)
+                continue
+            name, convert = CHANNEL_IDS[channel_id]
+            # Instantes del dispositivo (ms con fracción) a partir de inicio y periodo
+            ticks = (int(header["tick"]) + int(header["sub_us"]) / 1000.0
+                     + np.arange(len(raw)) * (int(header["period_us"]) / 1000.0))
+            # Hora del host: llegada del final del bloque, hacia atrás según el periodo
+            if t_prev is None:
+                t_end = float(t_recv)
+            else:
+                t_end = t_prev + (t_recv - t_prev) * (start + length) / n
+            host_t = t_end - (ticks[-1] - ticks) / 1000.0
+            values = convert(raw.astype(np.float64))
+            finite = np.isfinite(values)
+            batch.add(name, host_t[finite], values[finite], ticks[finite])
+
+    def _add_frames(self, batch, frame_rows, starts, n, t_recv, t_prev):
+        if len(frame_rows) == 0:
+            return
+        frames = np.ascontiguousarray(frame_rows).view(FRAME_DTYPE).ravel()
+        self.frames += len(frames)
+        if t_prev is None:
+            host_t = np.full(len(frames), float(t_recv))
+        else:
+            host_t = t_prev + (t_recv - t_prev) * (starts + FRAME_LEN) / n
+
+        for channel_id in np.unique(frames["channel"]):
+            sel = frames["channel"] == channel_id
+            self._count_gap(("frame", int(channel_id)), frames["seq"][sel].astype(np.int64))
+
+            if int(channel_id) not in CHANNEL_IDS:
+                batch.unparsed += int(np.count_nonzero(sel))
+                continue
+            name, convert = CHANNEL_IDS[int(channel_id)]
+            values = convert(frames["raw"][sel].astype(np.float64))
+            finite = np.isfinite(values)
+            batch.add(name, host_t[sel][finite], values[finite], frames["tick"][sel][finite])
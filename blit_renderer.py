@@ -0,0 +1,155 @@
+import time
+
+import numpy as np
+import matplotlib.dates as mdates
+
+# Fecha de matplotlib (días) correspondiente al epoch Unix, para convertir
+# timestamps float sin pasar por objetos datetime.
+_UNIX_EPOCH_NUM = mdates.date2num(np.datetime64(0, "s"))
+
+
+def epoch_to_num(times):
+    """Convert float epoch seconds to matplotlib date numbers (vectorized)."""
+    return _UNIX_EPOCH_NUM + np.asarray(times, dtype=np.float64) / 86400.0
+
+
+def _finite_range(values):
+    """(min, max) of the finite entries of ``values``, or None if there are none."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return None
+    return float(finite.min()), float(finite.max())
+
+
+class BlitRenderer:
+    """Artist-reuse render path for a set of time-series axes.
+
+    Lines are created once and updated with set_data(); each frame only
+    restores the cached axes background, redraws the line artist and blits
+    that axes region. A full canvas draw (which re-captures the backgrounds)
+    only happens when an axis has to be re-limited, so the common frame costs
+    no layout solve and no tick/label rendering.
+    """
+
+    def __init__(self, canvas, window_s=60.0, frame_budget_ms=50.0, x_headroom=0.1, y_margin=0.1):
+        self.canvas = canvas
+        self.window_s = window_s
+        self.frame_budget_ms = frame_budget_ms
+        self.x_headroom = x_headroom  # fracción de la ventana libre a la derecha
+        self.y_margin = y_margin
+        self.lines = {}       # nombre -> Line2D
+        self._backgrounds = {}
+        self._needs_full_draw = True
+        self._skip_frames = 0
+        self.last_frame_ms = 0.0
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.full_draws = 0
+        self.metrics = None  # metrics.MetricsRegistry cuando la instrumentación está activa
+        self._cid = canvas.mpl_connect("draw_event", self._on_draw)
+
+    def add_line(self, name, ax, **style):
+        """Create the persistent animated line for channel ``name`` on ``ax``."""
+        (line,) = ax.plot([], [], animated=True, **style)
+        ax.xaxis_date()
+        self.lines[name] = line
+        self._needs_full_draw = True
+        return line
+
+    def reset(self):
+        """Forget every line (call after the axes were cleared)."""
+        self.lines = {}
+        self._backgrounds = {}
+        self._needs_full_draw = True
+
+    def set_window(self, window_s):
+        if window_s != self.window_s:
+            self.window_s = window_s
+            self._needs_full_draw = True
+
+    def should_render(self):
+        """Frame-time budget: skip ticks after a frame that overran the budget."""
+        if self._skip_frames > 0:
+            self._skip_frames -= 1
+            self.frames_skipped += 1
+            return False
+        return True
+
+    def render(self, data, now):
+        """Draw ``data`` ({name: (epoch_times, values)}) for wall-clock ``now``."""
+        start = time.perf_counter()
+        now_num = epoch_to_num(now)
+        for name, line in self.lines.items():
+            times, values = data.get(name, ((), ()))
+            x = epoch_to_num(times)
+            line.set_data(x, values)
+            if self._limits_need_update(line.axes, now_num, values):
+                self._needs_full_draw = True
+
+        t_draw = time.perf_counter()
+        if self._needs_full_draw:
+            self._relimit_all(now_num)
+            self._needs_full_draw = False
+            self.full_draws += 1
+            self.canvas.draw()  # _on_draw re-captura fondos y pinta las líneas
+            if self.metrics is not None:
+                self.metrics.observe("render.draw_ms", (time.perf_counter() - t_draw) * 1000)
+        else:
+            for ax, lines in self._lines_by_axes().items():
+                background = self._backgrounds.get(ax)
+                if background is None:
+                    continue
+                self.canvas.restore_region(background)
+                for line in lines:
+                    ax.draw_artist(line)
+                self.canvas.blit(ax.bbox)
+            if self.metrics is not None:
+                self.metrics.observe("render.blit_ms", (time.perf_counter() - t_draw) * 1000)
+
+        self.last_frame_ms = (time.perf_counter() - start) * 1000.0
+        self.frames_rendered += 1
+        if self.last_frame_ms > self.frame_budget_ms:
+            self._skip_frames = int(self.last_frame_ms // self.frame_budget_ms)
+        return self.last_frame_ms
+
+    def _limits_need_update(self, ax, now_num, values):
+        xmin, xmax = ax.get_xlim()
+        if now_num > xmax or now_num < xmin:
+            return True
+        # set_ylim rechaza NaN/inf: solo cuentan los valores finitos
+        limits = _finite_range(values)
+        if limits is not None:
+            ymin, ymax = ax.get_ylim()
+            if limits[0] < ymin or limits[1] > ymax:
+                return True
+        return False
+
+    def _relimit_all(self, now_num):
+        window = self.window_s / 86400.0
+        for ax, lines in self._lines_by_axes().items():
+            ax.set_xlim(now_num - window, now_num + window * self.x_headroom)
+            limits = [r for r in (_finite_range(line.get_ydata()) for line in lines) if r is not None]
+            if limits:
+                vmin = min(r[0] for r in limits)
+                vmax = max(r[1] for r in limits)
+                span = max(vmax - vmin, abs(vmax) * 0.05, 1e-3)
+                ax.set_ylim(vmin - span * self.y_margin, vmax + span * self.y_margin)
+
+    def _lines_by_axes(self):
+        grouped = {}
+        for line in self.lines.values():
+            grouped.setdefault(line.axes, []).append(line)
+        return grouped
+
+    def _on_draw(self, event):
+        # Tras cada dibujado completo (relimitado, resize) guardamos el fondo
+        # de cada eje y pintamos encima las líneas animadas.
+        grouped = self._lines_by_axes()
+        self._backgrounds = {ax: self.canvas.copy_from_bbox(ax.bbox) for ax in grouped}
+        for ax, lines in grouped.items():
+            for line in lines:
+                ax.draw_artist(line)
+
+    def disconnect(self):
+        self.canvas.mpl_disconnect(self._cid)
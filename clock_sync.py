@@ -0,0 +1,136 @@
+import collections
+
+import numpy as np
+
+TICK_HZ = 1000.0        # tick_ms del firmware (SysTick a 1 ms)
+TICK_WRAP = 1 << 32     # tick_ms es uint32: da la vuelta cada ~49.7 días
+REBOOT_JUMP_S = 5.0     # retroceso del tick mayor que esto = placa reiniciada
+
+
+class ClockMapper:
+    """Map device ticks to host epoch seconds, estimating offset and drift.
+
+    The host time of a sample is its device time plus a clock offset plus a
+    transport latency that is never negative (scheduling, USB polling,
+    batched reads). For each window of ``window_s`` device-seconds, the
+    minimum of ``host - tick`` therefore approaches the pure offset. A
+    least-squares line through the last ``max_windows`` minima, lowered to
+    their envelope, gives the offset and the relative drift between both
+    crystals.
+    """
+
+    def __init__(self, window_s=1.0, max_windows=60):
+        self.window_s = window_s
+        self.max_windows = max_windows
+        self.reset()
+
+    def reset(self):
+        self._last_raw = None     # último tick crudo (uint32) visto
+        self._base = 0            # ticks acumulados por vueltas del contador
+        self._windows = collections.OrderedDict()  # ventana -> (tick_s, host - tick_s mínimo)
+        self.offset = None        # segundos host - dispositivo en tick_s = 0
+        self.drift = 0.0          # s/s (ppm * 1e-6) del reloj del host frente al del dispositivo
+        self.reboots = 0
+
+    @property
+    def ready(self):
+        return self.offset is not None
+
+    def unwrap(self, ticks):
+        """Unwrap raw uint32 ms ticks (arrival order, may carry a fraction) into monotonic ticks.
+
+        Returns ``(unwrapped, first_valid)``: when the board reboots inside the
+        batch, the mapper restarts and only ticks from ``first_valid`` on are
+        meaningful under the new time base.
+        """
+        raw = np.asarray(ticks, dtype=np.float64) % TICK_WRAP
+        prev = raw[0] if self._last_raw is None else self._last_raw
+        step = np.diff(np.r_[prev, raw]) % TICK_WRAP
+        # Pasos "hacia atrás" pequeños: muestras de dos canales intercaladas
+        step = np.where(step >= TICK_WRAP // 2, step - TICK_WRAP, step)
+        reboot = np.flatnonzero(step < -REBOOT_JUMP_S * TICK_HZ)
+        first = 0
+        if len(reboot):
+            first = int(reboot[-1])
+            reboots = self.reboots + 1
+            self.reset()
+            self.reboots = reboots
+            step[:first + 1] = 0
+            self._base = float(raw[first])
+        unwrapped = self._base + np.cumsum(step)
+        self._base = float(unwrapped[-1])
+        self._last_raw = float(raw[-1])
+        return unwrapped, first
+
+    def update(self, ticks, host_times):
+        """Feed samples (arrival order); returns their unwrapped ticks in seconds."""
+        unwrapped, first = self.unwrap(ticks)
+        tick_s = unwrapped / TICK_HZ
+        lag = np.asarray(host_times, dtype=np.float64) - tick_s
+
+        # Mínimo de host - tick por ventana de tiempo del dispositivo
+        ids = np.floor(tick_s[first:] / self.window_s).astype(np.int64)
+        win_ids, inverse = np.unique(ids, return_inverse=True)
+        mins = np.full(len(win_ids), np.inf)
+        np.minimum.at(mins, inverse, lag[first:])
+        at = np.zeros(len(win_ids), dtype=np.int64)
+        np.maximum.at(at, inverse, np.arange(len(ids)))  # muestra más reciente de la ventana
+        for win, low, i in zip(win_ids.tolist(), mins.tolist(), at.tolist()):
+            old = self._windows.pop(win, None)
+            if old is not None and old[1] < low:
+                low = old[1]
+            self._windows[win] = (tick_s[first + i], low)
+        while len(self._windows) > self.max_windows:
+            self._windows.popitem(last=False)
+        self._fit()
+        return tick_s
+
+    def _fit(self):
+        points = np.array(list(self._windows.values()))
+        x, y = points[:, 0], points[:, 1]
+        if len(points) < 3:
+            # Pocas ventanas: solo offset, la deriva aún no es medible
+            self.offset, self.drift = float(y.min()), 0.0
+            return
+        x0 = x.mean()
+        slope, intercept = np.polyfit(x - x0, y, 1)
+        # La latencia nunca es negativa: la recta se baja hasta la envolvente inferior
+        intercept += (y - (intercept + slope * (x - x0))).min()
+        self.drift = float(slope)
+        self.offset = float(intercept - slope * x0)
+
+    def map(self, tick_s):
+        """Host epoch seconds for unwrapped device times in seconds."""
+        tick_s = np.asarray(tick_s, dtype=np.float64)
+        return tick_s + self.offset + self.drift * tick_s
+
+    def correct(self, batch):
+        """Replace host times of every sample that carries a device tick.
+
+        Samples without a tick (firmware with ``TS:0``) keep their host
+        timestamps. Modifies ``batch`` in place and returns it.
+        """
+        names = [n for n, t in batch.ticks.items() if np.any(t >= 0)]
+        if not names:
+            return batch
+        ticks = np.concatenate([batch.ticks[n] for n in names])
+        host = np.concatenate([batch.channels[n][0] for n in names])
+        has_tick = ticks >= 0
+        order = np.flatnonzero(has_tick)[np.argsort(host[has_tick], kind="stable")]
+        tick_s = np.empty(len(ticks))
+        tick_s[order] = self.update(ticks[order], host[order])
+
+        start = 0
+        for name in names:
+            times, values = batch.channels[name]
+            end = start + len(times)
+            sel = has_tick[start:end]
+            times = times.copy()
+            times[sel] = self.map(tick_s[start:end][sel])
+            # Reordenar por el instante real (bloques solapados, muestras sin tick)
+            keep = np.argsort(times, kind="stable")
+            times, values = times[keep], values[keep]
+            batch.ticks[name] = batch.ticks[name][keep]
+            batch.channels[name] = (times, values)
+            start = end
+        return batch
@@ -0,0 +1,188 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+from serial_link import reply_timeout
+
+
+class CommandError(Exception):
+    """The firmware answered a command with ``ERROR:...``."""
+
+
+def reply_key(command):
+    """Prefix of the firmware's acknowledgement for ``command``."""
+    if command == "STATUS":
+        return "INFO:STATUS:"
+    if command in ("a", "b"):
+        return f"OK:{command}"
+    if command.startswith("PING:"):
+        return f"OK:{command}"
+    return f"OK:{command.split(':', 1)[0]}:"
+
+
+def error_key(command):
+    """Prefix of the firmware's ``ERROR:<cmd>:<message>`` reply to ``command``."""
+    return f"ERROR:{command.split(':', 1)[0]}:"
+
+
+def match_reply(in_flight, message):
+    """Oldest pending command in ``in_flight`` that ``message`` answers, or None."""
+    attr = "error_key" if message.startswith("ERROR:") else "key"
+    return next((p for p in in_flight if message.startswith(getattr(p, attr))), None)
+
+
+def parse_status(reply):
+    """Decode ``INFO:STATUS:K=V,...`` into a dict (numeric values as int)."""
+    fields = {}
+    for item in reply.split("INFO:STATUS:", 1)[-1].split(","):
+        key, _, value = item.partition("=")
+        fields[key] = int(value) if value.isdigit() else value
+    return fields
+
+
+class _Pending:
+    __slots__ = ("command", "key", "error_key", "future", "deadline", "attempts", "t_sent")
+
+    def __init__(self, command):
+        self.command = command
+        self.key = reply_key(command)
+        self.error_key = error_key(command)
+        self.future = Future()
+        self.deadline = None
+        self.attempts = 0
+        self.t_sent = None  # instante del último envío (monotonic)
+
+
+class CommandChannel:
+    """Pipelined command writer that matches each reply to its request.
+
+    Up to ``max_in_flight`` commands are written back-to-back without waiting;
+    the rest queue until a slot frees. The firmware answers in order and
+    echoes the command name, so an ``OK:<cmd>`` reply completes and an
+    ``ERROR:<cmd>:`` reply fails the oldest in-flight command with that
+    name. Commands without a reply after ``timeout`` seconds (by default
+    ``serial_link.reply_timeout`` at the port's current baud rate) are
+    resent up to ``retries`` times. ``send`` returns a
+    ``concurrent.futures.Future`` that resolves to the reply line.
+
+    ``send`` may be called from any thread; ``handle_message`` and ``poll``
+    are called by the serial reader thread.
+    """
+
+    def __init__(self, serial_conn, timeout=None, retries=2, max_in_flight=4):
+        self.serial_conn = serial_conn
+        self.timeout = timeout  # None: según los baudios actuales del puerto
+        self.retries = retries
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._queued = collections.deque()
+        self._in_flight = []
+        self._write_errors = []  # fallos de escritura, resueltos fuera del lock
+        self.timeouts = 0  # reenvíos por falta de respuesta
+        self.metrics = None  # metrics.MetricsRegistry cuando la instrumentación está activa
+
+    def send(self, command):
+        """Queue ``command`` (without line ending) and return its Future."""
+        pending = _Pending(command)
+        with self._lock:
+            self._queued.append(pending)
+            self._pump()
+        self._flush_errors()
+        return pending.future
+
+    def send_all(self, commands):
+        """Queue several commands in order; returns their Futures."""
+        return [self.send(cmd) for cmd in commands]
+
+    def handle_message(self, message):
+        """Complete the command a firmware reply belongs to; False if unrelated."""
+        with self._lock:
+            match = match_reply(self._in_flight, message)
+            if match is None:
+                return False
+            self._in_flight.remove(match)
+            self._pump()
+        self._flush_errors()
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.observe("commands.rtt_ms", (time.monotonic() - match.t_sent) * 1000)
+            metrics.count("commands.errors" if message.startswith("ERROR:") else "commands.ok")
+        if message.startswith("ERROR:"):
+            match.future.set_exception(CommandError(f"{match.command}: {message}"))
+        else:
+            match.future.set_result(message)
+        return True
+
+    def poll(self, now=None):
+        """Resend or fail commands whose reply is overdue."""
+        now = time.monotonic() if now is None else now
+        failed = []
+        with self._lock:
+            for pending in [p for p in self._in_flight if now >= p.deadline]:
+                self.timeouts += 1
+                if pending.attempts > self.retries:
+                    self._in_flight.remove(pending)
+                    failed.append(pending)
+                else:
+                    self._write(pending)
+            self._pump()
+        self._flush_errors()
+        if self.metrics is not None and failed:
+            self.metrics.count("commands.failed", len(failed))
+        for pending in failed:
+            pending.future.set_exception(TimeoutError(f"Sin respuesta a {pending.command}"))
+
+    def cancel_all(self):
+        """Drop every queued and in-flight command (port closing)."""
+        with self._lock:
+            pending = list(self._in_flight) + list(self._queued)
+            self._in_flight, self._queued = [], collections.deque()
+        for p in pending:
+            p.future.cancel()
+
+    def _pump(self):
+        while self._queued and len(self._in_flight) < self.max_in_flight:
+            pending = self._queued.popleft()
+            self._in_flight.append(pending)
+            self._write(pending)
+
+    def _write(self, pending):
+        pending.attempts += 1
+        pending.t_sent = time.monotonic()
+        timeout = self.timeout
+        if timeout is None:
+            timeout = reply_timeout(self.serial_conn.baudrate)
+        pending.deadline = pending.t_sent + timeout
+        try:
+            self.serial_conn.write(f"{pending.command}\r\n".encode())
+        except Exception as e:
+            self._in_flight.remove(pending)
+            self._write_errors.append((pending, e))
+
+    def _flush_errors(self):
+        # Las callbacks de los Future no deben ejecutarse con el lock tomado
+        with self._lock:
+            errors, self._write_errors = self._write_errors, []
+        for pending, error in errors:
+            pending.future.set_exception(error)
+
+
+def gather(futures):
+    """Future that resolves to the list of ``futures`` once all of them finish."""
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+    if not futures:
+        combined.set_result([])
+
+    def _done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            combined.set_result(list(futures))
+
+    for future in futures:
+        future.add_done_callback(_done)
+    return combined
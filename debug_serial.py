@@ -45,6 +45,12 @@ if __name__ == "__main__":
     print("Serial Port Debugging Tool")
     print("=========================")
     
+    # Port given on the command line (e.g. the pty of virtual_device.py): skip the menu
+    if len(sys.argv) > 1:
+        baudrate = int(sys.argv[2]) if len(sys.argv) > 2 else 9600
+        monitor_port(sys.argv[1], baudrate)
+        sys.exit(0)
+    
     ports = list_ports()
     if not ports:
         print("No serial ports found!")
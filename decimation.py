@@ -0,0 +1,138 @@
+import numpy as np
+
+from ring_buffer import RingBuffer
+
+DECIMATION_MODES = ("minmax", "lttb")
+
+
+def _segment_starts(bucket_ids):
+    """Start offsets of each run of equal (sorted) bucket ids."""
+    return np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+
+
+def _first_true_per_segment(mask, seg):
+    """Index of the first True of ``mask`` within each segment (one per segment)."""
+    idx = np.flatnonzero(mask)
+    _, first = np.unique(seg[idx], return_index=True)
+    return idx[first]
+
+
+def minmax_envelope(times, values, bucket_ids):
+    """Reduce each bucket to its min and max samples, kept in time order."""
+    starts = _segment_starts(bucket_ids)
+    counts = np.diff(np.r_[starts, len(values)])
+    seg = np.repeat(np.arange(len(starts)), counts)
+    vmin = np.minimum.reduceat(values, starts)
+    vmax = np.maximum.reduceat(values, starts)
+    imin = _first_true_per_segment(values == vmin[seg], seg)
+    imax = _first_true_per_segment(values == vmax[seg], seg)
+    order = np.column_stack([np.minimum(imin, imax), np.maximum(imin, imax)]).ravel()
+    order = order[np.r_[True, order[1:] != order[:-1]]]
+    return times[order], values[order]
+
+
+def lttb_select(a_t, a_v, times, values, c_t, c_v):
+    """Pick the sample of one bucket forming the largest triangle with a and c."""
+    area = np.abs((a_t - c_t) * (values - a_v) - (a_t - times) * (c_v - a_v))
+    i = int(np.argmax(area))
+    return times[i], values[i]
+
+
+class Decimator:
+    """Incremental min/max or LTTB reduction of one channel's visible window.
+
+    Buckets are aligned to absolute time (``floor(t / width)``), so a bucket
+    never changes once a later sample has arrived. Finished buckets are
+    reduced once and cached; each frame only folds in the new samples and
+    recomputes the still-open bucket at the right edge.
+    """
+
+    def __init__(self, mode="minmax", max_points=2000):
+        self.mode = mode
+        self.max_points = max_points
+        self.window_s = 60.0
+        self.reset()
+
+    def configure(self, window_s, max_points, mode=None):
+        """Update window, point budget or mode; invalidates the cache if changed."""
+        mode = self.mode if mode is None else mode
+        max_points = max(int(max_points), 8)
+        if (window_s, max_points, mode) != (self.window_s, self.max_points, self.mode):
+            self.window_s, self.max_points, self.mode = window_s, max_points, mode
+            self.reset()
+
+    def reset(self):
+        self._cache = None
+        self._done_until = -np.inf  # límite (tiempo) del último bucket ya reducido
+        self._pending = None        # LTTB: último bucket completo aún sin elegir punto
+        self._anchor = None         # LTTB: último punto elegido
+
+    @property
+    def bucket_width(self):
+        buckets = self.max_points // 2 if self.mode == "minmax" else self.max_points
+        return self.window_s / max(buckets, 1)
+
+    def process(self, times, values):
+        """Return the decimated (times, values) for the current window view."""
+        if self.mode not in DECIMATION_MODES or len(times) <= self.max_points:
+            self.reset()
+            return times, values
+
+        width = self.bucket_width
+        if self._cache is None or times[-1] < self._done_until:
+            self.reset()
+            self._cache = RingBuffer(4 * self.max_points)
+
+        # Muestras de buckets ya cerrados que aún no se han reducido
+        open_start = np.floor(times[-1] / width) * width
+        lo = int(np.searchsorted(times, self._done_until, side="left"))
+        hi = int(np.searchsorted(times, open_start, side="left"))
+        if hi > lo:
+            self._fold(times[lo:hi], values[lo:hi], width)
+            self._done_until = open_start
+
+        self._cache.expire_before(times[0], keep=0)
+        cached_t, cached_v = self._cache.window()
+        tail_t, tail_v = self._tail(times[hi:], values[hi:], width)
+        return np.concatenate([cached_t, tail_t]), np.concatenate([cached_v, tail_v])
+
+    def _fold(self, times, values, width):
+        bucket_ids = np.floor(times / width).astype(np.int64)
+        if self.mode == "minmax":
+            self._cache.extend(*minmax_envelope(times, values, bucket_ids))
+            return
+
+        starts = np.r_[_segment_starts(bucket_ids), len(times)]
+        buckets = [(times[s:e], values[s:e]) for s, e in zip(starts[:-1], starts[1:])]
+        if self._pending is not None:
+            buckets.insert(0, self._pending)
+        if self._anchor is None:
+            first_t, first_v = buckets[0]
+            self._anchor = (first_t[0], first_v[0])
+            self._cache.append(*self._anchor)
+        for (bt, bv), (nt, nv) in zip(buckets[:-1], buckets[1:]):
+            self._anchor = lttb_select(*self._anchor, bt, bv, nt.mean(), nv.mean())
+            self._cache.append(*self._anchor)
+        self._pending = buckets[-1]
+
+    def _tail(self, times, values, width):
+        """Reduce the still-open bucket (and LTTB's pending one) for this frame only."""
+        if self.mode == "minmax":
+            if len(times) == 0:
+                return times, values
+            return minmax_envelope(times, values, np.zeros(len(times), dtype=np.int64))
+
+        points = []
+        if self._pending is not None and self._anchor is not None:
+            pt, pv = self._pending
+            if len(times):
+                c_t, c_v = times.mean(), values.mean()
+            else:
+                c_t, c_v = pt[-1], pv[-1]
+            points.append(lttb_select(*self._anchor, pt, pv, c_t, c_v))
+        if len(times):
+            points.append((times[-1], values[-1]))
+        if not points:
+            return times[:0], values[:0]
+        tail_t, tail_v = zip(*points)
+        return np.asarray(tail_t, dtype=np.float64), np.asarray(tail_v, dtype=np.float32)
@@ -0,0 +1,293 @@
+import copy
+import os
+import selectors
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import serial
+
+from command_channel import CommandChannel, CommandError
+from serial_ingest import SerialReader
+from serial_link import detect_baud_rate, negotiate_baud_rate, try_baud_rate
+
+# Iniciar/detener van siempre a todas las placas para que adquieran a la vez
+ALL_BOARDS_COMMANDS = ("a", "b")
+
+
+def open_board(port, baud="auto", timeout=0.3):
+    """Open ``port`` and settle its baud rate; raises if no board answers PING.
+
+    ``baud`` is "auto" (highest rate passing the echo test) or a fixed rate.
+    """
+    conn = serial.Serial(port=port, baudrate=9600 if baud == "auto" else baud, timeout=timeout)
+    try:
+        current = detect_baud_rate(conn)
+        if current is None:
+            raise ConnectionError(f"{port}: sin respuesta a PING")
+        if baud == "auto":
+            negotiate_baud_rate(conn)
+        elif current != baud and not try_baud_rate(conn, baud):
+            print(f"{port}: link failed the echo test at {baud} baud, staying at {conn.baudrate}")
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+class Device:
+    """One board: its port, parser state and command channel.
+
+    The SerialReader is used as the board's parser (``feed``); it only runs
+    its own thread where ports cannot be multiplexed with ``selectors``.
+    """
+
+    def __init__(self, device_id, conn, queue):
+        self.id = device_id
+        self.conn = conn
+        self.port = conn.port
+        self.reader = SerialReader(conn, queue)
+        self.reader.device = device_id
+        self.commands = CommandChannel(conn)
+        self.reader.commands = self.commands
+        self.fd = None  # descriptor registrado en el selector
+        self.lost = False
+
+
+def combine(futures):
+    """Future resolving to ``{device_id: reply}`` once every board answered.
+
+    Fails with the first board's error (tagged with its id) if any board
+    rejected or missed the command.
+    """
+    combined = Future()
+    if not futures:
+        combined.set_exception(ConnectionError("sin placas conectadas"))
+        return combined
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        for device_id, future in futures.items():
+            if future.cancelled():
+                combined.cancel()
+                return
+            if future.exception() is not None:
+                combined.set_exception(CommandError(f"{device_id}: {future.exception()}"))
+                return
+        combined.set_result({device_id: future.result() for device_id, future in futures.items()})
+
+    for future in futures.values():
+        future.add_done_callback(_done)
+    return combined
+
+
+class BroadcastCommands:
+    """CommandChannel front end for several boards.
+
+    Each command goes to every connected board, or only to ``target`` when
+    it names one (start/stop always go to all); ``send`` returns a single
+    Future (see ``combine``).
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.target = None  # id de placa, o None para todas
+
+    @property
+    def timeouts(self):
+        return sum(device.commands.timeouts for device in self.manager.connected())
+
+    @property
+    def metrics(self):
+        return self.manager.metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self.manager.metrics = metrics
+
+    def send(self, command):
+        target = None if command in ALL_BOARDS_COMMANDS else self.target
+        devices = [d for d in self.manager.connected() if target is None or d.id == target]
+        return combine({device.id: device.commands.send(command) for device in devices})
+
+    def send_all(self, commands):
+        return [self.send(command) for command in commands]
+
+    def cancel_all(self):
+        for device in self.manager.devices.values():
+            device.commands.cancel_all()
+
+
+class DeviceManager(threading.Thread):
+    """Reads N boards from one thread and feeds their batches into one queue.
+
+    Every port is registered with a ``selectors`` selector (epoll/kqueue), so
+    a single thread wakes only for ports with data and bulk-reads each one;
+    parsing, clock mapping, recording and filtering run per board in that
+    thread, off the GUI. Batches carry ``batch.device`` and keep host epoch
+    times (each board's ClockMapper maps its ticks), which is the common
+    time base. The single reader thread keeps the queue and the recorder
+    single-producer.
+
+    Windows cannot select on serial handles; there each board falls back to
+    its own SerialReader thread, all putting into the same queue.
+
+    The manager stands in for the GUI's SerialReader: ``set_binary`` and the
+    ``pipeline``, ``recorder`` and ``metrics`` attributes apply to every
+    board (each board gets its own copy of the pipeline, since filters keep
+    state), and ``commands`` is a BroadcastCommands.
+    """
+
+    def __init__(self, queue, max_chunk=65536, poll_s=0.1):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.max_chunk = max_chunk
+        self.poll_s = poll_s  # también el intervalo de revisión de comandos sin respuesta
+        self.devices = {}     # id -> Device
+        self.running = False
+        self.binary = False
+        self.commands = BroadcastCommands(self)
+        self._pipeline = None
+        self._recorder = None
+        self._metrics = None
+        self._next_id = 1
+        self._selectable = os.name != "nt"
+        self._selector = selectors.DefaultSelector() if self._selectable else None
+
+    def open_all(self, ports, baud="auto"):
+        """Open and negotiate every port in parallel; returns the boards that answered."""
+        if not ports:
+            return []
+        with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+            futures = [pool.submit(open_board, port, baud) for port in ports]
+        opened = []
+        for port, future in zip(ports, futures):
+            try:
+                opened.append(self.add(future.result()))
+            except Exception as e:
+                print(f"Error opening board on {port}: {e}")
+        return opened
+
+    def add(self, conn, device_id=None):
+        """Register an open, negotiated port as a new board."""
+        if device_id is None:
+            device_id = f"placa{self._next_id}"
+            self._next_id += 1
+        device = Device(device_id, conn, self.queue)
+        device.reader.set_binary(self.binary)
+        device.reader.pipeline = copy.deepcopy(self._pipeline)
+        device.reader.recorder = self._recorder
+        device.reader.metrics = self._metrics
+        device.commands.metrics = self._metrics
+        self.devices[device_id] = device
+        if self._selectable:
+            conn.timeout = 0  # lecturas no bloqueantes: el selector ya dijo que hay datos
+            device.fd = conn.fileno()
+            self._selector.register(device.fd, selectors.EVENT_READ, device)
+        elif self.running:
+            device.reader.start()
+        return device
+
+    def connected(self):
+        return [device for device in list(self.devices.values()) if not device.lost]
+
+    def set_binary(self, enabled):
+        self.binary = enabled
+        for device in self.devices.values():
+            device.reader.set_binary(enabled)
+
+    @property
+    def pipeline(self):
+        return self._pipeline
+
+    @pipeline.setter
+    def pipeline(self, pipeline):
+        self._pipeline = pipeline
+        for device in self.devices.values():
+            device.reader.pipeline = copy.deepcopy(pipeline)
+
+    @property
+    def recorder(self):
+        return self._recorder
+
+    @recorder.setter
+    def recorder(self, recorder):
+        # Un solo grabador: record() antepone el id de la placa a cada canal
+        self._recorder = recorder
+        for device in self.devices.values():
+            device.reader.recorder = recorder
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self._metrics = metrics
+        for device in self.devices.values():
+            device.reader.metrics = metrics
+            device.commands.metrics = metrics
+
+    def run(self):
+        self.running = True
+        if not self._selectable:
+            for device in self.devices.values():
+                device.reader.start()
+            return
+        next_poll = time.monotonic() + self.poll_s
+        while self.running:
+            try:
+                events = self._selector.select(self.poll_s)
+            except (OSError, ValueError) as e:
+                if self.running:
+                    print(f"Error in device selector: {e}")
+                break
+            for key, _ in events:
+                device = key.data
+                conn = device.conn
+                try:
+                    data = conn.read(max(1, min(conn.in_waiting, self.max_chunk)))
+                except Exception as e:
+                    self._lost(device, e)
+                    continue
+                if data:
+                    device.reader.feed(data)
+            now = time.monotonic()
+            if now >= next_poll:
+                next_poll = now + self.poll_s
+                for device in self.connected():
+                    device.commands.poll(now)
+
+    def _lost(self, device, error):
+        """Drop a board whose port failed (unplugged); the others keep running."""
+        if self.running:
+            print(f"Board {device.id} ({device.port}) lost: {error}")
+        device.lost = True
+        try:
+            self._selector.unregister(device.fd)
+        except (KeyError, ValueError):
+            pass
+        device.commands.cancel_all()
+        try:
+            device.conn.close()
+        except Exception:
+            pass
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        for device in self.devices.values():
+            device.reader.stop()
+            device.commands.cancel_all()
+            try:
+                device.conn.close()
+            except Exception as e:
+                print(f"Error closing serial port {device.port}: {e}")
+        if self._selector is not None:
+            self._selector.close()
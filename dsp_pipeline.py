@@ -0,0 +1,234 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FILTER_KINDS = ("none", "mean", "median", "lowpass", "savgol")
+
+
+def _drop_nonfinite(times, values):
+    """Remove NaN/inf samples, which would stay forever in a stage's carried state."""
+    values = np.asarray(values, dtype=np.float64)
+    good = np.isfinite(values)
+    if good.all():
+        return times, values
+    return np.asarray(times)[good], values[good]
+
+
+class Stage:
+    """One streaming step over ``(times, values)`` batches of a single channel.
+
+    Stages keep whatever history they need between calls, so feeding a
+    signal in several batches gives the same output as feeding it at once.
+    Every batch is processed with array operations, never sample by sample.
+    """
+
+    def process(self, times, values):
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class _History(Stage):
+    """Stage that carries the last ``keep`` input samples into the next batch."""
+
+    keep = 0
+
+    def reset(self):
+        self._t = np.empty(0)
+        self._v = np.empty(0)
+
+    def _extend(self, times, values):
+        """Previous tail plus the new batch; stores the new tail."""
+        t = np.concatenate([self._t, times])
+        v = np.concatenate([self._v, np.asarray(values, dtype=np.float64)])
+        if self.keep:
+            self._t, self._v = t[-self.keep:], v[-self.keep:]
+        return t, v
+
+
+class MovingAverage(_History):
+    """Causal mean of the last ``n`` samples (fewer while the window fills)."""
+
+    def __init__(self, n):
+        self.n = max(int(n), 1)
+        self.keep = self.n - 1
+        self.reset()
+
+    def process(self, times, values):
+        # Un inf en la suma acumulada deja NaN en todas las medias posteriores
+        times, values = _drop_nonfinite(times, values)
+        if len(times) == 0:
+            return times, values
+        held = len(self._t)
+        _, ext = self._extend(times, values)
+        csum = np.r_[0.0, np.cumsum(ext)]
+        end = np.arange(held, len(ext)) + 1
+        start = np.maximum(end - self.n, 0)
+        return times, (csum[end] - csum[start]) / (end - start)
+
+
+class MovingMedian(_History):
+    """Causal median of the last ``n`` samples (fewer while the window fills)."""
+
+    def __init__(self, n):
+        self.n = max(int(n), 1)
+        self.keep = self.n - 1
+        self.reset()
+
+    def process(self, times, values):
+        if len(times) == 0:
+            return times, values
+        _, ext = self._extend(times, values)
+        missing = self.n - 1 - (len(ext) - len(times))
+        if missing > 0:
+            # Arranque: huecos NaN a la izquierda, ignorados por nanmedian
+            ext = np.r_[np.full(missing, np.nan), ext]
+            return times, np.nanmedian(sliding_window_view(ext, self.n), axis=1)
+        return times, np.median(sliding_window_view(ext, self.n), axis=1)
+
+
+class LowPass(Stage):
+    """Butterworth IIR low-pass run by ``lfilter`` with state carried across batches.
+
+    ``cutoff`` is a fraction of the Nyquist frequency (0..1), so the filter
+    does not need to know the sampling period.
+    """
+
+    def __init__(self, cutoff, order=2):
+        # scipy.signal tarda ~0.4 s en importarse: solo lo paga quien usa el filtro
+        from scipy.signal import butter
+
+        self.b, self.a = butter(order, min(max(cutoff, 1e-4), 0.99))
+        self.reset()
+
+    def reset(self):
+        self._zi = None
+
+    def process(self, times, values):
+        # Una muestra no finita envenenaría _zi hasta el siguiente reset
+        times, values = _drop_nonfinite(times, values)
+        if len(times) == 0:
+            return times, values
+        from scipy.signal import lfilter, lfilter_zi
+
+        if self._zi is None:
+            # Estado inicial en régimen permanente con la primera muestra
+            self._zi = lfilter_zi(self.b, self.a) * values[0]
+        out, self._zi = lfilter(self.b, self.a, values, zi=self._zi)
+        return times, out
+
+
+class SavitzkyGolay(_History):
+    """Centered Savitzky–Golay smoothing.
+
+    Each output needs ``window // 2`` later samples, so the stream is
+    delayed by that many samples; outputs carry their center sample's time.
+    """
+
+    def __init__(self, window, polyorder=2):
+        from scipy.signal import savgol_coeffs
+
+        window = max(int(window) | 1, (polyorder + 2) | 1)  # impar y mayor que el orden
+        self.window = window
+        self.keep = window - 1
+        self.coeffs = savgol_coeffs(window, polyorder)
+        self.reset()
+
+    def process(self, times, values):
+        t, v = self._extend(times, values)
+        if len(v) < self.window:
+            return t[:0], v[:0]
+        half = self.window // 2
+        return t[half:len(t) - half], np.convolve(v, self.coeffs, mode="valid")
+
+
+class Decimate(_History):
+    """Mean of every ``n`` consecutive samples, stamped with their mean time."""
+
+    def __init__(self, n):
+        self.n = max(int(n), 1)
+        self.reset()
+
+    def process(self, times, values):
+        t, v = self._extend(times, values)
+        full = len(v) - len(v) % self.n
+        # El resto (< n muestras) espera al siguiente lote
+        self._t, self._v = t[full:], v[full:]
+        t = t[:full].reshape(-1, self.n).mean(axis=1)
+        v = v[:full].reshape(-1, self.n).mean(axis=1)
+        return t, v
+
+
+class Derivative(_History):
+    """Rate of change per second between consecutive samples (e.g. cm -> cm/s)."""
+
+    keep = 1
+
+    def __init__(self):
+        self.reset()
+
+    def process(self, times, values):
+        t, v = self._extend(times, values)
+        dt = np.diff(t)
+        ok = dt > 0
+        return t[1:][ok], np.diff(v)[ok] / dt[ok]
+
+
+def make_filter(kind, window):
+    """Stage for a filter choice of ``FILTER_KINDS`` sized like an ``window``-sample mean."""
+    if kind == "mean":
+        return MovingAverage(window)
+    if kind == "median":
+        return MovingMedian(window)
+    if kind == "lowpass":
+        # Corte a la frecuencia del primer cero de la media de ``window`` muestras
+        return LowPass(2.0 / max(window, 2))
+    if kind == "savgol":
+        return SavitzkyGolay(max(window, 5))
+    return None
+
+
+def run_chain(stages, times, values):
+    """Feed one channel's batch through ``stages`` in order."""
+    for stage in stages:
+        times, values = stage.process(times, values)
+    return times, values
+
+
+class Pipeline:
+    """Per-channel chains of stages plus channels derived from processed ones.
+
+    ``chains`` maps a channel to its list of stages; ``derived`` maps a new
+    channel name to ``(source channel, stages)``, applied to the source's
+    processed output. ``process`` rewrites a ``ParsedBatch`` in place.
+    """
+
+    def __init__(self, chains=None, derived=None):
+        self.chains = {name: list(stages) for name, stages in (chains or {}).items()}
+        self.derived = {name: (source, list(stages)) for name, (source, stages) in (derived or {}).items()}
+
+    def reset(self):
+        for stages in self.chains.values():
+            for stage in stages:
+                stage.reset()
+        for _, stages in self.derived.values():
+            for stage in stages:
+                stage.reset()
+
+    def process(self, batch):
+        """Run every chain on ``batch`` and add the derived channels; returns it."""
+        outputs = {}
+        for name, (times, values) in batch.channels.items():
+            stages = self.chains.get(name)
+            if stages:
+                times, values = run_chain(stages, times, values)
+                # Los ticks del dispositivo ya no corresponden a las muestras filtradas
+                batch.ticks.pop(name, None)
+            outputs[name] = (times, values)
+        for name, (source, stages) in self.derived.items():
+            if source in outputs:
+                times, values = run_chain(stages, *outputs[source])
+                if len(times):
+                    outputs[name] = (times, values)
+        batch.channels = outputs
+        return batch
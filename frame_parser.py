@@ -0,0 +1,189 @@
+import numpy as np
+
+# Prefijos de las tramas de datos que envía el firmware (GraphCode.cpp).
+# TEMP transporta la distancia del sensor Sharp; la intensidad lumínica puede
+# llegar en UTF-8 o latin1 según cómo se compiló el literal en el firmware.
+CHANNEL_PREFIXES = {
+    b"TEMP:": "dist",
+    "intensidad lumínica:".encode("utf-8"): "intensity",
+    "intensidad lumínica:".encode("latin1"): "intensity",
+}
+
+# Prefijos de mensajes de control / confirmación
+CONTROL_PREFIXES = (b"OK:", b"ERROR:", b"INFO:", b"DEBUG:")
+
+VALUE_WIDTH = 24  # ancho máximo del campo "valor[,tick]" (3 palabras de 8 bytes)
+TICK_SEPARATOR = ord(",")  # el firmware añade ",<tick_ms>" tras el valor (TS:1)
+
+
+class ParsedBatch:
+    """Columnar result of parsing one raw byte buffer."""
+
+    def __init__(self, t_recv):
+        self.t_recv = t_recv  # segundos epoch de la lectura
+        self.channels = {}    # nombre de canal -> (tiempos float64, valores float64)
+        self.ticks = {}       # nombre de canal -> tick del dispositivo en ms (float64, -1 si no viene)
+        self.messages = []    # mensajes de control decodificados
+        self.unparsed = 0     # líneas que no se pudieron interpretar
+        self.remainder = b""  # trama parcial al final del buffer
+        self.device = None    # id de la placa de origen (DeviceManager); None con una sola
+
+    def __bool__(self):
+        return bool(self.channels or self.messages or self.unparsed)
+
+    def add(self, channel, times, values, ticks=None):
+        """Add samples for ``channel``, keeping the channel's arrays time-ordered."""
+        if ticks is None:
+            ticks = np.full(len(times), -1.0)
+        # float64: los bloques DMA llevan instantes con fracción de ms
+        ticks = np.asarray(ticks, dtype=np.float64)
+        if channel in self.channels:
+            prev_t, prev_v = self.channels[channel]
+            times = np.concatenate([prev_t, times])
+            values = np.concatenate([prev_v, values])
+            ticks = np.concatenate([self.ticks[channel], ticks])
+            order = np.argsort(times, kind="stable")
+            times, values, ticks = times[order], values[order], ticks[order]
+        self.channels[channel] = (times, values)
+        self.ticks[channel] = ticks
+
+
+# Máscara little-endian con los n bytes bajos de una palabra de 64 bits
+_BYTE_MASKS = np.array([(1 << (8 * n)) - 1 for n in range(9)], dtype=np.uint64)
+
+
+class _WordView:
+    """Unaligned little-endian uint64 reads at arbitrary byte offsets of a buffer.
+
+    Keeps eight shifted copies of the buffer as uint64 arrays, so reading the
+    8 bytes at every line start is one fancy index instead of 8 byte gathers.
+    """
+
+    def __init__(self, buf, reach=VALUE_WIDTH):
+        # Palabras suficientes para leer hasta ``reach`` bytes más allá del final
+        n_words = (len(buf) + reach) // 8 + 2
+        padded = bytes(buf) + bytes(8 * n_words + 8 - len(buf))
+        self._shifted = np.stack([
+            np.frombuffer(padded, dtype="<u8", count=n_words, offset=k) for k in range(8)
+        ])
+
+    def __call__(self, pos, n_bytes=8):
+        """Word at each byte offset in ``pos``, keeping only the first ``n_bytes``."""
+        words = self._shifted[pos & 7, pos >> 3]
+        return words & _BYTE_MASKS[np.clip(n_bytes, 0, 8)]
+
+
+def _prefix_chunks(prefix):
+    """Split a prefix into (offset, word, n_bytes) pieces for word comparisons."""
+    chunks = []
+    for off in range(0, len(prefix), 8):
+        piece = prefix[off:off + 8]
+        chunks.append((off, int.from_bytes(piece, "little"), len(piece)))
+    return chunks
+
+
+_PREFIX_CHUNKS = {prefix: _prefix_chunks(prefix) for prefix in CHANNEL_PREFIXES}
+
+
+def _to_float(fields):
+    """Convert a fixed-width bytes array to float64, NaN for malformed fields."""
+    try:
+        return fields.astype(np.float64)
+    except ValueError:
+        # Caso raro: algún campo corrupto; se resuelve elemento a elemento
+        out = np.empty(len(fields), dtype=np.float64)
+        for i, field in enumerate(fields):
+            try:
+                out[i] = float(field)
+            except ValueError:
+                out[i] = np.nan
+        return out
+
+
+def parse_frames(buf, t_recv, t_prev=None):
+    """Parse every complete ``\\r\\n`` line in ``buf`` in bulk.
+
+    Line splitting, prefix dispatch and float conversion are done with NumPy
+    over the whole buffer. Host timestamps are ``t_recv``, or, when ``t_prev``
+    (the previous read time) is given, interpolated between both by each
+    line's byte offset, since bytes arrive serially at the link rate.
+    """
+    batch = ParsedBatch(t_recv)
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    newlines = np.flatnonzero(arr == 10)
+    if len(newlines) == 0:
+        batch.remainder = bytes(buf)
+        return batch
+    batch.remainder = bytes(buf[newlines[-1] + 1:])
+
+    starts = np.r_[0, newlines[:-1] + 1]
+    ends = newlines - ((newlines > starts) & (arr[np.maximum(newlines - 1, 0)] == 13))
+    lengths = ends - starts
+
+    words = _WordView(buf)
+
+    if t_prev is None:
+        line_times = np.full(len(starts), float(t_recv))
+    else:
+        line_times = t_prev + (t_recv - t_prev) * (newlines + 1) / len(arr)
+
+    matched = np.zeros(len(starts), dtype=bool)
+    value_cols = np.arange(VALUE_WIDTH)
+    for prefix, channel in CHANNEL_PREFIXES.items():
+        # Prefijo comparado de 8 en 8 bytes, solo en filas aún sin asignar
+        rows = np.flatnonzero(~matched & (lengths >= len(prefix)))
+        for off, word, n_bytes in _PREFIX_CHUNKS[prefix]:
+            if len(rows) == 0:
+                break
+            rows = rows[words(starts[rows] + off, n_bytes) == np.uint64(word)]
+        if len(rows) == 0:
+            continue
+        matched[rows] = True
+        v_start = starts[rows] + len(prefix)
+        v_len = ends[rows] - v_start
+        ok = v_len <= VALUE_WIDTH
+        batch.unparsed += int(np.count_nonzero(~ok))
+        rows, v_start, v_len = rows[ok], v_start[ok], v_len[ok]
+
+        # Campo "valor[,tick]" como 3 palabras ya recortadas a su longitud
+        fields = np.empty((len(rows), VALUE_WIDTH // 8), dtype="<u8")
+        for j in range(VALUE_WIDTH // 8):
+            fields[:, j] = words(v_start + 8 * j, v_len - 8 * j)
+        fields = fields.view(np.uint8)
+        inside = value_cols < v_len[:, None]
+
+        # Separar "valor,tick": la columna de la coma parte cada campo en dos
+        is_sep = (fields == TICK_SEPARATOR) & inside
+        has_tick = is_sep.any(axis=1)
+        ticks = np.full(len(rows), -1, dtype=np.int64)
+        valid = np.ones(len(rows), dtype=bool)
+        if has_tick.any():
+            # Mismo bloque de bytes: para el tick se blanquea todo hasta la coma
+            # (los espacios iniciales se ignoran al convertir) y para el valor
+            # se anula todo desde la coma.
+            t_rows = np.flatnonzero(has_tick)
+            sub = fields[t_rows]
+            before = value_cols <= is_sep[t_rows].argmax(axis=1)[:, None]
+            tick_fields = np.where(before, np.uint8(32), sub)
+            parsed = _to_float(tick_fields.view(f"S{VALUE_WIDTH}").ravel())
+            # Un tick ilegible o con campos de más ("1,2,3") invalida la línea
+            finite = np.isfinite(parsed)
+            ticks[t_rows] = np.where(finite, parsed, -1).astype(np.int64)
+            valid[t_rows] = finite
+            fields[t_rows] = np.where(before & ~is_sep[t_rows], sub, 0)
+
+        values = _to_float(fields.view(f"S{VALUE_WIDTH}").ravel())
+        # Como BinaryDecoder: ni NaN ni ±inf (el firmware imprime "TEMP:inf" con el Sharp a 0)
+        good = np.isfinite(values) & valid
+        batch.unparsed += int(np.count_nonzero(~good))
+
+        batch.add(channel, line_times[rows[good]], values[good], ticks[good])
+
+    # El resto de líneas son pocas (control / basura): se tratan en Python
+    for i in np.flatnonzero(~matched & (lengths > 0)):
+        line = bytes(buf[starts[i]:ends[i]])
+        if line.startswith(CONTROL_PREFIXES):
+            batch.messages.append(line.decode("latin1"))
+        else:
+            batch.unparsed += 1
+    return batch
@@ -0,0 +1,232 @@
+import os
+
+import numpy as np
+
+from decimation import minmax_envelope
+from ring_buffer import RingBuffer
+
+# Resumen de un tramo de muestras consecutivas de un canal
+RECORD_DTYPE = np.dtype([
+    ("t0", "<f8"),    # primera muestra
+    ("t1", "<f8"),    # última muestra
+    ("tmin", "<f8"),
+    ("vmin", "<f4"),
+    ("tmax", "<f8"),
+    ("vmax", "<f4"),
+    ("sum", "<f8"),
+    ("n", "<u4"),
+])
+
+
+def _reduce(records, ratio):
+    """Merge every ``ratio`` consecutive records into one (the remainder is left out)."""
+    groups = records[:len(records) - len(records) % ratio].reshape(-1, ratio)
+    out = np.empty(len(groups), dtype=RECORD_DTYPE)
+    rows = np.arange(len(groups))
+    out["t0"] = groups["t0"][:, 0]
+    out["t1"] = groups["t1"][:, -1]
+    i = groups["vmin"].argmin(axis=1)
+    out["tmin"], out["vmin"] = groups["tmin"][rows, i], groups["vmin"][rows, i]
+    i = groups["vmax"].argmax(axis=1)
+    out["tmax"], out["vmax"] = groups["tmax"][rows, i], groups["vmax"][rows, i]
+    out["sum"] = groups["sum"].sum(axis=1)
+    out["n"] = groups["n"].sum(axis=1)
+    return out
+
+
+def envelope(records):
+    """Min and max point of each record, in time order, as (times, values)."""
+    first_min = records["tmin"] <= records["tmax"]
+    times = np.column_stack([
+        np.where(first_min, records["tmin"], records["tmax"]),
+        np.where(first_min, records["tmax"], records["tmin"]),
+    ]).ravel()
+    values = np.column_stack([
+        np.where(first_min, records["vmin"], records["vmax"]),
+        np.where(first_min, records["vmax"], records["vmin"]),
+    ]).ravel()
+    return times, values
+
+
+class _Level:
+    """One aggregated level: a record ring in RAM plus an optional spill file.
+
+    Records evicted from the ring are appended to ``spill_path`` (raw
+    RECORD_DTYPE rows) and stay reachable through a memory map.
+    """
+
+    def __init__(self, ratio, capacity, spill_path=None):
+        self.ratio = ratio
+        self.capacity = int(capacity)
+        self.spill_path = spill_path
+        self._ring = np.zeros(2 * self.capacity, dtype=RECORD_DTYPE)
+        self._pending = np.empty(0, dtype=RECORD_DTYPE)  # registros del nivel inferior aún sin agrupar
+        self.clear()
+
+    def clear(self):
+        self._start = self._end = 0
+        self._pending = self._pending[:0]
+        self._disk = None
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+    def add(self, records):
+        """Fold lower-level records in; returns the records completed here."""
+        merged = np.concatenate([self._pending, records])
+        done = _reduce(merged, self.ratio)
+        self._pending = merged[len(done) * self.ratio:]
+        self._store(done)
+        return done
+
+    def _store(self, records):
+        if len(records) > self.capacity:
+            self._spill(self.records())
+            self._spill(records[:-self.capacity])
+            self._start = self._end
+            records = records[-self.capacity:]
+        overflow = self._end - self._start + len(records) - self.capacity
+        if overflow > 0:
+            self._spill(self.records()[:overflow])
+            self._start += overflow
+        pos = (self._end + np.arange(len(records))) % self.capacity
+        self._ring[pos] = records
+        self._ring[pos + self.capacity] = records
+        self._end += len(records)
+
+    def _spill(self, records):
+        if not self.spill_path or len(records) == 0:
+            return
+        with open(self.spill_path, "ab") as f:
+            f.write(records.tobytes())
+        self._disk = None  # el memmap se reabre con el nuevo tamaño
+
+    def records(self):
+        """View of the records held in RAM, oldest first."""
+        first = self._start % self.capacity
+        return self._ring[first:first + self._end - self._start]
+
+    def disk(self):
+        """Spilled records (memory map), oldest first."""
+        if self._disk is None:
+            size = os.path.getsize(self.spill_path) if self.spill_path and os.path.exists(self.spill_path) else 0
+            n = size // RECORD_DTYPE.itemsize
+            self._disk = np.memmap(self.spill_path, dtype=RECORD_DTYPE, mode="r", shape=(n,)) if n else self._ring[:0]
+        return self._disk
+
+    def oldest(self):
+        disk = self.disk()
+        if len(disk):
+            return float(disk[0]["t0"])
+        records = self.records()
+        return float(records[0]["t0"]) if len(records) else np.inf
+
+    def _bounds(self, records, t0, t1):
+        return (int(np.searchsorted(records["t1"], t0, side="left")),
+                int(np.searchsorted(records["t0"], t1, side="right")))
+
+    def count(self, t0, t1):
+        total = 0
+        for records in (self.disk(), self.records()):
+            lo, hi = self._bounds(records, t0, t1)
+            total += max(hi - lo, 0)
+        return total
+
+    def select(self, t0, t1):
+        """Records overlapping [t0, t1], from disk and RAM."""
+        parts = []
+        for records in (self.disk(), self.records()):
+            lo, hi = self._bounds(records, t0, t1)
+            if hi > lo:
+                parts.append(np.asarray(records[lo:hi]))
+        return np.concatenate(parts) if parts else self._ring[:0]
+
+
+class PyramidHistory(RingBuffer):
+    """RingBuffer of recent full-resolution samples plus min/max/mean levels.
+
+    Level k summarizes ``ratios[0] * ... * ratios[k-1]`` samples per
+    record (10x, 100x, 1000x by default). Levels are updated incrementally
+    on every append, with vectorized reductions over the new samples only,
+    and keep their own history independent of ``expire_before``, which
+    trims only the raw samples. ``view`` returns at most about
+    ``max_points`` points for any time span, so hours of history render in
+    the same time as a few seconds.
+    """
+
+    def __init__(self, capacity, ratios=(10, 10, 10), level_capacity=32768, spill_dir=None):
+        super().__init__(capacity)
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.levels = []
+        factor = 1
+        for ratio in ratios:
+            factor *= ratio
+            path = os.path.join(spill_dir, f"nivel_{factor}x.bin") if spill_dir else None
+            self.levels.append(_Level(ratio, level_capacity, path))
+
+    def clear(self):
+        super().clear()
+        for level in self.levels:
+            level.clear()
+
+    def append(self, t, value):
+        super().append(t, value)
+        self._aggregate(np.array([t], dtype=np.float64), np.array([value], dtype=np.float32))
+
+    def extend(self, times, values):
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float32)
+        super().extend(times, values)
+        self._aggregate(times, values)
+
+    def _aggregate(self, times, values):
+        if len(times) == 0:
+            return
+        records = np.empty(len(times), dtype=RECORD_DTYPE)
+        records["t0"] = records["t1"] = records["tmin"] = records["tmax"] = times
+        records["vmin"] = records["vmax"] = values
+        records["sum"] = values
+        records["n"] = 1
+        for level in self.levels:
+            records = level.add(records)
+            if len(records) == 0:
+                break
+
+    def view(self, t0, t1, max_points=2000):
+        """(times, values) covering [t0, t1] from the finest level that fits ``max_points``."""
+        raw_t, _ = self.window()
+        oldest = [float(raw_t[0]) if len(raw_t) else np.inf] + [level.oldest() for level in self.levels]
+        start = max(t0, min(oldest))
+        for k in range(len(self.levels) + 1):
+            if k == 0:
+                n = int(np.searchsorted(raw_t, t1, side="right") - np.searchsorted(raw_t, t0, side="left"))
+            else:
+                n = 2 * self.levels[k - 1].count(t0, t1)
+            covers = oldest[k] <= start
+            if covers and n <= max_points:
+                return self._view_level(k, t0, t1)
+        # Ni el nivel más grueso cabe: su envolvente se reduce a max_points
+        times, values = self._view_level(len(self.levels), t0, t1)
+        if len(times) <= max_points:
+            return times, values
+        width = (t1 - t0) / max(max_points // 2, 1)
+        return minmax_envelope(times, values, np.floor(times / width).astype(np.int64))
+
+    def _view_level(self, k, t0, t1):
+        if k == 0:
+            times, values = self.window(t0)
+            i = int(np.searchsorted(times, t1, side="right"))
+            return times[:i], values[:i]
+        records = self.levels[k - 1].select(t0, t1)
+        times, values = envelope(records)
+        # Lo aún no agrupado en este nivel sale del nivel inferior (pocos puntos)
+        tail_from = float(records["t1"][-1]) if len(records) else t0
+        if tail_from < t1:
+            tail_t, tail_v = self._view_level(k - 1, np.nextafter(tail_from, np.inf), t1)
+            times, values = np.concatenate([times, tail_t]), np.concatenate([values, tail_v])
+        return times, values
+
+    def mean_view(self, t0, t1, level):
+        """Per-record (mid times, means) of aggregated ``level`` (1-based) over [t0, t1]."""
+        records = self.levels[level - 1].select(t0, t1)
+        return (records["t0"] + records["t1"]) / 2, (records["sum"] / records["n"]).astype(np.float32)
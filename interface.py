@@ -1,35 +1,111 @@
+import os
 import sys
-import random
+import argparse
+import importlib
 import serial
 import time
 import threading
-from datetime import datetime, timedelta
-from scipy.interpolate import make_interp_spline
+from datetime import datetime
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QVBoxLayout, QWidget, QLabel, QPushButton, QComboBox, QSpinBox, QGridLayout, QMessageBox, QHBoxLayout
+    QApplication, QMainWindow, QVBoxLayout, QWidget, QLabel, QPushButton, QComboBox, QSpinBox, QGridLayout, QMessageBox, QHBoxLayout,
+    QFileDialog, QSlider
 )
-from PyQt5.QtCore import QTimer, Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import serial.tools.list_ports
-import qdarkstyle
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+from plot_backends import BACKENDS, DEFAULT_BACKEND, MatplotlibBackend, PlaceholderBackend, create_backend
+from command_channel import CommandChannel, gather, parse_status
+from decimation import Decimator
+from device_manager import DeviceManager
+from dsp_pipeline import Derivative, Pipeline, make_filter
+from recorder import SessionRecorder, new_session_dir
+from replay import ReplaySource, Session
+from simulator import SimulatorSource, dashboard_simulator
+from history import PyramidHistory
+from metrics import MetricsRegistry, append_report
+from serial_ingest import SPSCQueue, SerialReader
+from serial_link import STANDARD_BAUD_RATES, detect_baud_rate, link_budget, negotiate_baud_rate, try_baud_rate
+
+# Capacidad por canal: 10 min de historia a 1 kHz (periodo mínimo T1/T2 = 1 ms)
+BUFFER_CAPACITY = 600_000
+
+# Periodo mínimo de T1/T2 por unidad: en µs, 100 (10 kHz por canal, 60 s de historia);
+# por debajo ni el enlace ni el hilo de la GUI dan abasto, tampoco con la simulación
+MIN_PERIOD_BY_UNIT = {"µs": 100}
+
+# Velocidades de reproducción (etiqueta -> factor; None = lo más rápido posible)
+REPLAY_SPEEDS = {"1x": 1.0, "10x": 10.0, "100x": 100.0, "Máx": None}
+
+# Ventanas de historia (etiqueta -> segundos; None = la de la unidad de tiempo)
+HISTORY_WINDOWS = {"Auto": None, "10 min": 600.0, "1 h": 3600.0, "8 h (turno)": 8 * 3600.0}
+
+# Filtros del PC (etiqueta del combo -> dsp_pipeline.FILTER_KINDS)
+HOST_FILTERS = {
+    "Ninguno": "none",
+    "Media móvil": "mean",
+    "Mediana": "median",
+    "Paso bajo (IIR)": "lowpass",
+    "Savitzky-Golay": "savgol",
+}
+
+
+class CommandSignals(QObject):
+    """Carries command Future completions from the reader thread to the GUI thread."""
+    done = pyqtSignal(object, object)  # (callback, future)
+
+
+class PortScanSignals(QObject):
+    """Carries the port list from the background scan to the GUI thread."""
+    listed = pyqtSignal(object)  # [puerto, ...]
+
+
+class BaudSignals(QObject):
+    """Carries the result of a background baud-rate negotiation to the GUI thread."""
+    negotiated = pyqtSignal(object, object, object, object)  # (puerto, baudios, aviso o None, continuación)
 
 class RealTimeGraph(QMainWindow):
-    def __init__(self):
+    def __init__(self, plot_backend=None, extra_ports=(), board_ports=(), metrics_dump=None, metrics_interval=1.0,
+                 transport="thread", lazy=False):
         super().__init__()
         self.setWindowTitle("Monitoreo de Sensores en Tiempo Real")
         self.setGeometry(100, 100, 1400, 1000)  # Ventana más grande para 4 gráficas
 
         # Serial connection
         self.serial_port = None
+        self.extra_ports = list(extra_ports)  # puertos que comports() no lista (p. ej. el pty de virtual_device.py)
         self.baud_rate = 9600
         self.serial_conn = None
         self.serial_thread = None
+        self.commands = None  # Canal de comandos con confirmación OK:/ERROR:
+        self.board_ports = list(board_ports)  # puertos del modo Multi-placa (vacío = todos los listados)
+        self.device_manager = None  # DeviceManager del modo Multi-placa
+        # Transporte "asyncio": el puerto único se lee con corrutinas en este hilo (async_serial.py)
+        self.async_bridge = None
+        if transport == "asyncio":
+            from qt_asyncio import QtAsyncioBridge
+            self.async_bridge = QtAsyncioBridge(self)
+        self.command_signals = CommandSignals()
+        # En cola también desde el bucle asyncio: la callback no corre dentro de una iteración suya
+        self.command_signals.done.connect(lambda callback, future: callback(future), Qt.QueuedConnection)
+        self.baud_signals = BaudSignals()
+        self.baud_signals.negotiated.connect(self.finish_baud_negotiation)
+        self.negotiating_baud = False  # hay una negociación de baudios en otro hilo
         self.running = False  # Thread control flag
+        self.ingest_queue = SPSCQueue()  # Lotes del hilo lector hacia la GUI
+        self.recorder = None  # SessionRecorder activo (botón Grabar)
         self.use_simulated_data = True  # Flag to toggle between simulated and real data
+        self.data_source = "sim"  # "sim", "real", "multi" (varias placas) o "replay" (sesión grabada)
+        self.replay_session = None  # Session abierta para el modo Replay
+        self.replay_thread = None
+        self.simulator_thread = None  # SimulatorSource del modo Simulado
         self.is_paused = False  # Flag to pause/resume graphs
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_graphs)
+
+        # Instrumentación del pipeline (metrics.py): None = desactivada, sin coste
+        self.metrics = None
+        self.metrics_dump = metrics_dump  # fichero JSON Lines con un informe por intervalo
+        self.metrics_timer = QTimer()
+        self.metrics_timer.setInterval(int(metrics_interval * 1000))
+        self.metrics_timer.timeout.connect(self.report_metrics)
         
         # Flag to indicate time unit change (prevents recursion)
         self.updating_time_unit = False
@@ -37,19 +113,21 @@ class RealTimeGraph(QMainWindow):
         # Add connection status at class level
         self.connection_status = None
 
-        # Data buffers - separamos más claramente los datos de cada sensor
-        self.lux_data = []       # Datos de intensidad lumínica
-        self.lux_times = []      # Timestamps específicos para intensidad lumínica
-        self.dist_data = []      # Datos de distancia
-        self.dist_times = []     # Timestamps específicos para distancia
-        self.temp_data = []      # Datos de temperatura
-        self.temp_times = []     # Timestamps específicos para temperatura
-        self.intensity_data = [] # Datos de intensidad lumínica (lux)
-        self.intensity_times = []# Timestamps específicos para intensidad lumínica (lux)
-        
-        # Banderas para controlar si estamos recibiendo datos dentro del intervalo correcto
-        self.last_t1_time = None  # Último tiempo de muestreo para sensor de distancia
-        self.last_t2_time = None  # Último tiempo de muestreo para sensor de luz
+        # Data buffers - un buffer circular por sensor (tiempos epoch + valores) con
+        # niveles min/max/media 10x/100x/1000x para ver horas de historia
+        self.buffers = {
+            "lux": PyramidHistory(BUFFER_CAPACITY),        # Intensidad lumínica (%)
+            "dist": PyramidHistory(BUFFER_CAPACITY),       # Distancia (cm)
+            "temp": PyramidHistory(BUFFER_CAPACITY),       # Temperatura (°C)
+            "intensity": PyramidHistory(BUFFER_CAPACITY),  # Intensidad lumínica (lux)
+            "velocity": PyramidHistory(BUFFER_CAPACITY),   # Derivada de la distancia (cm/s)
+        }
+        # Buffers por placa en el modo Multi-placa (None = placa única); self.buffers es la visible
+        self.device_buffers = {None: self.buffers}
+
+        # Etapa de diezmado entre los buffers y las gráficas
+        self.decimation_mode = "minmax"
+        self.decimators = {name: Decimator(self.decimation_mode) for name in self.buffers}
 
         # Data synchronization lock
         self.data_lock = threading.Lock()
@@ -59,28 +137,15 @@ class RealTimeGraph(QMainWindow):
         self.setCentralWidget(self.main_widget)
         self.layout = QVBoxLayout(self.main_widget)
 
-        # Graphs
-        self.figure = Figure()
-        self.canvas = FigureCanvas(self.figure)
-        
-        # Crear 4 subplots en una matriz 2x2
-        self.ax_lux = self.figure.add_subplot(221)  # Arriba izquierda
-        self.ax_dist = self.figure.add_subplot(222)  # Arriba derecha
-        self.ax_temp = self.figure.add_subplot(223)  # Abajo izquierda
-        self.ax_intensity = self.figure.add_subplot(224)  # Abajo derecha
-        
-        self.figure.subplots_adjust(hspace=0.5, wspace=0.3)  # Ajustar espaciado
-        
-        # Agregar grid a todas las gráficas
-        self.ax_lux.grid(True)
-        self.ax_dist.grid(True)
-        self.ax_temp.grid(True)
-        self.ax_intensity.grid(True)
-        
-        self.layout.addWidget(self.canvas)
+        # Graphs - backend de gráficas seleccionable al iniciar. Con lazy la ventana se muestra
+        # antes: el backend (matplotlib tarda ~0.5 s) y la lista de puertos llegan en finish_startup
+        self.lazy = lazy
+        self.backend_name = plot_backend
+        self.plot_backend = PlaceholderBackend(self) if lazy else create_backend(plot_backend, self)
+        self.layout.addWidget(self.plot_backend.widget)
 
         # Initialize graph labels
-        self.initialize_graph_labels()
+        self.plot_backend.reset()
 
         # Controls layout
         self.controls_layout = QGridLayout()
@@ -103,8 +168,8 @@ class RealTimeGraph(QMainWindow):
         
         self.time_unit_label = QLabel("Unidad de Tiempo:")
         self.time_unit_combo = QComboBox()
-        self.time_unit_combo.addItems(["ms", "s", "min"])
-        self.time_unit_combo.setCurrentIndex(1)  # Default to seconds
+        self.time_unit_combo.addItems(["µs", "ms", "s", "min"])
+        self.time_unit_combo.setCurrentText("s")  # Default to seconds
         self.time_unit_combo.currentIndexChanged.connect(self.update_time_unit)
         self.controls_layout.addWidget(self.time_unit_label, 0, 1)
         self.controls_layout.addWidget(self.time_unit_combo, 0, 2)
@@ -112,7 +177,9 @@ class RealTimeGraph(QMainWindow):
         # Serial port selection
         self.port_label = QLabel("Puerto Serial:")
         self.port_combo = QComboBox()
-        self.refresh_ports()
+        self.port_signals = PortScanSignals()
+        self.port_signals.listed.connect(self.refresh_ports)
+        self.refresh_ports(self.extra_ports if lazy else None)
         self.controls_layout.addWidget(self.port_label, 0, 3)
         self.controls_layout.addWidget(self.port_combo, 0, 4)
 
@@ -142,12 +209,25 @@ class RealTimeGraph(QMainWindow):
         self.st_spinbox.setValue(10)
         self.st_spinbox.valueChanged.connect(self.update_st)
         self.controls_layout.addWidget(self.st_label, 2, 2)
+        self.controls_layout.addWidget(self.st_spinbox, 2, 3)
+
+        # Diezmado en la placa: promedia n conversiones y envía un solo valor
+        self.dt_label = QLabel("Diezmado en placa:")
+        self.dt_spinbox = QSpinBox()
+        self.dt_spinbox.setRange(1, 1000)
+        self.dt_spinbox.setValue(1)
+        self.dt_spinbox.valueChanged.connect(self.update_dt)
+        self.controls_layout.addWidget(self.dt_label, 2, 4)
+        self.controls_layout.addWidget(self.dt_spinbox, 2, 5)
         
         # Nuevo: Valor actual del sensor
         self.dist_value_label = QLabel("Valor Actual: -- cm")
         self.dist_value_label.setStyleSheet("font-weight: bold; color: green;")
         self.controls_layout.addWidget(self.dist_value_label, 1, 3, 1, 2)
 
+        self.velocity_label = QLabel("Velocidad: -- cm/s")
+        self.controls_layout.addWidget(self.velocity_label, 1, 5)
+
         # Sensor de Luz / Fotorresistencia
         self.add_section_title("Sensor de Luz / Fotorresistencia")
         self.t2_label = QLabel("Tiempo de Muestreo:")
@@ -174,6 +254,15 @@ class RealTimeGraph(QMainWindow):
         self.sl_spinbox.setValue(10)
         self.sl_spinbox.valueChanged.connect(self.update_sl)
         self.controls_layout.addWidget(self.sl_label, 4, 2)
+        self.controls_layout.addWidget(self.sl_spinbox, 4, 3)
+
+        self.dl_label = QLabel("Diezmado en placa:")
+        self.dl_spinbox = QSpinBox()
+        self.dl_spinbox.setRange(1, 1000)
+        self.dl_spinbox.setValue(1)
+        self.dl_spinbox.valueChanged.connect(self.update_dl)
+        self.controls_layout.addWidget(self.dl_label, 4, 4)
+        self.controls_layout.addWidget(self.dl_spinbox, 4, 5)
         
         # Nuevo: Valor actual del sensor
         self.lux_value_label = QLabel("Valor Actual: -- %")
@@ -198,6 +287,110 @@ class RealTimeGraph(QMainWindow):
         self.sync_button.clicked.connect(self.sync_all_settings)
         self.controls_layout.addWidget(self.sync_button, 5, 3)
 
+        self.render_button = QPushButton("Render: Blit")
+        self.render_button.clicked.connect(self.toggle_render_mode)
+        self.render_button.setEnabled(isinstance(self.plot_backend, MatplotlibBackend))
+        self.controls_layout.addWidget(self.render_button, 5, 4)
+
+        self.export_button = QPushButton("Exportar Gráficas")
+        self.export_button.clicked.connect(self.export_graphs)
+        self.controls_layout.addWidget(self.export_button, 5, 5)
+
+        self.decimation_label = QLabel("Diezmado:")
+        self.decimation_combo = QComboBox()
+        self.decimation_combo.addItems(["Min/Max", "LTTB", "Desactivado"])
+        self.decimation_combo.currentIndexChanged.connect(self.update_decimation)
+        self.controls_layout.addWidget(self.decimation_label, 6, 0)
+        self.controls_layout.addWidget(self.decimation_combo, 6, 1)
+
+        # Formato de las muestras enviadas por el STM32 (FMT:A / FMT:B)
+        self.format_label = QLabel("Formato Serial:")
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(["ASCII", "Binario"])
+        self.format_combo.currentIndexChanged.connect(self.update_format)
+        self.controls_layout.addWidget(self.format_label, 6, 2)
+        self.controls_layout.addWidget(self.format_combo, 6, 3)
+
+        # Velocidad del enlace serial (BR:<baudios>, con prueba de eco)
+        self.baud_label = QLabel("Baudios:")
+        self.baud_combo = QComboBox()
+        self.baud_combo.addItems(["Auto (máx)"] + [str(rate) for rate in sorted(STANDARD_BAUD_RATES)])
+        self.baud_combo.setCurrentText(str(self.baud_rate))
+        self.baud_combo.currentIndexChanged.connect(self.update_baud_rate)
+        self.controls_layout.addWidget(self.baud_label, 6, 4)
+        self.controls_layout.addWidget(self.baud_combo, 6, 5)
+
+        # Presupuesto de muestras/s del enlace para T1/T2/TU actuales
+        self.budget_label = QLabel("")
+        self.controls_layout.addWidget(self.budget_label, 7, 0, 1, 4)
+
+        # Modo de adquisición del STM32 (ACQ:S / ACQ:B, bloques por DMA)
+        self.acq_label = QLabel("Adquisición:")
+        self.acq_combo = QComboBox()
+        self.acq_combo.addItems(["Muestra a muestra", "Bloques (DMA)"])
+        self.acq_combo.currentIndexChanged.connect(self.update_acquisition_mode)
+        self.controls_layout.addWidget(self.acq_label, 7, 4)
+        self.controls_layout.addWidget(self.acq_combo, 7, 5)
+
+        # Filtro en el PC sobre lotes completos (dsp_pipeline.py), con la
+        # ventana de ST/SL; sustituye al filtro del firmware
+        self.host_filter_label = QLabel("Filtro en PC:")
+        self.host_filter_combo = QComboBox()
+        self.host_filter_combo.addItems(list(HOST_FILTERS))
+        self.host_filter_combo.currentIndexChanged.connect(self.update_host_filter)
+        self.controls_layout.addWidget(self.host_filter_label, 8, 0)
+        self.controls_layout.addWidget(self.host_filter_combo, 8, 1)
+        self.pipeline = self.build_pipeline()
+
+        # Grabación de la sesión a disco (recorder.py)
+        self.record_button = QPushButton("Grabar")
+        self.record_button.clicked.connect(self.toggle_recording)
+        self.controls_layout.addWidget(self.record_button, 8, 2)
+        self.record_label = QLabel("")
+        self.controls_layout.addWidget(self.record_label, 8, 3, 1, 3)
+
+        # Reproducción de una sesión grabada (modo Replay)
+        self.replay_label = QLabel("Reproducción:")
+        self.replay_speed_combo = QComboBox()
+        self.replay_speed_combo.addItems(list(REPLAY_SPEEDS))
+        self.replay_speed_combo.currentIndexChanged.connect(self.update_replay_speed)
+        self.replay_slider = QSlider(Qt.Horizontal)
+        self.replay_slider.setRange(0, 1000)
+        self.replay_slider.sliderReleased.connect(self.seek_replay)
+        self.replay_position_label = QLabel("--")
+        self.controls_layout.addWidget(self.replay_label, 9, 0)
+        self.controls_layout.addWidget(self.replay_speed_combo, 9, 1)
+        self.controls_layout.addWidget(self.replay_slider, 9, 2, 1, 3)
+        self.controls_layout.addWidget(self.replay_position_label, 9, 5)
+
+        # Ventana visible: más allá de la historia completa se usan los niveles agregados
+        self.history_label = QLabel("Historia:")
+        self.history_combo = QComboBox()
+        self.history_combo.addItems(list(HISTORY_WINDOWS))
+        self.controls_layout.addWidget(self.history_label, 10, 0)
+        self.controls_layout.addWidget(self.history_combo, 10, 1)
+
+        # Métricas del pipeline en la barra de estado (tiempos por etapa, muestras/s, descartes)
+        self.metrics_button = QPushButton("Métricas: No")
+        self.metrics_button.clicked.connect(self.toggle_metrics)
+        self.controls_layout.addWidget(self.metrics_button, 10, 2)
+        self.metrics_label = QLabel("")
+        self.statusBar().addPermanentWidget(self.metrics_label, 1)
+        self.statusBar().hide()
+
+        # Modo Multi-placa: placa que se muestra y destino de los comandos
+        self.device_label = QLabel("Placa:")
+        self.device_combo = QComboBox()
+        self.device_combo.currentIndexChanged.connect(self.select_device)
+        self.command_target_label = QLabel("Comandos a:")
+        self.command_target_combo = QComboBox()
+        self.command_target_combo.addItems(["Todas las placas", "Placa visible"])
+        self.command_target_combo.currentIndexChanged.connect(self.update_command_target)
+        self.controls_layout.addWidget(self.device_label, 11, 0)
+        self.controls_layout.addWidget(self.device_combo, 11, 1)
+        self.controls_layout.addWidget(self.command_target_label, 11, 2)
+        self.controls_layout.addWidget(self.command_target_combo, 11, 3)
+
         # Apply dark theme
         self.apply_dark_theme()
         
@@ -206,8 +399,29 @@ class RealTimeGraph(QMainWindow):
 
     def apply_dark_theme(self):
         """Apply QDarkStyle theme."""
+        import qdarkstyle
         self.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
 
+    def finish_startup(self):
+        """Deferred part of a lazy start, run once the window is on screen."""
+        if isinstance(self.plot_backend, PlaceholderBackend):
+            self.build_plot_backend()
+        self.scan_ports()
+        # Los filtros del PC usan scipy.signal: se importa ya, en segundo plano
+        threading.Thread(target=importlib.import_module, args=("scipy.signal",), daemon=True).start()
+
+    def build_plot_backend(self):
+        """Replace the startup placeholder with the selected plot backend."""
+        placeholder = self.plot_backend
+        backend = create_backend(self.backend_name, self)
+        backend.set_window(placeholder.window_s)
+        backend.set_metrics(placeholder.metrics)
+        self.layout.replaceWidget(placeholder.widget, backend.widget)
+        placeholder.widget.deleteLater()
+        self.plot_backend = backend
+        backend.reset()
+        self.render_button.setEnabled(isinstance(backend, MatplotlibBackend))
+
     def add_section_title(self, title):
         """Add a styled section title."""
         title_label = QLabel(title)
@@ -215,13 +429,15 @@ class RealTimeGraph(QMainWindow):
         title_label.setStyleSheet("font-weight: bold; font-size: 14px; margin-top: 10px;")
         self.controls_layout.addWidget(title_label, self.controls_layout.rowCount(), 0, 1, 3)
 
-    def refresh_ports(self):
-        """Refresh available serial ports and reset graph data."""
+    def refresh_ports(self, ports=None):
+        """Refresh available serial ports (``ports``: an already listed set, e.g. from scan_ports)."""
+        current = self.port_combo.currentText()
         self.port_combo.clear()
         try:
-            ports = serial.tools.list_ports.comports()
-            for port in ports:
-                self.port_combo.addItem(port.device)
+            for port in self.list_ports() if ports is None else ports:
+                self.port_combo.addItem(port)
+            if current:
+                self.port_combo.setCurrentText(current)
             
             # Add refresh button if it doesn't exist
             if not hasattr(self, 'refresh_button'):
@@ -231,319 +447,553 @@ class RealTimeGraph(QMainWindow):
         except Exception as e:
             print(f"Error refreshing ports: {e}")
 
+    def list_ports(self):
+        """Serial ports to offer: the extra ones first, then what the system lists."""
+        import serial.tools.list_ports
+        ports = [port.device for port in serial.tools.list_ports.comports()]
+        return self.extra_ports + [port for port in ports if port not in self.extra_ports]
+
+    def scan_ports(self):
+        """List the serial ports on a background thread (comports() can take seconds on Windows)."""
+        def scan():
+            try:
+                self.port_signals.listed.emit(self.list_ports())
+            except Exception as e:
+                print(f"Error refreshing ports: {e}")
+
+        threading.Thread(target=scan, daemon=True).start()
+
     def reset_and_refresh(self):
         """Reset graph data and refresh ports."""
         # Clear all data arrays with thread safety
-        with self.data_lock:
-            # Actualizar para usar los nuevos arrays
-            self.dist_times = []
-            self.lux_times = []
-            self.dist_data = []
-            self.lux_data = []
-            self.temp_times = []
-            self.temp_data = []
-            self.intensity_times = []
-            self.intensity_data = []
+        self.clear_buffers()
             
         # Redraw empty graphs
-        self.initialize_graph_labels()
+        self.plot_backend.reset()
             
         # Refresh ports
         self.port_combo.clear()
         try:
-            ports = serial.tools.list_ports.comports()
-            for port in ports:
-                self.port_combo.addItem(port.device)
+            for port in self.list_ports():
+                self.port_combo.addItem(port)
             print("Ports refreshed and graphs reset")
         except Exception as e:
             print(f"Error refreshing ports: {e}")
 
-    def initialize_graph_labels(self):
-        """Set initial labels and titles for all graphs."""
-        # Limpiar todas las gráficas
-        self.ax_lux.clear()
-        self.ax_dist.clear()
-        self.ax_temp.clear()
-        self.ax_intensity.clear()
-        
-        # Asegurar que el grid esté visible en todas las gráficas
-        self.ax_lux.grid(True)
-        self.ax_dist.grid(True)
-        self.ax_temp.grid(True)
-        self.ax_intensity.grid(True)
-        
-        # Configurar cada gráfica
-        self.ax_lux.set_title("Fotorresistencia - Intensidad Lumínica (%)")
-        self.ax_lux.set_xlabel("Tiempo")
-        self.ax_lux.set_ylabel("Intensidad Lumínica (%)")
-        self.ax_lux.legend(["Intensidad Lumínica (%)"], loc="upper right")
-
-        self.ax_dist.set_title("Sharp - Distancia (cm)")
-        self.ax_dist.set_xlabel("Tiempo")
-        self.ax_dist.set_ylabel("Distancia (cm)")
-        self.ax_dist.legend(["Distancia (cm)"], loc="upper right")
-        
-        self.ax_temp.set_title("Temperatura (°C)")
-        self.ax_temp.set_xlabel("Tiempo")
-        self.ax_temp.set_ylabel("Temperatura (°C)")
-        self.ax_temp.legend(["Temperatura"], loc="upper right")
-        
-        self.ax_intensity.set_title("Intensidad Lumínica (lux)")
-        self.ax_intensity.set_xlabel("Tiempo")
-        self.ax_intensity.set_ylabel("Intensidad (lux)")
-        self.ax_intensity.legend(["Intensidad"], loc="upper right")
+    def toggle_render_mode(self):
+        """Switch the matplotlib backend between blitting and full redraws."""
+        mode = self.plot_backend.toggle_render_mode()
+        self.render_button.setText("Render: Blit" if mode == "blit" else "Render: Completo")
+
+    def update_decimation(self):
+        """Select the decimation mode applied before plotting."""
+        modes = {"Min/Max": "minmax", "LTTB": "lttb", "Desactivado": None}
+        self.decimation_mode = modes[self.decimation_combo.currentText()]
 
-        self.canvas.draw()
+    def export_graphs(self):
+        """Save the current graphs as a static image."""
+        path, _ = QFileDialog.getSaveFileName(self, "Exportar Gráficas", "graficas.png", "Imágenes (*.png *.svg *.pdf)")
+        if not path:
+            return
+        try:
+            self.plot_backend.export(path)
+        except Exception as e:
+            print(f"Error exporting graphs: {e}")
+            QMessageBox.critical(self, "Error", f"No se pudieron exportar las gráficas:\n{str(e)}")
 
     def update_graphs(self):
         """Update all graphs with thread-safety and debug output."""
-        if self.updating_time_unit or self.is_paused:
-            return
+        if self.negotiating_baud:
+            return  # el lector está parado: no llega nada a la cola
 
+        metrics = self.metrics
+        if metrics is not None:
+            t_frame = time.perf_counter()
         try:
-            if self.use_simulated_data:
-                self.generate_simulated_data()
+            # La cola se vacía siempre: en pausa la cola acotada se llenaría y
+            # perdería lotes; solo se deja de dibujar
+            self.drain_ingest_queue()
+            if self.updating_time_unit or self.is_paused:
+                return
+
+            if not self.plot_backend.should_render():
+                if metrics is not None:
+                    metrics.count("gui.frames_skipped")
+                return
+
+            window_s = self.view_window_seconds()
+            max_points = 2 * self.plot_backend.plot_width_px()
+            now = self.current_time()
+            if window_s > self.max_history_seconds():
+                # Ventana mayor que la historia completa: nivel agregado que quepa en pantalla
+                with self.data_lock:
+                    views = {name: buf.view(now - window_s, now, max_points) for name, buf in self.buffers.items()}
+                self.render_views(views, window_s, now, t_frame if metrics is not None else None)
+                return
 
-            # Hacer copia segura de los datos
+            # Vistas (sin copia) de la ventana retenida de cada canal
             with self.data_lock:
-                # Copiar datos existentes
-                dist_times = self.dist_times.copy() if self.dist_times else [datetime.now()]
-                dist_data = self.dist_data.copy() if self.dist_data else [0.0]
-                lux_times = self.lux_times.copy() if self.lux_times else [datetime.now()]
-                lux_data = self.lux_data.copy() if self.lux_data else [0.0]
-                
-                # Copiar nuevos datos
-                temp_times = self.temp_times.copy() if self.temp_times else [datetime.now()]
-                temp_data = self.temp_data.copy() if self.temp_data else [25.0]
-                intensity_times = self.intensity_times.copy() if self.intensity_times else [datetime.now()]
-                intensity_data = self.intensity_data.copy() if self.intensity_data else [500.0]
-
-            # Limpiar todas las gráficas
-            self.ax_lux.clear()
-            self.ax_dist.clear()
-            self.ax_temp.clear()
-            self.ax_intensity.clear()
-
-            # Configurar grid para todas las gráficas
-            self.ax_lux.grid(True)
-            self.ax_dist.grid(True)
-            self.ax_temp.grid(True)
-            self.ax_intensity.grid(True)
-
-            # Plotear los datos existentes
-            if lux_times and len(lux_times) > 0:
-                if len(lux_times) == 1:
-                    lux_times = [lux_times[0], lux_times[0] + timedelta(seconds=1)]
-                    lux_data = [lux_data[0], lux_data[0]]
-                self.ax_lux.plot(lux_times, lux_data, label="Intensidad Lumínica (%)", 
-                                 color="blue", marker="o", linestyle="-", markersize=4)
-
-            if dist_times and len(dist_times) > 0:
-                if len(dist_times) == 1:
-                    dist_times = [dist_times[0], dist_times[0] + timedelta(seconds=1)]
-                    dist_data = [dist_data[0], dist_data[0]]
-                self.ax_dist.plot(dist_times, dist_data, label="Distancia (cm)", 
-                                  color="green", marker="o", linestyle="-", markersize=4)
-
-            # Plotear nuevos datos
-            if temp_times and len(temp_times) > 0:
-                if len(temp_times) == 1:
-                    temp_times = [temp_times[0], temp_times[0] + timedelta(seconds=1)]
-                    temp_data = [temp_data[0], temp_data[0]]
-                self.ax_temp.plot(temp_times, temp_data, label="Temperatura (°C)", 
-                                  color="red", marker="o", linestyle="-", markersize=4)
-
-            if intensity_times and len(intensity_times) > 0:
-                if len(intensity_times) == 1:
-                    intensity_times = [intensity_times[0], intensity_times[0] + timedelta(seconds=1)]
-                    intensity_data = [intensity_data[0], intensity_data[0]]
-                self.ax_intensity.plot(intensity_times, intensity_data, label="Intensidad (lux)", 
-                                       color="purple", marker="o", linestyle="-", markersize=4)
-
-            # Configurar títulos y etiquetas
-            self.initialize_graph_labels()
-
-            # Auto-ajustar diseño
-            self.figure.tight_layout()
-            
-            # Actualizar canvas
-            self.canvas.draw()
+                views = {name: buf.window() for name, buf in self.buffers.items()}
+
+            # Diezmado a ~2 puntos por píxel antes de entregar los datos al backend
+            if metrics is not None:
+                t_decimate = time.perf_counter()
+            for name, (times, values) in views.items():
+                decimator = self.decimators[name]
+                decimator.configure(window_s, max_points, self.decimation_mode)
+                views[name] = decimator.process(times, values)
+            if metrics is not None:
+                metrics.observe("gui.decimate_ms", (time.perf_counter() - t_decimate) * 1000)
+
+            self.render_views(views, window_s, now, t_frame if metrics is not None else None)
 
         except Exception as e:
             print(f"Error in update_graphs: {e}")
             import traceback
             traceback.print_exc()
 
-    def generate_simulated_data(self):
-        """Generate simulated data for all sensors."""
-        if self.updating_time_unit:
+    def render_views(self, views, window_s, now, t_frame=None):
+        """Hand the views to the plot backend; with metrics on, time the render and the frame."""
+        self.plot_backend.set_window(window_s)
+        metrics = self.metrics
+        if metrics is None:
+            self.plot_backend.render(views, now)
             return
-            
+        t_render = time.perf_counter()
+        self.plot_backend.render(views, now)
+        t_end = time.perf_counter()
+        metrics.observe("gui.render_ms", (t_end - t_render) * 1000)
+        metrics.observe("gui.frame_ms", (t_end - t_frame) * 1000)
+        metrics.count("gui.frames")
+        metrics.set("gui.points", sum(len(times) for times, _ in views.values()))
+
+    def max_history_seconds(self):
+        """Visible history window in seconds for the current time unit."""
+        return 600.0 if self.time_unit_combo.currentText() == "min" else 60.0
+
+    def view_window_seconds(self):
+        """Visible time span: the History selection, or the full-resolution window."""
+        selected = HISTORY_WINDOWS[self.history_combo.currentText()]
+        return self.max_history_seconds() if selected is None else selected
+
+    def trim_old_data(self, now_ts):
+        """Expire full-resolution samples older than the window (levels keep theirs). Caller holds data_lock."""
+        cutoff = now_ts - self.max_history_seconds()
+        for buffers in self.device_buffers.values():
+            for buf in buffers.values():
+                buf.expire_before(cutoff)
+
+    def clear_buffers(self):
+        """Empty every channel buffer."""
+        with self.data_lock:
+            for buffers in self.device_buffers.values():
+                for buf in buffers.values():
+                    buf.clear()
+
+    def drain_ingest_queue(self):
+        """Move every batch queued by the serial reader into the data buffers."""
+        batches = self.ingest_queue.drain()
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.set("queue.depth", len(batches))
+        if not batches:
+            return
+        
+        if metrics is not None:
+            t_wait = time.perf_counter()
+        with self.data_lock:
+            if metrics is not None:
+                t_locked = time.perf_counter()
+                metrics.observe("gui.lock_wait_ms", (t_locked - t_wait) * 1000)
+            for batch in batches:
+                for name, (times, values) in batch.channels.items():
+                    device = batch.device
+                    if "/" in name:
+                        device, name = name.split("/", 1)  # sesión multi-placa reproducida
+                    self.buffers_for(device)[name].extend(times, values)
+                    if metrics is not None:
+                        metrics.count(f"samples.{name}" if device is None else f"samples.{device}/{name}", len(times))
+                for msg in batch.messages:
+                    print(f"STM32: {msg}")
+            self.trim_old_data(batches[-1].t_recv)
+            if metrics is not None:
+                metrics.observe("gui.append_ms", (time.perf_counter() - t_locked) * 1000)
+        if len(self.device_buffers) > self.device_combo.count() + 1:
+            self.refresh_device_combo()
+        if self.replay_thread is not None:
+            self.update_replay_position()
+        
+        # Actualizamos los valores actuales una vez por tick, no por muestra
+        dist = self.buffers["dist"].last()
+        if dist is not None:
+            self.dist_value_label.setText(f"Valor Actual: {dist:.2f} cm")
+        lux = self.buffers["lux"].last()
+        if lux is not None:
+            self.lux_value_label.setText(f"Valor Actual: {lux:.2f} %")
+        velocity = self.buffers["velocity"].last()
+        if velocity is not None:
+            self.velocity_label.setText(f"Velocidad: {velocity:.1f} cm/s")
+        if self.recorder is not None:
+            self.record_label.setText(
+                f"Grabando {self.recorder.session_dir}: {self.recorder.samples} muestras, "
+                f"{self.recorder.bytes_written / 1e6:.1f} MB, {self.recorder.dropped} lotes perdidos"
+            )
+
+    def buffers_for(self, device):
+        """Channel buffers of ``device`` (None = single board), created on its first batch. Caller holds data_lock."""
+        buffers = self.device_buffers.get(device)
+        if buffers is None:
+            # Mismos canales que la placa única (np.zeros: las páginas se ocupan al escribirlas)
+            buffers = {name: PyramidHistory(BUFFER_CAPACITY) for name in self.buffers}
+            self.device_buffers[device] = buffers
+        return buffers
+
+    def refresh_device_combo(self):
+        """List newly seen boards in the Placa combo (outside data_lock: selecting one takes it)."""
+        known = {self.device_combo.itemText(i) for i in range(self.device_combo.count())}
+        for device in list(self.device_buffers):
+            if device is not None and device not in known:
+                self.device_combo.addItem(device)
+
+    def select_device(self):
+        """Show the board picked in the Placa combo (Multi-placa mode)."""
+        device = self.device_combo.currentText()
+        with self.data_lock:
+            self.buffers = self.device_buffers.get(device or None, self.device_buffers[None])
+        for decimator in self.decimators.values():
+            decimator.reset()  # la caché es de la placa anterior
+        self.update_command_target()
+
+    def update_command_target(self):
+        """Send commands to every board or only to the one on screen."""
+        if self.device_manager is not None:
+            visible_only = self.command_target_combo.currentIndex() == 1
+            self.device_manager.commands.target = (self.device_combo.currentText() or None) if visible_only else None
+
+    def reset_device_buffers(self):
+        """Forget every board but the single-board buffers (new Multi-placa session)."""
+        with self.data_lock:
+            self.device_buffers = {None: self.device_buffers[None]}
+            self.buffers = self.device_buffers[None]
+        self.device_combo.blockSignals(True)
+        self.device_combo.clear()
+        self.device_combo.blockSignals(False)
+
+    def start_devices(self):
+        """Open every board port at once and start the shared selector reader."""
+        self.disconnect_serial()
+        self.reset_device_buffers()
+        ports = self.board_ports or self.list_ports()
+        if not ports:
+            raise ValueError("No hay puertos serie para las placas")
+        selection = self.baud_combo.currentText()
+        baud = "auto" if selection.startswith("Auto") else int(selection)
+        self.connection_status.setText(f"Estado: Abriendo {len(ports)} puertos...")
+        QApplication.processEvents()
+
+        manager = DeviceManager(self.ingest_queue)
+        opened = manager.open_all(ports, baud)
+        if not opened:
+            raise ConnectionError("Ninguna placa respondió a PING")
+        self.ingest_queue.clear()
+        self.pipeline.reset()
+        manager.set_binary(self.binary_stream())
+        manager.pipeline = self.pipeline
+        manager.recorder = self.recorder
+        manager.metrics = self.metrics
+        manager.start()
+        self.device_manager = self.serial_thread = manager
+        self.commands = manager.commands
+        self.update_command_target()
+
+        self.send_command(f"FMT:{self.format_code()}")
+        self.send_command(f"ACQ:{self.acq_code()}")
+        self.send_command("a")
+        return opened
+
+    def read_serial_data(self):
+        """Start reading the open serial connection (ingest thread or asyncio link)."""
+        self.ingest_queue.clear()
+        self.running = True
+        if self.async_bridge is not None:
+            from async_serial import AsyncSerialLink
+            self.serial_thread = AsyncSerialLink(self.serial_conn, self.ingest_queue)
+        else:
+            self.serial_thread = SerialReader(self.serial_conn, self.ingest_queue)
+        self.serial_thread.set_binary(self.binary_stream())
+        self.pipeline.reset()
+        self.serial_thread.pipeline = self.pipeline
+        self.serial_thread.recorder = self.recorder
+        self.serial_thread.metrics = self.metrics
+        if self.async_bridge is not None:
+            # El enlace trae su propio canal de comandos (corrutinas sobre el mismo bucle)
+            self.async_bridge.run(self.serial_thread.open())
+            self.commands = self.serial_thread.commands
+            return
+        if self.commands is None:
+            self.commands = CommandChannel(self.serial_conn)
+            self.commands.metrics = self.metrics
+        self.serial_thread.commands = self.commands
+        self.serial_thread.start()
+
+    def send_command(self, command, on_done=None):
+        """Queue a command for the STM32; ``on_done(future)`` runs on the GUI thread.
+
+        Returns the command's Future, or None when no port is open.
+        """
+        if self.commands is None or not self.link_open():
+            return None
+        future = self.commands.send(command)
+        self.when_done(future, on_done or self.report_command_result)
+        return future
+
+    def link_open(self):
+        """True while a serial port (or the Multi-placa boards) can take commands."""
+        return self.device_manager is not None or bool(self.serial_conn and self.serial_conn.is_open)
+
+    def when_done(self, future, callback):
+        """Run ``callback(future)`` on the GUI thread once ``future`` completes."""
+        future.add_done_callback(lambda f: self.command_signals.done.emit(callback, f))
+
+    def report_command_result(self, future):
+        """Default completion handler: log commands the STM32 rejected or ignored."""
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error en comando: {future.exception()}")
+
+    def toggle_recording(self):
+        """Start or stop recording every ingested sample to a session directory."""
         try:
-            now = datetime.now()
-            
-            # Crear puntos iniciales si es necesario
-            if not self.dist_data or len(self.dist_data) == 0:
-                with self.data_lock:
-                    self.dist_data.append(75.0)  # Valor inicial razonable
-                    self.dist_times.append(now)
-                    
-            if not self.lux_data or len(self.lux_data) == 0:
-                with self.data_lock:
-                    self.lux_data.append(50.0)  # Valor inicial razonable
-                    self.lux_times.append(now)
-            
-            with self.data_lock:
-                # Solo generamos datos de distancia cuando toca según el intervalo configurado
-                if hasattr(self, 'next_t1_sample_time') and now >= self.next_t1_sample_time:
-                    # Datos del sensor Sharp (distancia)
-                    last_dist = self.dist_data[-1] if self.dist_data else 75.0
-                    
-                    # Determinamos la magnitud del cambio según la unidad de tiempo
-                    time_unit = self.time_unit_combo.currentText()
-                    if time_unit == "ms":
-                        dist_change = random.uniform(-0.5, 0.5)
-                    elif time_unit == "min":
-                        dist_change = random.uniform(-3, 3)
-                    else:  # segundos
-                        dist_change = random.uniform(-1, 1)
-                    
-                    # Generamos el nuevo valor
-                    new_dist = max(10, min(150, last_dist + dist_change))
-                    
-                    # Agregamos a los arrays específicos de distancia
-                    self.dist_data.append(new_dist)
-                    self.dist_times.append(now)
-                    
-                    # Actualizamos el valor actual
-                    self.dist_value_label.setText(f"Valor Actual: {new_dist:.2f} cm")
-                    
-                    # Calculamos el siguiente tiempo de muestreo
-                    self.next_t1_sample_time = self.next_t1_sample_time + timedelta(milliseconds=self.t1_interval_ms)
-                    
-                    # Si nos retrasamos, corregimos el próximo tiempo
-                    if self.next_t1_sample_time < now:
-                        self.next_t1_sample_time = now + timedelta(milliseconds=self.t1_interval_ms)
-                    
-                # Solo generamos datos de luz cuando toca según el intervalo configurado
-                if hasattr(self, 'next_t2_sample_time') and now >= self.next_t2_sample_time:
-                    # Datos del sensor de luz
-                    last_lux = self.lux_data[-1] if self.lux_data else 50.0
-                    
-                    # Determinamos la magnitud del cambio según la unidad de tiempo
-                    time_unit = self.time_unit_combo.currentText()
-                    if time_unit == "ms":
-                        lux_change = random.uniform(-1, 1)
-                    elif time_unit == "min":
-                        lux_change = random.uniform(-5, 5)
-                    else:  # segundos
-                        lux_change = random.uniform(-2, 2)
-                    
-                    # Generamos el nuevo valor
-                    new_lux = max(0, min(100, last_lux + lux_change))
-                    
-                    # Agregamos a los arrays específicos de luz
-                    self.lux_data.append(new_lux)
-                    self.lux_times.append(now)
-                    
-                    # Actualizamos el valor actual
-                    self.lux_value_label.setText(f"Valor Actual: {new_lux:.2f} %")
-                    
-                    # Calculamos el siguiente tiempo de muestreo
-                    self.next_t2_sample_time = self.next_t2_sample_time + timedelta(milliseconds=self.t2_interval_ms)
-                    
-                    # Si nos retrasamos, corregimos el próximo tiempo
-                    if self.next_t2_sample_time < now:
-                        self.next_t2_sample_time = now + timedelta(milliseconds=self.t2_interval_ms)
-                
-                # Generar datos de temperatura
-                if not self.temp_data:
-                    self.temp_data.append(25.0)
-                    self.temp_times.append(now)
-                last_temp = self.temp_data[-1]
-                new_temp = max(15, min(35, last_temp + random.uniform(-0.5, 0.5)))
-                self.temp_data.append(new_temp)
-                self.temp_times.append(now)
-                
-                # Generar datos de intensidad lumínica
-                if not self.intensity_data:
-                    self.intensity_data.append(500.0)
-                    self.intensity_times.append(now)
-                last_intensity = self.intensity_data[-1]
-                new_intensity = max(0, min(1000, last_intensity + random.uniform(-50, 50)))
-                self.intensity_data.append(new_intensity)
-                self.intensity_times.append(now)
-                
-                # Limpiamos los datos antiguos basados en la unidad de tiempo
-                time_unit = self.time_unit_combo.currentText()
-                max_duration = timedelta(minutes=10) if time_unit == "min" else timedelta(seconds=60)
-                
-                # Limpiamos arrays de distancia
-                while len(self.dist_times) > 1 and now - self.dist_times[0] > max_duration:
-                    self.dist_times.pop(0)
-                    self.dist_data.pop(0)
-                
-                # Limpiamos arrays de luz
-                while len(self.lux_times) > 1 and now - self.lux_times[0] > max_duration:
-                    self.lux_times.pop(0)
-                    self.lux_data.pop(0)
-                
-                # Limpiamos arrays de temperatura
-                while len(self.temp_times) > 1 and now - self.temp_times[0] > max_duration:
-                    self.temp_times.pop(0)
-                    self.temp_data.pop(0)
-                
-                # Limpiamos arrays de intensidad lumínica
-                while len(self.intensity_times) > 1 and now - self.intensity_times[0] > max_duration:
-                    self.intensity_times.pop(0)
-                    self.intensity_data.pop(0)
-                
+            if self.recorder is not None:
+                self.stop_recording()
+                return
+            self.recorder = SessionRecorder(new_session_dir())
+            self.recorder.start()
+            if self.serial_thread is not None:
+                self.serial_thread.recorder = self.recorder
+            self.record_button.setText("Detener grabación")
+            self.record_label.setText(f"Grabando {self.recorder.session_dir}")
         except Exception as e:
-            print(f"Error generating simulated data: {e}")
-            import traceback
-            traceback.print_exc()
+            print(f"Error in toggle_recording: {e}")
+            self.recorder = None
+            QMessageBox.critical(self, "Error", f"No se pudo iniciar la grabación:\n{str(e)}")
+
+    def stop_recording(self):
+        """Flush, fsync and close the active recording, if any."""
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return
+        if self.serial_thread is not None:
+            self.serial_thread.recorder = None
+        recorder.stop()
+        self.record_button.setText("Grabar")
+        self.record_label.setText(f"Sesión guardada: {recorder.session_dir} ({recorder.samples} muestras)")
+
+    def toggle_metrics(self):
+        """Switch the pipeline instrumentation and its status-bar overlay on or off."""
+        if self.metrics is None:
+            self.metrics = MetricsRegistry()
+            self.metrics_timer.start()
+            self.statusBar().show()
+            self.metrics_label.setText("Métricas: midiendo...")
+            self.metrics_button.setText("Métricas: Sí")
+        else:
+            self.metrics = None
+            self.metrics_timer.stop()
+            self.statusBar().hide()
+            self.metrics_button.setText("Métricas: No")
+        # Los hooks leen su atributo metrics; None los deja en una comprobación
+        if self.serial_thread is not None:
+            self.serial_thread.metrics = self.metrics
+        if self.commands is not None:
+            self.commands.metrics = self.metrics
+        self.plot_backend.set_metrics(self.metrics)
+
+    def report_metrics(self):
+        """Refresh the overlay from the last interval and append it to the dump file."""
+        metrics = self.metrics
+        if metrics is None:
+            return
+        # Contadores que ya llevan los componentes, sin hooks propios
+        metrics.set("queue.dropped", self.ingest_queue.dropped)
+        if self.commands is not None:
+            metrics.set("commands.timeouts", self.commands.timeouts)
+        report = metrics.interval()
+        self.metrics_label.setText(self.format_metrics(report))
+        if self.metrics_dump:
+            try:
+                append_report(self.metrics_dump, report)
+            except Exception as e:
+                print(f"Error writing metrics: {e}")
+                self.metrics_dump = None
+
+    def format_metrics(self, report):
+        """One-line overlay text for an interval report."""
+        hist, rates, gauges, counters = report["histograms"], report["rates"], report["gauges"], report["counters"]
+        frame = hist.get("gui.frame_ms", {})
+        render = hist.get("gui.render_ms", {})
+        parts = [
+            f"{rates.get('gui.frames', 0.0):.1f} FPS",
+            f"render {render.get('p50', 0.0):.1f} ms (p95 {render.get('p95', 0.0):.1f}, frame máx {frame.get('max', 0.0):.1f})",
+            f"{int(gauges.get('gui.points', 0))} puntos",
+        ]
+        samples = [f"{name.split('.', 1)[1]} {rate:.0f}" for name, rate in sorted(rates.items()) if name.startswith("samples.")]
+        if samples:
+            parts.append("muestras/s: " + " ".join(samples))
+        if "serial.bytes" in rates:
+            parts.append(f"{rates['serial.bytes'] / 1000:.1f} kB/s")
+            parts.append(f"parse p95 {hist.get('serial.parse_ms', {}).get('p95', 0.0):.2f} ms")
+        lost = int(gauges.get("queue.dropped", 0) + gauges.get("serial.dropped_frames", 0) + gauges.get("serial.crc_errors", 0))
+        parts.append(f"perdidos {lost}, sin parsear {counters.get('serial.unparsed', 0)}")
+        if "commands.rtt_ms" in hist and hist["commands.rtt_ms"]["count"]:
+            parts.append(f"cmd {hist['commands.rtt_ms']['p50']:.1f} ms")
+        if "async.loop_lag_ms" in hist and hist["async.loop_lag_ms"]["count"]:
+            parts.append(f"retardo asyncio p95 {hist['async.loop_lag_ms']['p95']:.1f} ms")
+        return " | ".join(parts)
+
+    def disconnect_serial(self):
+        """Stop the ingest thread and close the serial port."""
+        self.running = False
+        if self.serial_thread is not None:
+            self.serial_thread.stop()
+            self.serial_thread = None
+        if self.commands is not None:
+            self.commands.cancel_all()
+            self.commands = None
+        self.device_manager = None  # su stop() ya cerró los puertos de las placas
+        if self.serial_conn is not None:
+            try:
+                if self.serial_conn.is_open:
+                    self.serial_conn.close()
+            except Exception as e:
+                print(f"Error closing serial port: {e}")
+            self.serial_conn = None
 
     def toggle_data_source(self):
-        """Toggle between simulated and real data sources."""
+        """Cycle the data source: simulated -> real serial -> recorded session replay."""
         try:
-            self.use_simulated_data = not self.use_simulated_data
-            
-            # Update button text
-            self.toggle_data_button.setText("Modo: Simulado" if self.use_simulated_data else "Modo: Real")
-            
             # Stop any current acquisition
             self.stop_acquisition()
             
+            next_source = {"sim": "real", "real": "multi", "multi": "replay", "replay": "sim"}[self.data_source]
+            if next_source == "replay" and not self.open_replay_session():
+                next_source = "sim"
+            self.data_source = next_source
+            self.use_simulated_data = next_source == "sim"
+            
+            # Update button text
+            self.toggle_data_button.setText({"sim": "Modo: Simulado", "real": "Modo: Real", "multi": "Modo: Multi-placa",
+                                             "replay": "Modo: Replay"}[next_source])
+            
             # Clear existing data
-            with self.data_lock:
-                self.dist_times = []
-                self.lux_times = []
-                self.dist_data = []
-                self.lux_data = []
-                self.temp_times = []
-                self.temp_data = []
-                self.intensity_times = []
-                self.intensity_data = []
+            self.clear_buffers()
             
             # Update UI
-            if self.use_simulated_data:
+            if next_source == "sim":
                 self.connection_status.setText("Estado: Modo Simulado")
                 self.connection_status.setStyleSheet("color: orange; font-weight: bold;")
                 QMessageBox.information(self, "Modo de Datos", "Cambiado a datos simulados")
-            else:
+            elif next_source == "real":
                 self.connection_status.setText("Estado: Modo Real")
                 self.connection_status.setStyleSheet("color: blue; font-weight: bold;")
                 QMessageBox.information(self, "Modo de Datos", 
                     "Cambiado a datos reales.\nAsegúrese de seleccionar el puerto correcto.")
+            elif next_source == "multi":
+                self.connection_status.setText("Estado: Modo Multi-placa")
+                self.connection_status.setStyleSheet("color: blue; font-weight: bold;")
+                ports = self.board_ports or self.list_ports()
+                QMessageBox.information(self, "Modo de Datos",
+                    "Cambiado a varias placas.\nSe abrirán los puertos que respondan a PING:\n" + "\n".join(ports))
+            else:
+                self.connection_status.setText("Estado: Modo Replay")
+                self.connection_status.setStyleSheet("color: blue; font-weight: bold;")
             
             # Reset graphs
-            self.initialize_graph_labels()
+            self.plot_backend.reset()
             
         except Exception as e:
             print(f"Error toggling data source: {e}")
             self.connection_status.setText("Estado: Error")
             self.connection_status.setStyleSheet("color: red; font-weight: bold;")
 
+    def open_replay_session(self):
+        """Ask for a recorded session directory and map it; False if cancelled."""
+        path = QFileDialog.getExistingDirectory(self, "Abrir sesión grabada", "sesiones")
+        if not path:
+            return False
+        try:
+            self.replay_session = Session(path)
+        except Exception as e:
+            print(f"Error opening session: {e}")
+            QMessageBox.critical(self, "Error", f"No se pudo abrir la sesión:\n{str(e)}")
+            return False
+        self.replay_position_label.setText(f"{len(self.replay_session)} muestras, {self.replay_session.duration:.0f} s")
+        return True
+
+    def start_replay(self):
+        """Start feeding the open session through the ingest queue and pipeline."""
+        self.stop_replay()
+        self.ingest_queue.clear()
+        self.pipeline.reset()
+        self.replay_thread = ReplaySource(self.replay_session, self.ingest_queue,
+                                          speed=REPLAY_SPEEDS[self.replay_speed_combo.currentText()])
+        self.replay_thread.pipeline = self.pipeline
+        self.replay_thread.start()
+
+    def stop_replay(self):
+        if self.replay_thread is not None:
+            self.replay_thread.stop()
+            self.replay_thread = None
+
+    def update_replay_speed(self):
+        if self.replay_thread is not None:
+            self.replay_thread.set_speed(REPLAY_SPEEDS[self.replay_speed_combo.currentText()])
+
+    def seek_replay(self):
+        """Jump to the slider position; the visible history restarts there."""
+        if self.replay_thread is None:
+            return
+        session = self.replay_session
+        self.replay_thread.seek(session.t_start + session.duration * self.replay_slider.value() / 1000)
+        self.clear_buffers()
+
+    def update_replay_position(self):
+        session, position = self.replay_session, self.replay_thread.position
+        if not self.replay_slider.isSliderDown() and session.duration > 0:
+            self.replay_slider.setValue(int(1000 * (position - session.t_start) / session.duration))
+        self.replay_position_label.setText(datetime.fromtimestamp(position).strftime("%Y-%m-%d %H:%M:%S"))
+
+    def start_simulator(self):
+        """Simulate the configured T1/T2 schedule exactly, in batches, off the GUI thread."""
+        self.stop_simulator()
+        self.ingest_queue.clear()
+        self.pipeline.reset()
+        simulator = dashboard_simulator(
+            self.calculate_real_sampling_time(self.t1_spinbox.value()) / 1000,
+            self.calculate_real_sampling_time(self.t2_spinbox.value()) / 1000,
+            unit=self.time_unit_combo.currentText(),
+        )
+        self.simulator_thread = SimulatorSource(simulator, self.ingest_queue)
+        self.simulator_thread.pipeline = self.pipeline
+        self.simulator_thread.start()
+
+    def stop_simulator(self):
+        if self.simulator_thread is not None:
+            self.simulator_thread.stop()
+            self.simulator_thread = None
+
+    def update_simulator_periods(self):
+        """Apply the current T1/T2/TU to a running simulation."""
+        if self.simulator_thread is None:
+            return
+        self.simulator_thread.set_period("dist", self.calculate_real_sampling_time(self.t1_spinbox.value()) / 1000)
+        self.simulator_thread.set_period("lux", self.calculate_real_sampling_time(self.t2_spinbox.value()) / 1000)
+
+    def current_time(self):
+        """Epoch seconds shown as "now": the replay cursor in Replay mode."""
+        if self.replay_thread is not None:
+            return self.replay_thread.position
+        return time.time()
+
     def update_time_unit(self):
         """Update the time unit for sampling."""
         # Prevent recursive calls or processing while already updating
@@ -554,50 +1004,33 @@ class RealTimeGraph(QMainWindow):
         try:
             # Get current unit selection
             new_unit = self.time_unit_combo.currentText()
-            unit_map = {"ms": "m", "s": "s", "min": "M"}  # Map interface options to STM32 expected values
+            unit_map = {"µs": "u", "ms": "m", "s": "s", "min": "M"}  # Map interface options to STM32 expected values
             unit = unit_map[new_unit]
             
             # Clear existing data when changing time units to prevent scale issues
-            with self.data_lock:
-                self.dist_times = []
-                self.lux_times = []
-                self.dist_data = []
-                self.lux_data = []
-                self.temp_times = []
-                self.temp_data = []
-                self.intensity_times = []
-                self.intensity_data = []
+            self.clear_buffers()
+
+            # Periodo mínimo de la nueva unidad; T1/T2 se envían justo debajo
+            minimum = MIN_PERIOD_BY_UNIT.get(new_unit, 1)
+            for spinbox in (self.t1_spinbox, self.t2_spinbox):
+                spinbox.blockSignals(True)
+                spinbox.setMinimum(minimum)
+                spinbox.blockSignals(False)
             
-            # Send to serial if connected
-            if self.serial_conn and self.serial_conn.is_open:
-                try:
-                    # First send unit change
-                    command = f"TU:{unit}\r\n"
-                    self.serial_conn.write(command.encode())
-                    time.sleep(0.1)  # Small delay to ensure processing
-                    
-                    # Then resend sampling times to ensure consistency
-                    self.serial_conn.write(f"T1:{self.t1_spinbox.value()}\r\n".encode())
-                    self.serial_conn.write(f"T2:{self.t2_spinbox.value()}\r\n".encode())
-                except Exception as e:
-                    print(f"Error sending time unit: {e}")
+            # Send to serial if connected; the STM32 answers in order, so the
+            # sampling times are applied after the unit change without waiting
+            try:
+                self.send_command(f"TU:{unit}")
+                self.send_command(f"T1:{self.t1_spinbox.value()}")
+                self.send_command(f"T2:{self.t2_spinbox.value()}")
+            except Exception as e:
+                print(f"Error sending time unit: {e}")
             
             # Update time labels
             self.update_time_labels()
             
-            # Update simulation intervals if needed
-            if hasattr(self, 't1_interval'):
-                self.t1_interval = self.calculate_real_sampling_time(self.t1_spinbox.value())
-                self.t1_interval_ms = self.t1_interval
-            
-            if hasattr(self, 't2_interval'):
-                self.t2_interval = self.calculate_real_sampling_time(self.t2_spinbox.value())
-                self.t2_interval_ms = self.t2_interval
-            
-            # Reset simulation next sampling times
-            now = datetime.now()
-            self.next_t1_sample_time = now
-            self.next_t2_sample_time = now
+            # Update simulation periods if active
+            self.update_simulator_periods()
             
         finally:
             # Always ensure we reset the flag
@@ -608,10 +1041,13 @@ class RealTimeGraph(QMainWindow):
         unit_text = self.time_unit_combo.currentText()
         self.temp_real_time_label.setText(f"Tiempo Real: {self.t1_spinbox.value()} {unit_text}")
         self.light_real_time_label.setText(f"Tiempo Real: {self.t2_spinbox.value()} {unit_text}")
+        self.update_link_budget()
 
     def calculate_real_sampling_time(self, value):
         """Calculate real sampling time in milliseconds based on current time unit."""
         unit = self.time_unit_combo.currentText()
+        if unit == "µs":
+            return value / 1000
         if unit == "ms":
             return value
         elif unit == "s":
@@ -628,18 +1064,16 @@ class RealTimeGraph(QMainWindow):
             # Update the real-time display
             unit_text = self.time_unit_combo.currentText()
             self.temp_real_time_label.setText(f"Tiempo Real: {value} {unit_text}")
+            self.update_link_budget()
             
-            # Update simulation intervals if active
-            self.t1_interval_ms = self.calculate_real_sampling_time(value)
-            self.next_t1_sample_time = datetime.now()
+            # Update simulation periods if active
+            self.update_simulator_periods()
             
             # Send to serial if connected
-            if self.serial_conn and self.serial_conn.is_open:
-                try:
-                    command = f"T1:{value}\r\n"
-                    self.serial_conn.write(command.encode())
-                except Exception as e:
-                    print(f"Error sending T1: {e}")
+            try:
+                self.send_command(f"T1:{value}")
+            except Exception as e:
+                print(f"Error sending T1: {e}")
 
         except Exception as e:
             print(f"Error in update_t1: {e}")
@@ -652,29 +1086,49 @@ class RealTimeGraph(QMainWindow):
             # Update the real-time display
             unit_text = self.time_unit_combo.currentText()
             self.light_real_time_label.setText(f"Tiempo Real: {value} {unit_text}")
+            self.update_link_budget()
             
-            # Update simulation intervals if active
-            self.t2_interval_ms = self.calculate_real_sampling_time(value)
-            self.next_t2_sample_time = datetime.now()
+            # Update simulation periods if active
+            self.update_simulator_periods()
             
             # Send to serial if connected
-            if self.serial_conn and self.serial_conn.is_open:
-                try:
-                    command = f"T2:{value}\r\n"
-                    self.serial_conn.write(command.encode())
-                except Exception as e:
-                    print(f"Error sending T2: {e}")
+            try:
+                self.send_command(f"T2:{value}")
+            except Exception as e:
+                print(f"Error sending T2: {e}")
 
         except Exception as e:
             print(f"Error in update_t2: {e}")
 
+    def build_pipeline(self):
+        """Host processing stage for the selected filter and ST/SL windows."""
+        kind = HOST_FILTERS[self.host_filter_combo.currentText()]
+        chains = {}
+        for name, spinbox in (("dist", self.st_spinbox), ("intensity", self.sl_spinbox)):
+            stage = make_filter(kind, spinbox.value())
+            if stage is not None:
+                chains[name] = [stage]
+        return Pipeline(chains, derived={"velocity": ("dist", [Derivative()])})
+
+    def update_host_filter(self):
+        """Rebuild the host pipeline; a host filter replaces the firmware one."""
+        try:
+            self.pipeline = self.build_pipeline()
+            for source in (self.serial_thread, self.replay_thread, self.simulator_thread):
+                if source is not None:
+                    source.pipeline = self.pipeline
+            if HOST_FILTERS[self.host_filter_combo.currentText()] != "none":
+                # Sin doble filtrado: se apagan FT/FL en la placa
+                self.ft_combo.setCurrentIndex(0)
+                self.fl_combo.setCurrentIndex(0)
+        except Exception as e:
+            print(f"Error in update_host_filter: {e}")
+
     def update_ft(self):
         """Update Sharp sensor filter setting."""
         try:
             value = self.ft_combo.currentIndex()
-            if self.serial_conn and self.serial_conn.is_open:
-                command = f"FT:{value}\r\n"
-                self.serial_conn.write(command.encode())
+            self.send_command(f"FT:{value}")
         except Exception as e:
             print(f"Error in update_ft: {e}")
 
@@ -682,9 +1136,7 @@ class RealTimeGraph(QMainWindow):
         """Update light sensor filter setting."""
         try:
             value = self.fl_combo.currentIndex()
-            if self.serial_conn and self.serial_conn.is_open:
-                command = f"FL:{value}\r\n"
-                self.serial_conn.write(command.encode())
+            self.send_command(f"FL:{value}")
         except Exception as e:
             print(f"Error in update_fl: {e}")
 
@@ -692,9 +1144,8 @@ class RealTimeGraph(QMainWindow):
         """Update Sharp sensor filter sample count."""
         try:
             value = self.st_spinbox.value()
-            if self.serial_conn and self.serial_conn.is_open:
-                command = f"ST:{value}\r\n"
-                self.serial_conn.write(command.encode())
+            self.send_command(f"ST:{value}")
+            self.update_host_filter()
         except Exception as e:
             print(f"Error in update_st: {e}")
 
@@ -702,48 +1153,191 @@ class RealTimeGraph(QMainWindow):
         """Update light sensor filter sample count."""
         try:
             value = self.sl_spinbox.value()
-            if self.serial_conn and self.serial_conn.is_open:
-                command = f"SL:{value}\r\n"
-                self.serial_conn.write(command.encode())
+            self.send_command(f"SL:{value}")
+            self.update_host_filter()
         except Exception as e:
             print(f"Error in update_sl: {e}")
 
+    def update_dt(self):
+        """Update how many Sharp conversions the board averages per sample sent."""
+        try:
+            self.send_command(f"DT:{self.dt_spinbox.value()}")
+            self.update_link_budget()
+        except Exception as e:
+            print(f"Error in update_dt: {e}")
+
+    def update_dl(self):
+        """Update how many light conversions the board averages per sample sent."""
+        try:
+            self.send_command(f"DL:{self.dl_spinbox.value()}")
+            self.update_link_budget()
+        except Exception as e:
+            print(f"Error in update_dl: {e}")
+
+    def update_link_budget(self):
+        """Show the samples/s the T1/T2/TU settings demand versus link capacity."""
+        # En modo muestra a muestra el diezmado en placa alarga el periodo enviado
+        block = self.acq_code() == "B"
+        dt = 1 if block else self.dt_spinbox.value()
+        dl = 1 if block else self.dl_spinbox.value()
+        budget = link_budget(
+            self.baud_rate,
+            self.calculate_real_sampling_time(self.t1_spinbox.value()) * dt,
+            self.calculate_real_sampling_time(self.t2_spinbox.value()) * dl,
+            binary=self.format_code() == "B",
+            block=block,
+        )
+        self.budget_label.setText(
+            f"Enlace {self.baud_rate} bd: {budget['samples_per_s']:.1f} muestras/s pedidas, "
+            f"máx {budget['max_samples_per_s']:.0f} muestras/s ({budget['utilization'] * 100:.0f}% del enlace)"
+        )
+        color = "red" if budget["utilization"] > 1.0 else "orange" if budget["utilization"] > 0.8 else "green"
+        self.budget_label.setStyleSheet(f"color: {color}; font-weight: bold;")
+
+    def start_baud_negotiation(self, on_done):
+        """Negotiate the selected baud rate on a background thread (reader must be stopped).
+
+        Echo tests and failed attempts take seconds, so the worker owns the
+        port meanwhile and the controls are disabled; ``on_done()`` runs on
+        the GUI thread once the result is applied.
+        """
+        selection = self.baud_combo.currentText()
+        conn = self.serial_conn
+        self.negotiating_baud = True
+        self.set_controls_enabled(False)
+        self.connection_status.setText("Estado: Negociando baudios...")
+        self.connection_status.setStyleSheet("color: orange; font-weight: bold;")
+
+        def negotiate():
+            rate, warning = None, None
+            try:
+                if selection.startswith("Auto"):
+                    rate = negotiate_baud_rate(conn)
+                else:
+                    target = int(selection)
+                    current = detect_baud_rate(conn)
+                    if current is not None and current != target and not try_baud_rate(conn, target):
+                        warning = f"El enlace no superó la prueba de eco a {target} baudios."
+                    rate = conn.baudrate
+            except Exception as e:
+                print(f"Error negotiating baud rate: {e}")
+            self.baud_signals.negotiated.emit(conn, rate, warning, on_done)
+
+        threading.Thread(target=negotiate, daemon=True).start()
+
+    def finish_baud_negotiation(self, conn, rate, warning, on_done):
+        """Apply a negotiated baud rate and continue with ``on_done`` (GUI thread)."""
+        self.negotiating_baud = False
+        self.set_controls_enabled(True)
+        if conn is not self.serial_conn or not conn.is_open:
+            return  # el puerto se cerró mientras tanto
+        if warning:
+            QMessageBox.warning(self, "Baudios", warning)
+        if rate is not None:
+            self.baud_rate = rate
+            print(f"Effective baud rate: {rate}")
+        self.update_link_budget()
+        on_done()
+
+    def set_controls_enabled(self, enabled):
+        """Enable or disable every widget of the control panel."""
+        for i in range(self.controls_layout.count()):
+            widget = self.controls_layout.itemAt(i).widget()
+            if widget is not None:
+                widget.setEnabled(enabled)
+
+    def update_baud_rate(self):
+        """Renegotiate the link speed, pausing the reader while commands are exchanged."""
+        try:
+            if self.negotiating_baud:
+                return
+            if self.serial_conn and self.serial_conn.is_open:
+                if self.serial_thread is not None:
+                    self.serial_thread.stop()
+                    self.serial_thread = None
+                self.start_baud_negotiation(self.resume_serial_stream)
+            elif not self.baud_combo.currentText().startswith("Auto"):
+                self.baud_rate = int(self.baud_combo.currentText())
+            self.update_link_budget()
+        except Exception as e:
+            print(f"Error in update_baud_rate: {e}")
+
+    def resume_serial_stream(self):
+        """Restart the reader after a baud-rate change."""
+        try:
+            self.read_serial_data()
+            self.connection_status.setText("Estado: Adquiriendo Datos")
+            self.connection_status.setStyleSheet("color: green; font-weight: bold;")
+        except Exception as e:
+            print(f"Error in update_baud_rate: {e}")
+
+    def format_code(self):
+        """Firmware code for the selected stream format ('A' or 'B')."""
+        return "B" if self.format_combo.currentText() == "Binario" else "A"
+
+    def acq_code(self):
+        """Firmware code for the selected acquisition mode ('S' or 'B')."""
+        return "B" if self.acq_combo.currentText().startswith("Bloques") else "S"
+
+    def binary_stream(self):
+        """True when samples arrive as binary frames (FMT:B or block mode)."""
+        return self.format_code() == "B" or self.acq_code() == "B"
+
+    def update_acquisition_mode(self):
+        """Switch the STM32 between per-sample and DMA block acquisition."""
+        try:
+            if self.serial_thread is not None:
+                self.serial_thread.set_binary(self.binary_stream())
+            self.send_command(f"ACQ:{self.acq_code()}")
+            self.update_link_budget()
+        except Exception as e:
+            print(f"Error in update_acquisition_mode: {e}")
+
+    def update_format(self):
+        """Switch the STM32 between ASCII and binary sample frames."""
+        try:
+            code = self.format_code()
+            if self.serial_thread is not None:
+                # El decodificador binario también interpreta el texto entre
+                # tramas, así que puede activarse antes de la respuesta OK:FMT:B
+                self.serial_thread.set_binary(self.binary_stream())
+            self.send_command(f"FMT:{code}")
+            self.update_link_budget()
+        except Exception as e:
+            print(f"Error in update_format: {e}")
+
     def start_acquisition(self):
         """Start data acquisition with improved error handling."""
         try:
             # Reset data buffers for clean start
-            with self.data_lock:
-                self.dist_times = []
-                self.lux_times = []
-                self.dist_data = []
-                self.lux_data = []
-                self.temp_times = []
-                self.temp_data = []
-                self.intensity_times = []
-                self.intensity_data = []
+            self.clear_buffers()
             
             # Update UI
             self.connection_status.setText("Estado: Iniciando...")
             self.connection_status.setStyleSheet("color: orange; font-weight: bold;")
             QApplication.processEvents()
             
-            # Calculate sampling intervals
-            self.t1_interval_ms = self.calculate_real_sampling_time(self.t1_spinbox.value())
-            self.t2_interval_ms = self.calculate_real_sampling_time(self.t2_spinbox.value())
-            
-            # Initialize sampling times
-            now = datetime.now()
-            self.last_t1_time = now
-            self.last_t2_time = now
-            self.next_t1_sample_time = now
-            self.next_t2_sample_time = now
-            
             # Start timer for UI updates
             if not self.timer.isActive():
                 update_rate = 100  # Update UI every 100ms
                 self.timer.start(update_rate)
             
-            if not self.use_simulated_data:
+            if self.data_source == "replay":
+                self.start_replay()
+                self.connection_status.setText("Estado: Reproduciendo Sesión")
+                self.connection_status.setStyleSheet("color: green; font-weight: bold;")
+            elif self.data_source == "multi":
+                try:
+                    opened = self.start_devices()
+                    self.connection_status.setText(f"Estado: Adquiriendo de {len(opened)} placas")
+                    self.connection_status.setStyleSheet("color: green; font-weight: bold;")
+                except Exception as e:
+                    print(f"Error opening boards: {e}")
+                    self.disconnect_serial()
+                    self.connection_status.setText("Estado: Error de Conexión")
+                    self.connection_status.setStyleSheet("color: red; font-weight: bold;")
+                    QMessageBox.warning(self, "Error de Conexión", f"No se pudo abrir ninguna placa.\n\nError: {str(e)}")
+            elif not self.use_simulated_data:
                 try:
                     # Connect to serial port if not using simulation
                     self.disconnect_serial()  # Ensure clean state
@@ -752,34 +1346,21 @@ class RealTimeGraph(QMainWindow):
                     if not port:
                         raise ValueError("No serial port selected")
                     
+                    # Timeout corto: el hilo lector revisa los comandos sin respuesta en cada vuelta
                     self.serial_conn = serial.Serial(
                         port=port,
                         baudrate=self.baud_rate,
-                        timeout=0.5
+                        timeout=0.1
                     )
                     
-                    # Start read thread
-                    self.running = True
-                    self.serial_thread = threading.Thread(target=self.read_serial_data)
-                    self.serial_thread.daemon = True
-                    self.serial_thread.start()
-                    
-                    # Send start command
-                    time.sleep(0.2)
-                    self.serial_conn.write(b"a\r\n")
-                    
-                    self.connection_status.setText("Estado: Adquiriendo Datos")
-                    self.connection_status.setStyleSheet("color: green; font-weight: bold;")
+                    # Negotiate link speed before the reader takes the port (in the background)
+                    self.start_baud_negotiation(self.start_serial_stream)
                     
                 except Exception as e:
-                    print(f"Error connecting to serial port: {e}")
-                    self.use_simulated_data = True
-                    self.connection_status.setText("Estado: Usando Simulación")
-                    self.connection_status.setStyleSheet("color: orange; font-weight: bold;")
-                    QMessageBox.warning(self, "Error de Conexión", 
-                        f"Error conectando al puerto serial.\nCambiando a modo simulado.\n\nError: {str(e)}")
+                    self.fall_back_to_simulation(e)
             
             else:
+                self.start_simulator()
                 self.connection_status.setText("Estado: Simulación Activa")
                 self.connection_status.setStyleSheet("color: orange; font-weight: bold;")
             
@@ -788,6 +1369,34 @@ class RealTimeGraph(QMainWindow):
             self.connection_status.setText("Estado: Error")
             self.connection_status.setStyleSheet("color: red; font-weight: bold;")
 
+    def start_serial_stream(self):
+        """Start the reader on the negotiated port and tell the STM32 to stream."""
+        try:
+            self.read_serial_data()
+            
+            # Send stream format, acquisition mode and start command
+            self.send_command(f"FMT:{self.format_code()}")
+            self.send_command(f"ACQ:{self.acq_code()}")
+            self.send_command("a")
+            
+            self.connection_status.setText("Estado: Adquiriendo Datos")
+            self.connection_status.setStyleSheet("color: green; font-weight: bold;")
+        except Exception as e:
+            self.fall_back_to_simulation(e)
+
+    def fall_back_to_simulation(self, error):
+        """Switch to simulated data after the serial port failed to connect."""
+        print(f"Error connecting to serial port: {error}")
+        self.disconnect_serial()
+        self.use_simulated_data = True
+        self.data_source = "sim"
+        self.toggle_data_button.setText("Modo: Simulado")
+        self.start_simulator()
+        self.connection_status.setText("Estado: Usando Simulación")
+        self.connection_status.setStyleSheet("color: orange; font-weight: bold;")
+        QMessageBox.warning(self, "Error de Conexión", 
+            f"Error conectando al puerto serial.\nCambiando a modo simulado.\n\nError: {str(error)}")
+
     def stop_acquisition(self):
         """Stop data acquisition and clean up resources."""
         try:
@@ -801,15 +1410,12 @@ class RealTimeGraph(QMainWindow):
                 self.timer.stop()
             
             # Stop acquisition if using real hardware
-            if self.serial_conn and self.serial_conn.is_open:
-                try:
-                    self.serial_conn.write(b"b\r\n")
-                    time.sleep(0.2)
-                except Exception as e:
-                    print(f"Error sending stop command: {e}")
+            self.send_stop_command()
             
             # Clean up serial connection
             self.disconnect_serial()
+            self.stop_replay()
+            self.stop_simulator()
             
             # Update UI
             self.connection_status.setText("Estado: Detenido")
@@ -820,6 +1426,18 @@ class RealTimeGraph(QMainWindow):
             self.connection_status.setText("Estado: Error")
             self.connection_status.setStyleSheet("color: red; font-weight: bold;")
 
+    def send_stop_command(self, timeout=0.3):
+        """Send 'b' and wait (bounded) for its OK so it is not lost when the port closes."""
+        try:
+            future = self.send_command("b")
+            if future is not None and self.async_bridge is not None and self.device_manager is None:
+                # La respuesta la lee el bucle asyncio de este mismo hilo: se le deja correr
+                self.async_bridge.run(future, timeout)
+            elif future is not None:
+                future.result(timeout)
+        except Exception as e:
+            print(f"Error sending stop command: {e}")
+
     def toggle_pause(self):
         """Toggle pause/resume state for graphs."""
         self.is_paused = not self.is_paused
@@ -829,7 +1447,7 @@ class RealTimeGraph(QMainWindow):
 
     def sync_all_settings(self):
         """Synchronize all settings with the STM32."""
-        if not self.serial_conn or not self.serial_conn.is_open:
+        if not self.link_open():
             QMessageBox.warning(self, "Advertencia", "No hay conexión serial activa.")
             return
             
@@ -843,7 +1461,7 @@ class RealTimeGraph(QMainWindow):
             commands = []
             
             # First send time unit
-            unit_map = {"ms": "m", "s": "s", "min": "M"}
+            unit_map = {"µs": "u", "ms": "m", "s": "s", "min": "M"}
             unit = unit_map[self.time_unit_combo.currentText()]
             commands.append(f"TU:{unit}")
             
@@ -856,24 +1474,19 @@ class RealTimeGraph(QMainWindow):
             commands.append(f"FL:{self.fl_combo.currentIndex()}")
             commands.append(f"ST:{self.st_spinbox.value()}")
             commands.append(f"SL:{self.sl_spinbox.value()}")
+            commands.append(f"DT:{self.dt_spinbox.value()}")
+            commands.append(f"DL:{self.dl_spinbox.value()}")
             
-            # Send each command with a small delay
-            for cmd in commands:
-                try:
-                    self.serial_conn.write(f"{cmd}\r\n".encode())
-                    print(f"Sent: {cmd}")
-                    time.sleep(0.1)  # Small delay between commands
-                except Exception as e:
-                    print(f"Error sending command {cmd}: {e}")
-                    raise
+            # Stream format and acquisition mode
+            commands.append(f"FMT:{self.format_code()}")
+            commands.append(f"ACQ:{self.acq_code()}")
             
             # Request status to confirm settings
-            self.serial_conn.write(b"STATUS\r\n")
+            commands.append("STATUS")
             
-            # Update UI to show success
-            self.connection_status.setText("Estado: Sincronizado")
-            self.connection_status.setStyleSheet("color: green; font-weight: bold;")
-            QMessageBox.information(self, "Sincronización", "Configuración sincronizada correctamente")
+            # Se envían seguidos; cada respuesta OK:/ERROR: resuelve su Future
+            futures = self.commands.send_all(commands)
+            self.when_done(gather(futures), lambda done: self.finish_sync(commands, done.result()))
             
         except Exception as e:
             print(f"Error en sincronización: {e}")
@@ -881,6 +1494,37 @@ class RealTimeGraph(QMainWindow):
             self.connection_status.setStyleSheet("color: red; font-weight: bold;")
             QMessageBox.critical(self, "Error", f"Error durante la sincronización:\n{str(e)}")
 
+    def finish_sync(self, commands, futures):
+        """Report the outcome of sync_all_settings once every reply arrived."""
+        errors = []
+        for cmd, future in zip(commands, futures):
+            if future.cancelled():
+                errors.append(f"{cmd}: cancelado")
+            elif future.exception() is not None:
+                errors.append(str(future.exception()))
+            else:
+                print(f"Sent: {cmd} -> {future.result()}")
+        
+        # Mensajes o muestras que el STM32 descartó por falta de espacio de transmisión
+        status = futures[-1]
+        if not status.cancelled() and status.exception() is None:
+            # Con varias placas la respuesta es {placa: línea}
+            replies = status.result()
+            replies = replies.values() if isinstance(replies, dict) else [replies]
+            dropped = sum(parse_status(reply).get("TXO", 0) for reply in replies)
+            if dropped:
+                errors.append(f"El STM32 descartó {dropped} mensajes (buffer TX lleno): reduzca T1/T2 o suba los baudios")
+        
+        if errors:
+            print(f"Error en sincronización: {errors}")
+            self.connection_status.setText("Estado: Error de Sincronización")
+            self.connection_status.setStyleSheet("color: red; font-weight: bold;")
+            QMessageBox.critical(self, "Error", "Error durante la sincronización:\n" + "\n".join(errors))
+        else:
+            self.connection_status.setText("Estado: Sincronizado")
+            self.connection_status.setStyleSheet("color: green; font-weight: bold;")
+            QMessageBox.information(self, "Sincronización", "Configuración sincronizada correctamente")
+
     def closeEvent(self, event):
         """Handle the window close event safely."""
         try:
@@ -891,21 +1535,46 @@ class RealTimeGraph(QMainWindow):
             
             # Signal thread to stop and close connection
             self.running = False
-            if hasattr(self, 'serial_conn') and self.serial_conn and self.serial_conn.is_open:
-                try:
-                    self.serial_conn.write(b"b\r\n")  # Send stop command
-                    time.sleep(0.2)  # Give time for command to be processed
-                    self.serial_conn.close()
-                except:
-                    pass
+            self.send_stop_command()  # Espera el OK:b, sin pausa fija
+            self.disconnect_serial()
+            self.stop_simulator()
+            self.stop_replay()
+            self.stop_recording()
+            if self.async_bridge is not None:
+                self.async_bridge.close()
         except:
             pass
         event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = RealTimeGraph()
+    parser = argparse.ArgumentParser(description="Monitoreo de Sensores en Tiempo Real")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=os.environ.get("PLOT_BACKEND", DEFAULT_BACKEND),
+                        help="Backend de gráficas (también vía la variable PLOT_BACKEND)")
+    parser.add_argument("--port", action="append", default=[],
+                        help="Puerto adicional en la lista, p. ej. el pty de virtual_device.py (repetible)")
+    parser.add_argument("--board", action="append", default=[],
+                        help="Puerto de una placa para el modo Multi-placa (repetible; por defecto, todos los listados)")
+    parser.add_argument("--metrics", action="store_true", help="Activar las métricas del pipeline al iniciar")
+    parser.add_argument("--metrics-dump", default=None, metavar="FICHERO",
+                        help="Añadir cada intervalo de métricas como una línea JSON (implica --metrics)")
+    parser.add_argument("--metrics-interval", type=float, default=1.0, help="Segundos por intervalo de métricas")
+    parser.add_argument("--transport", choices=("thread", "asyncio"), default="thread",
+                        help="Lectura del puerto: hilo dedicado o corrutinas asyncio en el hilo de la GUI")
+    args, qt_args = parser.parse_known_args()
+    if args.transport == "asyncio" and os.name == "nt":
+        print("El transporte asyncio necesita POSIX; se usa el hilo lector")
+        args.transport = "thread"
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = RealTimeGraph(plot_backend=args.backend, extra_ports=args.port, board_ports=args.board,
+                           metrics_dump=args.metrics_dump, metrics_interval=args.metrics_interval,
+                           transport=args.transport, lazy=True)
+    if args.metrics or args.metrics_dump:
+        window.toggle_metrics()
+    # Primero la ventana; gráficas, puertos e imports pesados cuando ya está pintada
     window.show()
+    app.processEvents()
+    QTimer.singleShot(0, window.finish_startup)
     sys.exit(app.exec_())
 
 
@@ -0,0 +1,160 @@
+import json
+import math
+import threading
+import time
+
+
+class Counter:
+    """Monotonic count (samples, bytes, errors)."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    """Last observed value (queue depth, points drawn)."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Log-linear bucketed histogram in the style of HdrHistogram.
+
+    Every power of two is split into ``2**sub_bits`` linear buckets, so a
+    percentile is reported with a relative error below ``2**-(sub_bits+1)``
+    (1.6 % with the default) whatever the range of the values. Recording is
+    O(1) and the buckets are a sparse dict, so an idle histogram costs nothing.
+    """
+    __slots__ = ("sub_buckets", "counts", "count", "total", "max")
+
+    def __init__(self, sub_bits=5):
+        self.sub_buckets = 1 << sub_bits
+        self.reset()
+
+    def reset(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        mantissa, exponent = math.frexp(value if value > 1e-9 else 1e-9)
+        key = exponent * self.sub_buckets + int((mantissa - 0.5) * 2 * self.sub_buckets)
+        counts = self.counts
+        counts[key] = counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def _bucket_value(self, key):
+        # Punto medio del bucket: mantisa en [0.5, 1) repartida en sub_buckets
+        exponent, sub = divmod(key, self.sub_buckets)
+        return math.ldexp(0.5 + (sub + 0.5) / (2 * self.sub_buckets), exponent)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        target = max(math.ceil(p / 100.0 * self.count), 1)
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= target:
+                return min(self._bucket_value(key), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms fed by hooks along the pipeline.
+
+    Components hold ``metrics = None`` and only record when a registry is
+    attached, so instrumentation that is switched off costs one attribute
+    test per hook. Each metric has a single writer thread (the reader thread
+    or the GUI thread); ``interval`` runs on the GUI thread and tolerates
+    reading values a writer is updating, at worst losing one sample.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._t_last = time.monotonic()
+        self._last_counts = {}
+
+    def _get(self, table, name, cls):
+        metric = table.get(name)
+        if metric is None:
+            with self._lock:
+                metric = table.setdefault(name, cls())
+        return metric
+
+    def counter(self, name):
+        return self._get(self.counters, name, Counter)
+
+    def gauge(self, name):
+        return self._get(self.gauges, name, Gauge)
+
+    def histogram(self, name):
+        return self._get(self.histograms, name, Histogram)
+
+    def count(self, name, n=1):
+        self._get(self.counters, name, Counter).inc(n)
+
+    def set(self, name, value):
+        self._get(self.gauges, name, Gauge).set(value)
+
+    def observe(self, name, value):
+        self._get(self.histograms, name, Histogram).record(value)
+
+    def interval(self):
+        """Report for the time since the previous call and reset the histograms.
+
+        Counters stay cumulative; ``rates`` holds their per-second increase
+        over the interval.
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._t_last, 1e-9)
+        with self._lock:
+            counters = {name: c.value for name, c in self.counters.items()}
+            gauges = {name: g.value for name, g in self.gauges.items()}
+            histograms = list(self.histograms.items())
+        summaries = {}
+        for name, hist in histograms:
+            summaries[name] = hist.summary()
+            hist.reset()
+        rates = {name: (value - self._last_counts.get(name, 0)) / elapsed for name, value in counters.items()}
+        self._t_last, self._last_counts = now, counters
+        return {
+            "t": time.time(),
+            "interval_s": elapsed,
+            "counters": counters,
+            "rates": rates,
+            "gauges": gauges,
+            "histograms": summaries,
+        }
+
+
+def append_report(path, report):
+    """Append one interval report as a JSON line (JSON Lines, one object per interval)."""
+    with open(path, "a") as f:
+        f.write(json.dumps(report, sort_keys=True) + "\n")
@@ -0,0 +1,276 @@
+import time
+
+import numpy as np
+
+# Canales del tablero 2x2: (nombre, título, etiqueta eje Y, leyenda, color, valor por defecto)
+CHANNEL_SPECS = (
+    ("lux", "Fotorresistencia - Intensidad Lumínica (%)", "Intensidad Lumínica (%)", "Intensidad Lumínica (%)", "blue", 0.0),
+    ("dist", "Sharp - Distancia (cm)", "Distancia (cm)", "Distancia (cm)", "green", 0.0),
+    ("temp", "Temperatura (°C)", "Temperatura (°C)", "Temperatura (°C)", "red", 25.0),
+    ("intensity", "Intensidad Lumínica (lux)", "Intensidad (lux)", "Intensidad (lux)", "purple", 500.0),
+)
+
+
+def epoch_to_datetime64(times):
+    """Convert float epoch seconds to datetime64 so matplotlib formats dates."""
+    return (np.asarray(times) * 1e6).astype("datetime64[us]")
+
+
+class PlotBackend:
+    """Interface shared by the plotting backends of the four-channel dashboard.
+
+    A backend owns its Qt widget and receives, once per GUI tick, a dict of
+    ``{channel: (epoch_times, values)}`` views plus the current wall-clock time.
+    """
+
+    name = None
+
+    def __init__(self, parent=None):
+        self.widget = None
+        self.window_s = 60.0
+        self.metrics = None  # metrics.MetricsRegistry cuando la instrumentación está activa
+
+    def reset(self):
+        """Clear every plot and restore titles and labels."""
+        raise NotImplementedError
+
+    def set_window(self, window_s):
+        """Set the visible time span in seconds."""
+        self.window_s = window_s
+
+    def set_metrics(self, metrics):
+        """Attach (or detach with None) the registry that receives draw timings."""
+        self.metrics = metrics
+
+    def should_render(self):
+        """Return False to skip drawing this tick (frame-time budget)."""
+        return True
+
+    def plot_width_px(self):
+        """Narrowest plot area in pixels, used to size the decimation budget."""
+        return 800
+
+    def render(self, data, now):
+        raise NotImplementedError
+
+    def export(self, path):
+        """Save the current plots as a static image."""
+        raise NotImplementedError
+
+
+class MatplotlibBackend(PlotBackend):
+    """2x2 matplotlib figure with a blitting or full-redraw render path."""
+
+    name = "matplotlib"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        from blit_renderer import BlitRenderer
+
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        self.widget = self.canvas
+
+        # Crear 4 subplots en una matriz 2x2
+        self.axes = {}
+        for i, spec in enumerate(CHANNEL_SPECS):
+            self.axes[spec[0]] = self.figure.add_subplot(221 + i)
+        self.figure.subplots_adjust(hspace=0.5, wspace=0.3)  # Ajustar espaciado
+
+        # Render path: "blit" reutiliza las líneas y solo repinta las regiones de
+        # los ejes; "full" redibuja toda la figura en cada tick.
+        self.render_mode = "blit"
+        self.blit_renderer = BlitRenderer(self.canvas)
+
+    def reset(self):
+        for ax in self.axes.values():
+            ax.clear()
+        self.configure_axes()
+
+        # Las líneas persistentes del modo blit se borraron con los ejes
+        self.blit_renderer.reset()
+        if self.render_mode == "blit":
+            self.create_plot_lines()
+            self.figure.tight_layout()
+
+        self.canvas.draw()
+
+    def configure_axes(self):
+        """Apply grid, titles and axis labels without touching plotted data."""
+        for name, title, ylabel, _, _, _ in CHANNEL_SPECS:
+            ax = self.axes[name]
+            ax.grid(True)
+            ax.set_title(title)
+            ax.set_xlabel("Tiempo")
+            ax.set_ylabel(ylabel)
+
+    def create_plot_lines(self):
+        """Create the persistent Line2D artists used by the blit render path."""
+        for name, _, _, label, color, _ in CHANNEL_SPECS:
+            ax = self.axes[name]
+            self.blit_renderer.add_line(name, ax, label=label, color=color, linestyle="-", linewidth=1.2)
+            ax.legend(loc="upper right")
+
+    def toggle_render_mode(self):
+        """Switch between blitting (artist reuse) and full redraw rendering."""
+        self.render_mode = "full" if self.render_mode == "blit" else "blit"
+        self.reset()
+        return self.render_mode
+
+    def set_metrics(self, metrics):
+        super().set_metrics(metrics)
+        self.blit_renderer.metrics = metrics
+
+    def set_window(self, window_s):
+        super().set_window(window_s)
+        self.blit_renderer.set_window(window_s)
+
+    def plot_width_px(self):
+        return int(min(ax.bbox.width for ax in self.axes.values())) or 800
+
+    def should_render(self):
+        # Presupuesto de tiempo por frame: si el último frame se pasó,
+        # se sigue ingiriendo datos pero se salta el dibujado.
+        return self.render_mode != "blit" or self.blit_renderer.should_render()
+
+    def render(self, data, now):
+        if self.render_mode == "blit":
+            self.blit_renderer.render(data, now)
+            return
+
+        # Limpiar todas las gráficas
+        for ax in self.axes.values():
+            ax.clear()
+
+        for name, _, _, label, color, default in CHANNEL_SPECS:
+            times, values = data.get(name, ((), ()))
+            if len(times) == 0:
+                times, values = np.array([now]), np.array([default])
+            if len(times) == 1:
+                times = np.array([times[0], times[0] + 1.0])
+                values = np.array([values[0], values[0]])
+            ax = self.axes[name]
+            ax.plot(epoch_to_datetime64(times), values, label=label,
+                    color=color, marker="o", linestyle="-", markersize=4)
+            ax.legend(loc="upper right")
+
+        # Configurar títulos y etiquetas
+        self.configure_axes()
+
+        # Auto-ajustar diseño
+        metrics = self.metrics
+        if metrics is not None:
+            t_start = time.perf_counter()
+        self.figure.tight_layout()
+        if metrics is not None:
+            t_layout = time.perf_counter()
+            metrics.observe("render.layout_ms", (t_layout - t_start) * 1000)
+
+        # Actualizar canvas
+        self.canvas.draw()
+        if metrics is not None:
+            metrics.observe("render.draw_ms", (time.perf_counter() - t_layout) * 1000)
+
+    def export(self, path):
+        self.figure.savefig(path, dpi=150)
+
+
+class PyQtGraphBackend(PlotBackend):
+    """Qt-native fast plotting with automatic peak downsampling and clip-to-view.
+
+    Requires the optional ``pyqtgraph`` package; no OpenGL is needed.
+    """
+
+    name = "pyqtgraph"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        import pyqtgraph as pg
+
+        self.widget = pg.GraphicsLayoutWidget(parent)
+        self.plots = {}
+        self.curves = {}
+        for i, (name, title, ylabel, label, color, _) in enumerate(CHANNEL_SPECS):
+            plot = self.widget.addPlot(row=i // 2, col=i % 2, title=title,
+                                       axisItems={"bottom": pg.DateAxisItem()})
+            plot.setLabel("left", ylabel)
+            plot.setLabel("bottom", "Tiempo")
+            plot.showGrid(x=True, y=True)
+            plot.addLegend(offset=(-10, 10))
+            # Reduce cada curva a los píxeles visibles antes de dibujar
+            plot.setDownsampling(auto=True, mode="peak")
+            plot.setClipToView(True)
+            self.plots[name] = plot
+            self.curves[name] = plot.plot(pen=pg.mkPen(color, width=1.2), name=label)
+
+    def reset(self):
+        for curve in self.curves.values():
+            curve.setData([], [])
+
+    def plot_width_px(self):
+        return int(min(plot.vb.width() for plot in self.plots.values())) or 800
+
+    def render(self, data, now):
+        for name, curve in self.curves.items():
+            times, values = data.get(name, ((), ()))
+            curve.setData(np.asarray(times), np.asarray(values))
+            self.plots[name].setXRange(now - self.window_s, now, padding=0)
+
+    def export(self, path):
+        from pyqtgraph.exporters import ImageExporter
+        ImageExporter(self.widget.scene()).export(path)
+
+
+class PlaceholderBackend(PlotBackend):
+    """Empty stand-in shown while the real backend is built after the window appears.
+
+    Draws nothing and keeps the window and metrics it is given, so the real
+    backend can take them over.
+    """
+
+    name = "placeholder"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        from PyQt5.QtCore import Qt
+        from PyQt5.QtWidgets import QLabel, QSizePolicy
+
+        self.widget = QLabel("Cargando gráficas...", parent)
+        self.widget.setAlignment(Qt.AlignCenter)
+        self.widget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def reset(self):
+        pass
+
+    def should_render(self):
+        return False
+
+    def render(self, data, now):
+        pass
+
+    def export(self, path):
+        raise RuntimeError("Las gráficas aún se están cargando")
+
+
+BACKENDS = {
+    MatplotlibBackend.name: MatplotlibBackend,
+    PyQtGraphBackend.name: PyQtGraphBackend,
+}
+
+DEFAULT_BACKEND = MatplotlibBackend.name
+
+
+def create_backend(name=None, parent=None):
+    """Instantiate the named backend, falling back to matplotlib if unavailable."""
+    name = name or DEFAULT_BACKEND
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        print(f"Unknown plot backend '{name}', using {DEFAULT_BACKEND}")
+        backend_cls = BACKENDS[DEFAULT_BACKEND]
+    try:
+        return backend_cls(parent)
+    except ImportError as e:
+        print(f"Plot backend '{name}' unavailable ({e}), using {DEFAULT_BACKEND}")
+        return BACKENDS[DEFAULT_BACKEND](parent)
@@ -0,0 +1,150 @@
+"""Run an asyncio event loop inside the Qt event loop, on the GUI thread."""
+import asyncio
+import math
+import selectors
+
+from PyQt5.QtCore import QObject, QSocketNotifier, Qt, QTimer
+
+
+class _NotifierSelector(selectors.DefaultSelector):
+    """Selector that mirrors its registrations as QSocketNotifiers.
+
+    asyncio still selects on it, but Qt now also knows which descriptors
+    the loop waits for and calls ``on_ready`` as soon as one is ready.
+    """
+
+    def __init__(self, on_ready):
+        super().__init__()
+        self._on_ready = on_ready
+        self._notifiers = {}  # fd -> [QSocketNotifier]
+
+    def register(self, fileobj, events, data=None):
+        key = super().register(fileobj, events, data)
+        self._sync(key.fd)
+        return key
+
+    def unregister(self, fileobj):
+        key = super().unregister(fileobj)
+        self._sync(key.fd)
+        return key
+
+    def modify(self, fileobj, events, data=None):
+        key = super().modify(fileobj, events, data)
+        self._sync(key.fd)
+        return key
+
+    def close(self):
+        for fd in list(self._notifiers):
+            self._drop(fd)
+        super().close()
+
+    def _drop(self, fd):
+        for notifier in self._notifiers.pop(fd, ()):
+            notifier.setEnabled(False)
+            notifier.deleteLater()
+
+    def _sync(self, fd):
+        self._drop(fd)
+        key = self.get_map().get(fd)
+        if key is None:
+            return
+        notifiers = []
+        for event, kind in ((selectors.EVENT_READ, QSocketNotifier.Read), (selectors.EVENT_WRITE, QSocketNotifier.Write)):
+            if key.events & event:
+                notifier = QSocketNotifier(fd, kind)
+                notifier.activated.connect(self._on_ready)
+                notifiers.append(notifier)
+        self._notifiers[fd] = notifiers
+
+
+class _QtEventLoop(asyncio.SelectorEventLoop):
+    """Selector loop that reports work scheduled while it is not running.
+
+    A coroutine started from a Qt slot only lands in the ready queue, with
+    no descriptor to wake Qt, so ``on_schedule`` lets the bridge arm its
+    timer for it.
+    """
+
+    def __init__(self, selector, on_schedule):
+        self._on_schedule = on_schedule
+        super().__init__(selector)
+
+    def call_soon(self, callback, *args, context=None):
+        handle = super().call_soon(callback, *args, context=context)
+        if not self.is_running():
+            self._on_schedule()
+        return handle
+
+    def call_at(self, when, callback, *args, context=None):
+        handle = super().call_at(when, callback, *args, context=context)
+        if not self.is_running():
+            self._on_schedule()
+        return handle
+
+
+class QtAsyncioBridge(QObject):
+    """asyncio event loop driven by Qt (the idea behind qasync, stdlib only).
+
+    Qt owns the thread. Whenever a descriptor the loop waits on becomes
+    ready (a serial port, the loop's self-pipe) its QSocketNotifier fires
+    and ``step`` runs one non-blocking loop iteration. After every step a
+    single-shot timer is armed for the loop's next deadline (``sleep``,
+    ``wait_for`` timeouts) or right away if callbacks are still ready; with
+    nothing scheduled the loop costs no wake-ups at all. Coroutines and Qt
+    slots run on the same thread, so they share state without locks, but a
+    slot must not block: ``run`` is only for short bounded waits.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.step)
+        self.loop = _QtEventLoop(_NotifierSelector(self.step), self._arm_timer)
+
+    def _arm_timer(self):
+        # _ready y _scheduled son internos de asyncio, pero es lo que mira su propio select()
+        loop = self.loop
+        if loop.is_closed():
+            return
+        if loop._ready:
+            delay_ms = 0
+        elif loop._scheduled:
+            delay_ms = math.ceil(max(loop._scheduled[0].when() - loop.time(), 0.0) * 1000)
+        else:
+            self.timer.stop()
+            return
+        self.timer.start(delay_ms)
+
+    def step(self, *_):
+        """Run the callbacks that are ready, without waiting for new events."""
+        loop = self.loop
+        if loop.is_running() or loop.is_closed():
+            return  # p. ej. un diálogo modal abierto desde una corrutina
+        loop.call_soon(loop.stop)
+        loop.run_forever()
+        self._arm_timer()
+
+    def run(self, awaitable, timeout=None):
+        """Run the loop until ``awaitable`` finishes and return its result (blocks the GUI)."""
+        async def bounded():
+            return await asyncio.wait_for(awaitable, timeout)
+
+        try:
+            return self.loop.run_until_complete(awaitable if timeout is None else bounded())
+        finally:
+            self._arm_timer()
+
+    def close(self):
+        """Cancel the remaining tasks, let them unwind and close the loop."""
+        self.timer.stop()
+        loop = self.loop
+        if loop.is_closed():
+            return
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
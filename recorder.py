@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from serial_ingest import SPSCQueue
+
+# Una sesión es un directorio con un fichero append-only por columna (valores
+# little-endian crudos, sin cabecera) y meta.json. La muestra i de la sesión
+# es la fila i de todas las columnas; tras un corte se leen solo las filas que
+# estén completas en todas.
+SESSION_COLUMNS = {
+    "channel": np.dtype("u1"),   # índice en meta["channels"]
+    "tick": np.dtype("<f8"),     # tick del dispositivo en ms, -1 si no viene
+    "host": np.dtype("<f8"),     # segundos epoch (ya corregidos por ClockMapper)
+    "value": np.dtype("<f4"),
+}
+SESSION_VERSION = 1
+DEFAULT_CHANNELS = ("dist", "intensity", "lux", "temp")
+
+
+def column_path(session_dir, column):
+    return os.path.join(session_dir, f"{column}.bin")
+
+
+def new_session_dir(root="sesiones"):
+    """Fresh ``root/sesion_YYYYmmdd_HHMMSS`` path for a recording."""
+    return os.path.join(root, time.strftime("sesion_%Y%m%d_%H%M%S"))
+
+
+class SessionRecorder(threading.Thread):
+    """Background writer that appends every ingested sample to a session directory.
+
+    ``record`` is called by the serial reader thread with each parsed batch:
+    it only flattens the batch into column arrays and queues them. The writer
+    thread gathers queued chunks until ``chunk_bytes`` are pending (or
+    ``flush_s`` elapse), writes each column with a single ``write`` call and
+    fsyncs every ``fsync_s`` seconds, so a crash loses at most that much.
+    Memory stays bounded: when the writer falls ``max_pending`` batches
+    behind, new batches are dropped and counted in ``dropped``.
+    """
+
+    def __init__(self, session_dir, chunk_bytes=1 << 20, flush_s=0.5, fsync_s=2.0, max_pending=1024):
+        super().__init__(daemon=True)
+        self.session_dir = session_dir
+        self.chunk_bytes = chunk_bytes
+        self.flush_s = flush_s
+        self.fsync_s = fsync_s
+        self.queue = SPSCQueue(max_pending)
+        self.channels = list(DEFAULT_CHANNELS)
+        self.samples = 0        # muestras escritas en disco
+        self.bytes_written = 0
+        self._wake = threading.Event()
+        self.running = True  # antes de start(): stop() nunca se pierde
+        os.makedirs(session_dir, exist_ok=True)
+        self.created = time.time()
+        self._files = {col: open(column_path(session_dir, col), "ab") for col in SESSION_COLUMNS}
+        self._write_meta(complete=False)
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    def record(self, batch):
+        """Queue every sample of a ParsedBatch (reader thread; never blocks)."""
+        columns = []
+        for channel, (times, values) in batch.channels.items():
+            if len(times) == 0:
+                continue
+            ticks = batch.ticks.get(channel)  # indexados por el canal sin prefijo de placa
+            name = channel if batch.device is None else f"{batch.device}/{channel}"  # varias placas en una sesión
+            if name not in self.channels:
+                self.channels.append(name)  # el writer reescribe meta.json al verlo
+            if ticks is None or len(ticks) != len(times):
+                ticks = np.full(len(times), -1.0)
+            columns.append((self.channels.index(name), times, ticks, values))
+        if not columns:
+            return
+        chunk = {
+            "channel": np.concatenate([np.full(len(t), ch, dtype=SESSION_COLUMNS["channel"]) for ch, t, _, _ in columns]),
+            "tick": np.concatenate([k for _, _, k, _ in columns]).astype(SESSION_COLUMNS["tick"]),
+            "host": np.concatenate([t for _, t, _, _ in columns]).astype(SESSION_COLUMNS["host"]),
+            "value": np.concatenate([v for _, _, _, v in columns]).astype(SESSION_COLUMNS["value"]),
+        }
+        if self.queue.put(chunk):
+            self._wake.set()
+
+    def run(self):
+        pending, pending_bytes = [], 0
+        known_channels = len(self.channels)
+        last_flush = last_sync = time.monotonic()
+        while True:
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            stopping = not self.running
+            for chunk in self.queue.drain():
+                pending.append(chunk)
+                pending_bytes += sum(arr.nbytes for arr in chunk.values())
+            now = time.monotonic()
+            try:
+                if pending and (stopping or pending_bytes >= self.chunk_bytes or now - last_flush >= self.flush_s):
+                    self._write(pending)
+                    pending, pending_bytes = [], 0
+                    last_flush = now
+                if len(self.channels) != known_channels:
+                    known_channels = len(self.channels)
+                    self._write_meta(complete=False)
+                if stopping or now - last_sync >= self.fsync_s:
+                    for f in self._files.values():
+                        f.flush()
+                        os.fsync(f.fileno())
+                    last_sync = now
+            except OSError as e:
+                print(f"Error writing session {self.session_dir}: {e}")
+                self.running = False
+                stopping = True
+            if stopping:
+                break
+        for f in self._files.values():
+            f.close()
+        self._write_meta(complete=True)
+
+    def _write(self, chunks):
+        # Una escritura grande por columna en lugar de una por lote
+        for col, f in self._files.items():
+            data = b"".join(chunk[col].tobytes() for chunk in chunks)
+            f.write(data)
+            self.bytes_written += len(data)
+        self.samples += sum(len(chunk["host"]) for chunk in chunks)
+
+    def _write_meta(self, complete):
+        meta = {
+            "version": SESSION_VERSION,
+            "channels": list(self.channels),
+            "columns": {col: dtype.str for col, dtype in SESSION_COLUMNS.items()},
+            "created": self.created,
+            "complete": complete,
+        }
+        # Escritura atómica: meta.json nunca queda a medias
+        tmp = os.path.join(self.session_dir, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.session_dir, "meta.json"))
+
+    def stop(self, timeout=5.0):
+        """Flush everything queued, fsync and close the session."""
+        self.running = False
+        self._wake.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
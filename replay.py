@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from frame_parser import ParsedBatch
+from recorder import SESSION_COLUMNS, column_path
+
+INDEX_STRIDE = 4096  # filas entre entradas del índice temporal
+
+
+class Session:
+    """A recorded session (see recorder.py) opened as read-only memory maps.
+
+    Nothing is read up front: columns are ``numpy.memmap`` views, and the
+    time index only touches one ``host`` value every ``INDEX_STRIDE`` rows.
+    Rows beyond the shortest column (a crash mid-write) are ignored.
+    """
+
+    def __init__(self, session_dir):
+        self.session_dir = session_dir
+        with open(os.path.join(session_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.channels = self.meta["channels"]
+        sizes = {col: os.path.getsize(column_path(session_dir, col)) // dtype.itemsize
+                 for col, dtype in SESSION_COLUMNS.items()}
+        self.rows = min(sizes.values())
+        self.columns = {}
+        for col, dtype in SESSION_COLUMNS.items():
+            if self.rows:
+                self.columns[col] = np.memmap(column_path(session_dir, col), dtype=dtype, mode="r", shape=(self.rows,))
+            else:
+                self.columns[col] = np.empty(0, dtype=dtype)
+
+        # Índice disperso: máximo acumulado de host cada INDEX_STRIDE filas
+        # (monótono aunque la corrección de reloj deje pequeños retrocesos)
+        self._index_t = np.maximum.accumulate(np.asarray(self.columns["host"][::INDEX_STRIDE]))
+        host = self.columns["host"]
+        self.t_start = float(host[0]) if self.rows else 0.0
+        self.t_end = max(float(self._index_t[-1]), float(np.max(host[-INDEX_STRIDE:]))) if self.rows else 0.0
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def duration(self):
+        return self.t_end - self.t_start
+
+    def row_at(self, t):
+        """First row to replay so that nothing from ``t`` on is skipped."""
+        k = int(np.searchsorted(self._index_t, t, side="left"))
+        return max(k - 1, 0) * INDEX_STRIDE
+
+    def read(self, start, end, t_recv):
+        """Rows ``start:end`` as a ParsedBatch, like a parsed serial read."""
+        batch = ParsedBatch(t_recv)
+        channel = np.asarray(self.columns["channel"][start:end])
+        host = np.asarray(self.columns["host"][start:end])
+        tick = np.asarray(self.columns["tick"][start:end])
+        value = np.asarray(self.columns["value"][start:end], dtype=np.float64)
+        for ch in np.unique(channel).tolist():
+            sel = channel == ch
+            batch.add(self.channels[ch], host[sel], value[sel], tick[sel])
+        return batch
+
+
+class ReplaySource(threading.Thread):
+    """Feeds a Session into the ingest queue as if it came from the serial reader.
+
+    ``speed`` is the replay rate relative to real time (1.0, 10.0, ...) or
+    None to replay as fast as the consumer drains the queue. ``position`` is
+    the session time of the replay cursor, used by the GUI as "now".
+    Batches go through ``pipeline`` exactly like live data.
+    """
+
+    def __init__(self, session, queue, speed=1.0, max_chunk=65536, tick_s=0.02, max_queued=8):
+        super().__init__(daemon=True)
+        self.session = session
+        self.queue = queue
+        self.max_chunk = max_chunk
+        self.max_queued = max_queued  # lotes sin drenar a partir de los que "Máx" espera
+        self.tick_s = tick_s
+        self.pipeline = None
+        self.position = session.t_start
+        self.finished = False
+        self.running = True
+        self._speed = speed
+        self._lock = threading.Lock()
+        self._seek_to = session.t_start  # petición pendiente, atendida por el hilo
+
+    @property
+    def speed(self):
+        return self._speed
+
+    def set_speed(self, speed):
+        """Change the rate; the cursor continues from the current position."""
+        with self._lock:
+            self._speed = speed
+            self._seek_to = self.position
+
+    def seek(self, t):
+        """Jump to session time ``t`` (index lookup, no scan)."""
+        with self._lock:
+            self._seek_to = min(max(t, self.session.t_start), self.session.t_end)
+
+    def run(self):
+        host = self.session.columns["host"]
+        pos = 0
+        anchor_wall = anchor_t = 0.0
+        while self.running:
+            with self._lock:
+                request, self._seek_to = self._seek_to, None
+            if request is not None:
+                pos = self.session.row_at(request)
+                anchor_wall, anchor_t = time.monotonic(), request
+                self.position = request
+                self.finished = False
+                if self.pipeline is not None:
+                    self.pipeline.reset()
+                # Filas anteriores al instante pedido dentro del tramo del índice
+                pos += int(np.searchsorted(np.maximum.accumulate(host[pos:pos + 2 * self.max_chunk]), request))
+            if pos >= len(self.session):
+                self.finished = True
+                time.sleep(self.tick_s)
+                continue
+
+            speed = self._speed
+            end = min(pos + self.max_chunk, len(self.session))
+            if speed is None:
+                # Máxima velocidad: solo la frena la cola hacia la GUI
+                if len(self.queue) >= self.max_queued:
+                    time.sleep(self.tick_s)
+                    continue
+                cursor = None
+            else:
+                cursor = anchor_t + (time.monotonic() - anchor_wall) * speed
+                end = pos + int(np.searchsorted(np.maximum.accumulate(host[pos:end]), cursor, side="right"))
+            if end > pos:
+                batch = self.session.read(pos, end, cursor if cursor is not None else float(np.max(host[pos:end])))
+                pos = end
+                self.position = batch.t_recv
+                if self.pipeline is not None:
+                    self.pipeline.process(batch)
+                self.queue.put(batch)
+            elif cursor is not None:
+                self.position = cursor
+            if speed is not None:
+                time.sleep(self.tick_s)
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
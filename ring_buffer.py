@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity circular store for one sensor channel.
+
+    Timestamps are float64 epoch seconds and values float32. Every sample is
+    written twice (at ``i`` and ``i + capacity``) so the retained samples are
+    always one contiguous slice and window() can return views, never copies.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._times = np.zeros(2 * self.capacity, dtype=np.float64)
+        self._values = np.zeros(2 * self.capacity, dtype=np.float32)
+        self._start = 0  # índice absoluto de la muestra más antigua retenida
+        self._end = 0    # índice absoluto siguiente a la última muestra
+
+    def __len__(self):
+        return self._end - self._start
+
+    def clear(self):
+        self._start = self._end = 0
+
+    def append(self, t, value):
+        """Append one sample in O(1), overwriting the oldest if full."""
+        pos = self._end % self.capacity
+        self._times[pos] = self._times[pos + self.capacity] = t
+        self._values[pos] = self._values[pos + self.capacity] = value
+        self._end += 1
+        if self._end - self._start > self.capacity:
+            self._start = self._end - self.capacity
+
+    def extend(self, times, values):
+        """Append a batch of samples with vectorized writes."""
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float32)
+        skip = len(times) - self.capacity
+        if skip > 0:
+            # Solo caben las últimas capacity; las anteriores cuentan como ya sobrescritas
+            self._end += skip
+            times = times[skip:]
+            values = values[skip:]
+        n = len(times)
+        if n == 0:
+            return
+        pos = (self._end + np.arange(n)) % self.capacity
+        self._times[pos] = times
+        self._times[pos + self.capacity] = times
+        self._values[pos] = values
+        self._values[pos + self.capacity] = values
+        self._end += n
+        if self._end - self._start > self.capacity:
+            self._start = self._end - self.capacity
+
+    def expire_before(self, cutoff, keep=1):
+        """Drop samples older than ``cutoff`` (always keeping ``keep`` samples)."""
+        times, _ = self.window()
+        drop = int(np.searchsorted(times, cutoff, side="left"))
+        self._start += min(drop, max(len(times) - keep, 0))
+
+    def window(self, since=None):
+        """Return (times, values) views of the retained samples newer than ``since``."""
+        first = self._start % self.capacity
+        last = first + (self._end - self._start)
+        times = self._times[first:last]
+        values = self._values[first:last]
+        if since is not None:
+            i = int(np.searchsorted(times, since, side="left"))
+            times, values = times[i:], values[i:]
+        return times, values
+
+    def last(self, default=None):
+        """Return the most recent value, or ``default`` if empty."""
+        if self._end == self._start:
+            return default
+        return float(self._values[(self._end - 1) % self.capacity])
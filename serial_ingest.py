@@ -0,0 +1,136 @@
+import collections
+import threading
+import time
+
+from binary_protocol import BinaryDecoder
+from clock_sync import ClockMapper
+from frame_parser import parse_frames
+
+
+class SPSCQueue:
+    """Bounded single-producer/single-consumer queue for sample batches.
+
+    Only the reader thread calls put() and only the GUI thread calls drain().
+    deque.append/popleft are atomic in CPython, so neither side takes a lock.
+    """
+
+    def __init__(self, maxlen=1024):
+        self._items = collections.deque()
+        self.maxlen = maxlen
+        self.dropped = 0  # lotes descartados porque el consumidor no drenó a tiempo
+
+    def put(self, item):
+        if len(self._items) >= self.maxlen:
+            self.dropped += 1
+            return False
+        self._items.append(item)
+        return True
+
+    def drain(self):
+        """Pop every batch currently queued, oldest first."""
+        pop = self._items.popleft
+        return [pop() for _ in range(len(self._items))]
+
+    def clear(self):
+        self.drain()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SerialReader(threading.Thread):
+    """Dedicated ingest thread: bulk-reads the port and queues parsed batches."""
+
+    def __init__(self, serial_conn, queue, max_chunk=65536):
+        super().__init__(daemon=True)
+        self.serial_conn = serial_conn
+        self.queue = queue
+        self.max_chunk = max_chunk
+        self.running = False
+        self._pending = b""   # trama parcial pendiente del último bloque
+        self._t_prev = None   # instante de la lectura anterior
+        self.binary = False   # decodificador en uso (True tras enviar FMT:B al firmware)
+        self._want_binary = False  # modo pedido por set_binary; feed() lo aplica
+        self.decoder = BinaryDecoder()
+        self.clock = ClockMapper()  # tick del dispositivo -> hora del host
+        self.commands = None        # CommandChannel que recibe las respuestas OK:/ERROR:
+        self.recorder = None        # SessionRecorder que guarda las muestras crudas
+        self.pipeline = None        # dsp_pipeline.Pipeline entre la ingesta y los buffers
+        self.metrics = None         # metrics.MetricsRegistry cuando la instrumentación está activa
+        self.device = None          # id de la placa cuando hay varias (device_manager.py)
+
+    def run(self):
+        self.running = True
+        conn = self.serial_conn
+        while self.running:
+            try:
+                # Bloquea hasta el timeout del puerto por el primer byte y luego
+                # vacía de una vez todo lo que ya esté en el buffer del driver.
+                data = conn.read(max(1, min(conn.in_waiting, self.max_chunk)))
+            except Exception as e:
+                if self.running:
+                    print(f"Error reading serial data: {e}")
+                break
+            if data:
+                self.feed(data)
+            if self.commands is not None:
+                self.commands.poll()
+
+    def feed(self, data, t_recv=None):
+        """Parse a raw chunk (plus any pending partial frame) and queue the batch."""
+        t_recv = time.time() if t_recv is None else t_recv
+        if self._want_binary != self.binary:
+            # El cambio de decodificador se hace aquí, en el hilo lector, entre dos bloques
+            self._pending = b""
+            self.decoder.reset()
+            self.binary = self._want_binary
+        metrics = self.metrics
+        if metrics is not None:
+            t_start = time.perf_counter()
+        if self.binary:
+            batch = self.decoder.feed(data, t_recv, self._t_prev)
+        else:
+            batch = parse_frames(self._pending + data, t_recv, self._t_prev)
+            # Sin fin de línea en mucho tiempo: basura, no se acumula sin límite
+            self._pending = batch.remainder if len(batch.remainder) <= self.max_chunk else b""
+        self._t_prev = t_recv
+        batch.device = self.device
+        if metrics is not None:
+            metrics.observe("serial.parse_ms", (time.perf_counter() - t_start) * 1000)
+            metrics.count("serial.bytes", len(data))
+            metrics.count("serial.unparsed", batch.unparsed)
+            if self.binary:
+                metrics.set("serial.crc_errors", self.decoder.crc_errors)
+                metrics.set("serial.dropped_frames", self.decoder.dropped_frames)
+        # Con tick del dispositivo, el instante real de muestreo sustituye al de llegada
+        self.clock.correct(batch)
+        if self.commands is not None:
+            for msg in batch.messages:
+                self.commands.handle_message(msg)
+        # Se graban las muestras tal como llegan, antes de cualquier filtro
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(batch)
+        # Filtros y canales derivados sobre el lote completo, en este hilo
+        pipeline = self.pipeline
+        if pipeline is not None:
+            if metrics is not None:
+                t_start = time.perf_counter()
+            pipeline.process(batch)
+            if metrics is not None:
+                metrics.observe("serial.pipeline_ms", (time.perf_counter() - t_start) * 1000)
+        if batch:
+            self.queue.put(batch)
+
+    def set_binary(self, enabled):
+        """Switch between the ASCII and binary (FMT:B) stream decoders.
+
+        Callable from any thread: it only records the request, and the next
+        ``feed`` resets the parser state and switches before parsing.
+        """
+        self._want_binary = enabled
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
@@ -0,0 +1,146 @@
+import time
+
+# Velocidades que acepta el comando BR del firmware, de mayor a menor
+STANDARD_BAUD_RATES = (921600, 460800, 230400, 115200, 57600, 38400, 19200, 9600)
+
+# Tiempo que el firmware espera el PING antes de volver a la velocidad anterior
+DEVICE_REVERT_S = 2.0
+
+# Bytes por muestra en cada formato (incluye \r\n; "í" ocupa 2 bytes en UTF-8)
+ASCII_BYTES = {"dist": len(b"TEMP:00.00\r\n"), "intensity": len("intensidad lumínica:000.00\r\n".encode("utf-8"))}
+# Sufijo ",<tick_ms>" que el firmware añade con TS:1 (por defecto); peor caso, tick uint32
+ASCII_TICK_BYTES = len(",4294967295")
+BINARY_FRAME_BYTES = 14
+BLOCK_SAMPLES = 64          # muestras por trama de bloque (ACQ:B)
+BLOCK_OVERHEAD_BYTES = 20   # cabecera de 18 bytes + CRC
+BITS_PER_BYTE = 10  # 8N1: start + 8 datos + stop
+TX_RING_BYTES = 1024  # buffer circular de transmisión del firmware (TX_TAM)
+
+
+def link_budget(baud_rate, t1_ms, t2_ms, binary=False, block=False, timestamps=True):
+    """Samples/s demanded by the T1/T2 periods versus what the link can carry.
+
+    ``block`` (DMA block acquisition) takes precedence over ``binary``;
+    ``timestamps`` is the firmware's TS setting (text samples carry a tick).
+
+    Returns a dict with ``samples_per_s`` (demanded), ``max_samples_per_s``
+    (link capacity at the current sample mix) and ``utilization`` (0..1+).
+    """
+    rate_dist = 1000.0 / max(t1_ms, 1e-3)
+    rate_lux = 1000.0 / max(t2_ms, 1e-3)
+    if block:
+        bytes_dist = bytes_lux = 2 + BLOCK_OVERHEAD_BYTES / BLOCK_SAMPLES
+    elif binary:
+        bytes_dist = bytes_lux = BINARY_FRAME_BYTES
+    else:
+        tick = ASCII_TICK_BYTES if timestamps else 0
+        bytes_dist, bytes_lux = ASCII_BYTES["dist"] + tick, ASCII_BYTES["intensity"] + tick
+    demanded = rate_dist + rate_lux
+    bytes_per_s = rate_dist * bytes_dist + rate_lux * bytes_lux
+    capacity_bytes = baud_rate / BITS_PER_BYTE
+    mean_bytes = bytes_per_s / demanded
+    return {
+        "samples_per_s": demanded,
+        "max_samples_per_s": capacity_bytes / mean_bytes,
+        "bytes_per_s": bytes_per_s,
+        "utilization": bytes_per_s / capacity_bytes,
+    }
+
+
+def reply_timeout(baud_rate, base_s=0.5):
+    """Seconds to wait for a command reply at ``baud_rate``.
+
+    The reply queues behind whatever already fills the firmware's TX ring,
+    so ``base_s`` is extended by the time to drain a full ring (about 1 s
+    at 9600 baud).
+    """
+    return base_s + TX_RING_BYTES * BITS_PER_BYTE / baud_rate
+
+
+def _read_reply(serial_conn, prefixes, timeout):
+    """Read lines until one contains any of ``prefixes``; None on timeout."""
+    deadline = time.monotonic() + timeout
+    pending = b""
+    while time.monotonic() < deadline:
+        data = serial_conn.read(max(1, serial_conn.in_waiting))
+        if not data:
+            continue
+        lines = (pending + data).split(b"\r\n")
+        pending = lines.pop()
+        for line in lines:
+            # Puede haber muestras binarias pegadas delante de la respuesta
+            for prefix in prefixes:
+                i = line.find(prefix.encode())
+                if i >= 0:
+                    return line[i:].decode("latin1", errors="replace")
+    return None
+
+
+def echo_test(serial_conn, rounds=3, timeout=0.5):
+    """Round-trip PING test at the port's current baud rate."""
+    for i in range(rounds):
+        # Solo dígitos y mayúsculas: el firmware interpreta 'a'/'b' al vuelo
+        token = f"{i:02d}0123456789ABCDEF"
+        serial_conn.write(f"PING:{token}\r\n".encode())
+        reply = _read_reply(serial_conn, ("OK:PING:", "ERROR:"), timeout)
+        if reply != f"OK:PING:{token}":
+            return False
+    return True
+
+
+def try_baud_rate(serial_conn, rate, timeout=0.5):
+    """Switch both ends to ``rate``; restore the previous rate if the echo fails."""
+    previous = serial_conn.baudrate
+    serial_conn.reset_input_buffer()
+    serial_conn.write(f"BR:{rate}\r\n".encode())
+    reply = _read_reply(serial_conn, ("OK:BR:", "ERROR:"), timeout)
+    if reply != f"OK:BR:{rate}":
+        return False
+
+    time.sleep(0.02)  # el firmware termina de transmitir y cambia BRR
+    serial_conn.baudrate = rate
+    serial_conn.reset_input_buffer()
+    if echo_test(serial_conn, timeout=timeout):
+        return True
+
+    # Sin eco: el firmware vuelve solo a la velocidad anterior tras el timeout
+    serial_conn.baudrate = previous
+    time.sleep(DEVICE_REVERT_S + 0.2)
+    serial_conn.reset_input_buffer()
+    return False
+
+
+def detect_baud_rate(serial_conn, candidates=STANDARD_BAUD_RATES, timeout=0.3):
+    """Find the rate the device currently answers PING at.
+
+    The board keeps a negotiated rate until reset, so a new session may find
+    it at a rate other than the port's. Leaves the port at the detected rate;
+    returns None if nothing answers.
+    """
+    start = serial_conn.baudrate
+    for rate in [start] + [r for r in candidates if r != start]:
+        serial_conn.baudrate = rate
+        serial_conn.reset_input_buffer()
+        if echo_test(serial_conn, rounds=1, timeout=timeout):
+            return rate
+    serial_conn.baudrate = start
+    return None
+
+
+def negotiate_baud_rate(serial_conn, candidates=STANDARD_BAUD_RATES, timeout=0.5):
+    """Move the link to the highest candidate rate that passes the echo test.
+
+    Candidates at or below the current rate are skipped. Returns the
+    effective baud rate, which is the starting rate if every attempt failed.
+    """
+    current = detect_baud_rate(serial_conn)
+    if current is None:
+        print(f"Baud negotiation: no echo from device, keeping {serial_conn.baudrate} baud")
+        return serial_conn.baudrate
+    for rate in sorted(candidates, reverse=True):
+        if rate <= current:
+            break
+        print(f"Baud negotiation: trying {rate} baud")
+        if try_baud_rate(serial_conn, rate, timeout):
+            return rate
+    return serial_conn.baudrate
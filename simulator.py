@@ -0,0 +1,227 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from frame_parser import ParsedBatch
+
+
+def reflect(x, lo, hi):
+    """Fold values into [lo, hi] by reflecting at the bounds (a bounded random walk)."""
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return np.clip(x, lo, hi)
+    width = hi - lo
+    m = np.mod(x - lo, 2 * width)
+    return lo + np.where(m <= width, m, 2 * width - m)
+
+
+class SimChannel:
+    """One simulated sensor sampled on an exact ``period_s`` schedule.
+
+    The signal is a uniform-step random walk folded into ``bounds``, plus
+    optional Gaussian ``noise``, ``spike_prob`` outliers of ``spike_amp``
+    and ``dropout`` (probability of a missing sample). Each component draws
+    from its own seeded stream, so the output does not depend on how the
+    schedule is split into batches.
+    """
+
+    def __init__(self, name, period_s, start=0.0, step=1.0, bounds=(-np.inf, np.inf),
+                 noise=0.0, dropout=0.0, spike_prob=0.0, spike_amp=0.0, seed=0):
+        self.name = name
+        self.period_s = float(period_s)
+        self.step = step
+        self.bounds = bounds
+        self.noise = noise
+        self.dropout = dropout
+        self.spike_prob = spike_prob
+        self.spike_amp = spike_amp
+        walk, noise_rng, drop, spike = np.random.SeedSequence(seed).spawn(4)
+        self._walk = np.random.default_rng(walk)
+        self._noise = np.random.default_rng(noise_rng)
+        self._drop = np.random.default_rng(drop)
+        self._spike = np.random.default_rng(spike)
+        self._x = float(start)  # posición del paseo sin plegar
+        self._anchor = None     # instante de la muestra k = 0 del periodo actual
+        self._k = 0             # próxima muestra del calendario
+
+    def start(self, t0):
+        self._anchor, self._k = float(t0), 0
+
+    def set_period(self, period_s):
+        """Change the period from the next scheduled sample on."""
+        if self._anchor is not None:
+            self._anchor += self._k * self.period_s
+            self._k = 0
+        self.period_s = float(period_s)
+
+    def generate(self, t_until):
+        """Every scheduled sample with time <= ``t_until`` not generated yet."""
+        if self._anchor is None:
+            self.start(t_until)
+        last = int(np.floor((t_until - self._anchor) / self.period_s))
+        n = max(last + 1 - self._k, 0)
+        times = self._anchor + (self._k + np.arange(n)) * self.period_s
+        self._k += n
+        if n == 0:
+            return times, np.empty(0)
+
+        walk = self._x + np.cumsum(self._walk.uniform(-self.step, self.step, n))
+        self._x = float(walk[-1])
+        values = reflect(walk, *self.bounds)
+        if self.noise:
+            values = values + self._noise.normal(0.0, self.noise, n)
+        if self.spike_prob:
+            draw = self._spike.random((n, 2))
+            spikes = draw[:, 0] < self.spike_prob
+            values = values + np.where(spikes, np.where(draw[:, 1] < 0.5, -self.spike_amp, self.spike_amp), 0.0)
+        if self.dropout:
+            keep = self._drop.random(n) >= self.dropout
+            times, values = times[keep], values[keep]
+        return times, values
+
+
+class Simulator:
+    """Set of SimChannels producing ParsedBatches like the serial parser does."""
+
+    def __init__(self, channels):
+        self.channels = {ch.name: ch for ch in channels}
+
+    def start(self, t0):
+        for ch in self.channels.values():
+            ch.start(t0)
+
+    def set_period(self, name, period_s):
+        self.channels[name].set_period(period_s)
+
+    def generate(self, t_until):
+        """ParsedBatch with every channel's samples due up to ``t_until``."""
+        batch = ParsedBatch(t_until)
+        for name, ch in self.channels.items():
+            times, values = ch.generate(t_until)
+            if len(times):
+                batch.add(name, times, values)
+        return batch
+
+
+# Paso del paseo aleatorio por unidad de tiempo de la GUI (cambios visibles en cada escala)
+UNIT_STEPS = {"µs": 0.5, "ms": 0.5, "s": 1.0, "min": 3.0}
+
+
+def dashboard_simulator(dist_period_s, lux_period_s, unit="s", seed=0, noise=0.0, dropout=0.0, spike_prob=0.0):
+    """The four dashboard channels with the same ranges the GUI always simulated."""
+    scale = UNIT_STEPS.get(unit, 1.0)
+    return Simulator([
+        SimChannel("dist", dist_period_s, start=75.0, step=scale, bounds=(10.0, 150.0),
+                   noise=noise, dropout=dropout, spike_prob=spike_prob, spike_amp=30.0, seed=seed),
+        SimChannel("lux", lux_period_s, start=50.0, step=2 * scale, bounds=(0.0, 100.0),
+                   noise=noise, dropout=dropout, spike_prob=spike_prob, spike_amp=20.0, seed=seed + 1),
+        SimChannel("temp", 0.1, start=25.0, step=0.5, bounds=(15.0, 35.0), seed=seed + 2),
+        SimChannel("intensity", 0.1, start=500.0, step=50.0, bounds=(0.0, 1000.0), seed=seed + 3),
+    ])
+
+
+class SimulatorSource(threading.Thread):
+    """Feeds a Simulator into the ingest queue in real time, like the serial reader.
+
+    Every ``tick_s`` it emits the samples scheduled since the previous
+    tick, so a 1 ms period really yields 1000 samples/s. Batches go through
+    ``pipeline`` exactly like live data.
+    """
+
+    def __init__(self, simulator, queue, tick_s=0.02):
+        super().__init__(daemon=True)
+        self.simulator = simulator
+        self.queue = queue
+        self.tick_s = tick_s
+        self.pipeline = None
+        self.running = True
+        self._lock = threading.Lock()
+
+    def set_period(self, name, period_s):
+        """Change a channel's period from any thread."""
+        with self._lock:
+            self.simulator.set_period(name, period_s)
+
+    def run(self):
+        self.simulator.start(time.time())
+        while self.running:
+            time.sleep(self.tick_s)
+            with self._lock:
+                batch = self.simulator.generate(time.time())
+            pipeline = self.pipeline
+            if pipeline is not None:
+                pipeline.process(batch)
+            if batch:
+                self.queue.put(batch)
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+
+def load_test(rate_hz, seconds, batch_s=0.1, seed=0, noise=0.0, dropout=0.0, spike_prob=0.0, max_points=2000):
+    """Push ``seconds`` of simulated data at ``rate_hz`` per sensor through the ingest stack.
+
+    Runs as fast as possible (simulated clock): generation, the host DSP
+    pipeline, PyramidHistory appends and one plot view per batch. Returns
+    a dict of throughputs.
+    """
+    from dsp_pipeline import Derivative, MovingAverage, Pipeline
+    from history import PyramidHistory
+
+    sim = dashboard_simulator(1.0 / rate_hz, 1.0 / rate_hz, seed=seed, noise=noise, dropout=dropout, spike_prob=spike_prob)
+    pipeline = Pipeline({"dist": [MovingAverage(10)]}, derived={"velocity": ("dist", [Derivative()])})
+    buffers = {name: PyramidHistory(600_000) for name in ("dist", "lux", "temp", "intensity", "velocity")}
+    t0 = 0.0
+    sim.start(t0)
+    timings = {"generate": 0.0, "pipeline": 0.0, "store": 0.0, "view": 0.0}
+    samples = 0
+    for i in range(1, int(round(seconds / batch_s)) + 1):
+        now = t0 + i * batch_s
+        a = time.perf_counter()
+        batch = sim.generate(now)
+        b = time.perf_counter()
+        pipeline.process(batch)
+        c = time.perf_counter()
+        for name, (times, values) in batch.channels.items():
+            buffers[name].extend(times, values)
+            buffers[name].expire_before(now - 60.0)
+            samples += len(times)
+        d = time.perf_counter()
+        for buf in buffers.values():
+            buf.view(now - 60.0, now, max_points)
+        timings["view"] += time.perf_counter() - d
+        timings["generate"] += b - a
+        timings["pipeline"] += c - b
+        timings["store"] += d - c
+    total = sum(timings.values())
+    return {
+        "samples": samples,
+        "elapsed_s": total,
+        "samples_per_s": samples / total,
+        "realtime_factor": seconds / total,
+        "stages_s": timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador sin GUI: prueba de carga de ingesta y gráficas")
+    parser.add_argument("--rate", type=float, default=1000.0, help="muestras/s por sensor (dist y lux)")
+    parser.add_argument("--seconds", type=float, default=60.0, help="segundos simulados")
+    parser.add_argument("--batch", type=float, default=0.1, help="segundos por lote (tick de la GUI)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--dropout", type=float, default=0.0)
+    parser.add_argument("--spikes", type=float, default=0.0, help="probabilidad de pico por muestra")
+    args = parser.parse_args()
+    result = load_test(args.rate, args.seconds, args.batch, args.seed, args.noise, args.dropout, args.spikes)
+    print(f"{result['samples']} muestras en {result['elapsed_s']:.3f} s: "
+          f"{result['samples_per_s'] / 1e6:.2f} M muestras/s, {result['realtime_factor']:.0f}x tiempo real")
+    for stage, seconds in result["stages_s"].items():
+        print(f"  {stage:9s} {seconds:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
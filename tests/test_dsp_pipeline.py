@@ -0,0 +1,18 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dsp_pipeline import LowPass, MovingAverage
+
+
+@pytest.mark.parametrize("stage", [LowPass(0.2), MovingAverage(4)], ids=["lowpass", "mean"])
+def test_recovers_after_nonfinite_sample(stage):
+    stage.process(np.arange(10.0), np.ones(10))
+    times, values = stage.process(np.array([10.0, 11.0, 12.0]), np.array([1.0, np.inf, np.nan]))
+    assert times.tolist() == [10.0]
+    times, values = stage.process(np.arange(13.0, 23.0), np.ones(10))
+    assert np.allclose(values, 1.0)
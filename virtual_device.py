@@ -0,0 +1,612 @@
+"""Virtual STM32 board on a pseudo-terminal, speaking the GraphCode.cpp protocol.
+
+    python virtual_device.py                 # crea el pty e imprime su ruta
+    python virtual_device.py --test --seconds 5 --baud 921600 --period 1 --unit m
+
+The host side of the pty behaves like the board's USB serial port: open it
+with interface.py (``--port``), debug_serial.py or any pyserial client.
+"""
+import argparse
+import os
+import select
+import termios
+import threading
+import time
+import tty
+
+import numpy as np
+
+from binary_protocol import (BLOCK_HEADER_DTYPE, FRAME_DTYPE, FRAME_LEN, crc16_ccitt, raw_to_distance,
+                             raw_to_intensity)
+from dsp_pipeline import MovingAverage
+from serial_link import BITS_PER_BYTE, BLOCK_SAMPLES, DEVICE_REVERT_S, STANDARD_BAUD_RATES
+from simulator import SimChannel
+
+# Mismos límites que el firmware
+TX_SIZE = 1024      # buffer circular de transmisión por DMA (TX_TAM)
+WIRE_LIMIT = 1 << 16  # bytes en tránsito hacia un host que no lee
+CMD_SIZE = 32       # cmd_buffer, incluido el terminador
+MAX_SAMPLES = 50    # ventana máxima de FT/FL (ST/SL)
+MAX_DECIM = 1000    # DT/DL
+CHANNEL_DIST, CHANNEL_LIGHT = 0, 1
+
+# Periodo de TIM2/TIM5 en µs por unidad de tiempo (TU)
+UNIT_US = {"u": 1, "m": 1000, "s": 1_000_000, "M": 60_000_000}
+
+BANNER = (
+    "Sistema iniciado v3.0\r\n"
+    "Enviar 'a' para iniciar, 'b' para detener\r\n"
+    "Comandos: T1:tiempo, T2:tiempo, TU:[u,m,s,M], FT:[0,1], FL:[0,1], ST:muestras, SL:muestras, DT:n, DL:n, "
+    "FMT:[A,B], BR:baudios, PING:dato, TS:[0,1], ACQ:[S,B]\r\n"
+)
+
+# Velocidad termios -> baudios, para saber a qué velocidad abrió el host el pty
+_TERMIOS_BAUD = {getattr(termios, f"B{rate}"): rate for rate in STANDARD_BAUD_RATES if hasattr(termios, f"B{rate}")}
+
+
+def encode_frames(channel, seq, ticks, raw):
+    """FMT:B sample frames (14 bytes each) as one bytes object."""
+    frames = np.zeros(len(raw), dtype=FRAME_DTYPE)
+    frames["sync"] = 0x5AA5  # bytes A5 5A
+    frames["channel"] = channel
+    frames["seq"] = seq
+    frames["tick"] = ticks
+    frames["raw"] = raw
+    rows = frames.view(np.uint8).reshape(-1, FRAME_LEN)
+    frames["crc"] = crc16_ccitt(rows[:, 2:12])
+    return frames.tobytes()
+
+
+def encode_blocks(channel, seq, first_us, period_us, raw):
+    """ACQ:B block frames, one per row of ``raw``, as a list of bytes objects.
+
+    ``first_us`` is the device time of each block's first sample in µs.
+    """
+    n, count = raw.shape
+    header = np.zeros(n, dtype=BLOCK_HEADER_DTYPE)
+    header["sync"] = 0x5BA5  # bytes A5 5B
+    header["channel"] = channel
+    header["seq"] = seq
+    header["tick"] = (first_us // 1000) & 0xFFFFFFFF
+    header["sub_us"] = first_us % 1000
+    header["period_us"] = period_us
+    header["count"] = count
+    rows = np.hstack([header.view(np.uint8).reshape(n, -1), raw.astype("<u2").view(np.uint8), np.zeros((n, 2), np.uint8)])
+    # Un solo CRC vectorizado para todos los bloques
+    crc = crc16_ccitt(rows[:, 2:-2])
+    rows[:, -2], rows[:, -1] = crc & 0xFF, crc >> 8
+    return [row.tobytes() for row in rows]
+
+
+class _Channel:
+    """Per-channel firmware state: sampling schedule, filter, decimation, sequence numbers."""
+
+    def __init__(self, sim, bits, prefix, convert):
+        self.sim = sim
+        self.max_raw = (1 << bits) - 1
+        self.prefix = prefix
+        self.convert = convert
+        self.period_us = 1_000_000
+        self.samples = 10       # ST/SL
+        self.filtered = False   # FT/FL
+        self.decim = 1          # DT/DL
+        self.seq = 0
+        self.block_seq = 0
+        self.reset_filter()
+        self.reset_decimation()
+        self.reset_block()
+
+    def reset_filter(self):
+        self.filter = MovingAverage(self.samples)
+
+    def reset_decimation(self):
+        self._dz_raw = np.empty(0, dtype=np.int64)
+        self._dz_us = np.empty(0, dtype=np.int64)
+
+    def reset_block(self):
+        self._blk_raw = np.empty(0, dtype=np.uint16)
+        self._blk_us = np.empty(0, dtype=np.int64)
+
+    def sample(self, t_until, t0):
+        """Conversions due up to ``t_until``: (µs since boot, raw ADC counts)."""
+        times, values = self.sim.generate(t_until)
+        us = np.floor((times - t0) * 1e6).astype(np.int64)
+        raw = np.clip(np.rint(values), 0, self.max_raw).astype(np.uint16)
+        return us, raw
+
+    def decimate(self, us, raw):
+        """DT/DL: mean of every ``decim`` conversions, stamped with the middle instant."""
+        if self.decim <= 1:
+            return us, raw
+        us = np.concatenate([self._dz_us, us])
+        raw = np.concatenate([self._dz_raw, raw.astype(np.int64)])
+        full = len(raw) - len(raw) % self.decim
+        self._dz_us, self._dz_raw = us[full:], raw[full:]
+        groups = raw[:full].reshape(-1, self.decim)
+        group_us = us[:full].reshape(-1, self.decim)
+        mean = (groups.sum(axis=1) + self.decim // 2) // self.decim
+        mid = group_us[:, 0] + (group_us[:, -1] - group_us[:, 0]) // 2
+        return mid, mean.astype(np.uint16)
+
+    def blocks(self, us, raw):
+        """Whole BLOCK_SAMPLES blocks completed by these conversions: (first µs of each, raw rows)."""
+        us = np.concatenate([self._blk_us, us])
+        raw = np.concatenate([self._blk_raw, raw])
+        full = len(raw) - len(raw) % BLOCK_SAMPLES
+        self._blk_us, self._blk_raw = us[full:], raw[full:]
+        return us[:full:BLOCK_SAMPLES], raw[:full].reshape(-1, BLOCK_SAMPLES)
+
+
+class VirtualDevice(threading.Thread):
+    """Python stand-in for the STM32 firmware behind a pty pair.
+
+    Implements the command set of ``GraphCode.cpp`` (a, b, T1, T2, TU, FT,
+    FL, ST, SL, DT, DL, FMT, ACQ, TS, BR, PING, STATUS) with the same
+    ``OK:``/``ERROR:``/``INFO:``/``DEBUG:`` replies, and streams ``TEMP:``
+    and ``intensidad lumínica:`` lines, binary frames or DMA blocks on the
+    T1/T2 schedule. The link is emulated too: transmission drains at
+    ``baud_rate / 10`` bytes/s out of a 1 KiB buffer and whatever does not
+    fit is dropped and counted (STATUS ``TXO``), like the DMA ring of the
+    board. With ``strict_baud`` the host must open the pty at the device's
+    rate, otherwise both directions are garbage, so BR/PING negotiation is
+    exercised for real.
+    """
+
+    def __init__(self, baud_rate=9600, seed=0, noise=0.0, strict_baud=True, tick_s=0.001):
+        super().__init__(daemon=True)
+        self.baud_rate = baud_rate
+        self.strict_baud = strict_baud
+        self.tick_s = tick_s
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self._set_host_speed(baud_rate)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+
+        self.channels = {
+            CHANNEL_DIST: _Channel(SimChannel("dist", 1.0, start=1200.0, step=4.0, bounds=(400.0, 3000.0),
+                                              noise=noise, seed=seed), 12, "TEMP:", raw_to_distance),
+            CHANNEL_LIGHT: _Channel(SimChannel("light", 1.0, start=500.0, step=2.0, bounds=(0.0, 990.0),
+                                               noise=noise, seed=seed + 1), 10, "intensidad lumínica:", raw_to_intensity),
+        }
+        self.acquiring = False  # flag
+        self.time_unit = "s"
+        self.times = {CHANNEL_DIST: 1, CHANNEL_LIGHT: 1}  # T1/T2 en unidades de TU
+        self.fmt = "A"
+        self.acq = "S"
+        self.send_tick = 1
+        self.tx_overruns = 0    # tx_desbordes
+        self.bytes_sent = 0
+        self._rx_line = b""
+        self._commands = []
+        self._tx = bytearray()
+        self._credit = 0.0      # bytes que el USART ya pudo sacar del buffer
+        self._t_wire = time.monotonic()
+        self._wire = bytearray()  # bytes transmitidos aún no entregados al pty
+        self._baud_next = None  # BR aceptado, se aplica al vaciar la transmisión
+        self._baud_previous = baud_rate
+        self._br_deadline = None
+        self._lock = threading.Lock()
+        self.running = True
+        self._t0 = time.monotonic()
+        for ch in self.channels.values():
+            ch.sim.start(self._t0 + ch.period_us / 1e6)
+        self._send(BANNER.encode("utf-8"))
+
+    def _set_host_speed(self, rate):
+        attrs = termios.tcgetattr(self._slave)
+        speed = getattr(termios, f"B{rate}")
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(self._slave, termios.TCSANOW, attrs)
+
+    def host_baud_rate(self):
+        """Rate the host configured on its end of the pty (None if non-standard)."""
+        return _TERMIOS_BAUD.get(termios.tcgetattr(self._slave)[5])
+
+    def tick_ms(self, now=None):
+        now = time.monotonic() if now is None else now
+        return int((now - self._t0) * 1000) & 0xFFFFFFFF
+
+    # ----- Transmisión -----
+
+    def _send(self, data):
+        """Queue ``data`` whole or drop it (UART_Send_Bytes)."""
+        if len(data) > TX_SIZE - 1 - len(self._tx):
+            self.tx_overruns += 1
+            return False
+        self._tx += data
+        return True
+
+    def _send_text(self, text):
+        self._send(text.encode("utf-8"))
+
+    def _advance(self, t):
+        """Move what the USART transmitted up to instant ``t`` from the TX buffer to the wire."""
+        if t > self._t_wire:
+            self._credit += (t - self._t_wire) * self.baud_rate / BITS_PER_BYTE
+            self._t_wire = t
+        n = min(int(self._credit), len(self._tx))
+        if n:
+            self._wire += self._tx[:n]
+            del self._tx[:n]
+            self.bytes_sent += n
+        if self._tx:
+            self._credit -= n
+        else:
+            self._credit = 0.0  # la línea en reposo no acumula crédito
+
+    def _deliver(self, matched):
+        """Write the transmitted bytes to the pty."""
+        if not self._wire:
+            return
+        # Con velocidades distintas en cada extremo el host solo ve basura
+        chunk = bytes(self._wire) if matched else b"\xff" * len(self._wire)
+        try:
+            n = os.write(self._master, chunk)
+        except BlockingIOError:
+            n = 0
+        except OSError:
+            n = len(chunk)  # host cerrado: el USART transmite igual
+        del self._wire[:n]
+        if len(self._wire) > WIRE_LIMIT:
+            # Nadie lee el puerto: lo más antiguo se pierde, como en una UART real
+            del self._wire[:len(self._wire) - WIRE_LIMIT]
+
+    # ----- Recepción y comandos -----
+
+    def _receive(self, data):
+        """USART3_IRQHandler: 'a'/'b' act at once, the rest is split into lines."""
+        for byte in data:
+            if byte == ord("a"):
+                self.acquiring = True
+                self._commands.append("a")
+            elif byte == ord("b"):
+                self.acquiring = False
+                self._commands.append("b")
+            elif byte in (ord("\r"), ord("\n")):
+                if self._rx_line:
+                    self._commands.append(self._rx_line.decode("latin1"))
+                    self._rx_line = b""
+            elif len(self._rx_line) < CMD_SIZE - 1:
+                self._rx_line += bytes([byte])
+
+    def press_button(self):
+        """User button (EXTI13): toggles acquisition and reports it."""
+        with self._lock:
+            self.acquiring = not self.acquiring
+            state = "started" if self.acquiring else "stopped"
+            self._send_text(f"INFO:Button pressed - acquisition {state}\r\n")
+
+    def status_line(self):
+        dist, light = self.channels[CHANNEL_DIST], self.channels[CHANNEL_LIGHT]
+        return (f"INFO:STATUS:T1={self.times[CHANNEL_DIST]},T2={self.times[CHANNEL_LIGHT]},TU={self.time_unit},"
+                f"FT={int(dist.filtered)},FL={int(light.filtered)},ST={dist.samples},SL={light.samples},"
+                f"RUN={int(self.acquiring)},FMT={self.fmt},BR={self.baud_rate},TS={self.send_tick},"
+                f"TXO={self.tx_overruns},ACQ={self.acq},DT={dist.decim},DL={light.decim}\r\n")
+
+    def handle_command(self, cmd):
+        """procesar_comando: one complete command line."""
+        kind, _, value = cmd.partition(":")
+        value = value.strip("\r\n")
+        if kind == "STATUS":
+            self._send_text(self.status_line())
+            return
+        if kind in ("a", "b"):
+            self.acquiring = kind == "a"
+            self._send_text(f"OK:{kind}\r\n")
+            return
+        if not value:
+            self._send_text(f"ERROR:{kind}:Valor requerido\r\n")
+            return
+
+        if kind in ("T1", "T2"):
+            val = _atoi(value)
+            if val > 0:
+                channel = CHANNEL_DIST if kind == "T1" else CHANNEL_LIGHT
+                self.times[channel] = val
+                what = "distancia sharp" if kind == "T1" else "intensidad lumínica"
+                self._send_text(f"OK:{kind}:{val}\r\n")
+                self._send_text(f"DEBUG:Tiempo {what} actualizado a {val} {self.time_unit}\r\n")
+        elif kind == "TU":
+            if value[0] in UNIT_US:
+                self.time_unit = value[0]
+                self._send_text(f"OK:TU:{self.time_unit}\r\n")
+                self._send_text(f"DEBUG:Unidad de tiempo actualizada a {self.time_unit}\r\n")
+        elif kind in ("FT", "FL"):
+            ch = self.channels[CHANNEL_DIST if kind == "FT" else CHANNEL_LIGHT]
+            ch.filtered = _atoi(value) != 0
+            ch.reset_filter()
+            self._send_text(f"OK:{kind}:{int(ch.filtered)}\r\n")
+        elif kind in ("ST", "SL"):
+            val = _atoi(value)
+            if 0 < val <= MAX_SAMPLES:
+                ch = self.channels[CHANNEL_DIST if kind == "ST" else CHANNEL_LIGHT]
+                ch.samples = val
+                ch.reset_filter()
+                self._send_text(f"OK:{kind}:{val}\r\n")
+        elif kind in ("DT", "DL"):
+            val = _atoi(value)
+            if 0 < val <= MAX_DECIM:
+                ch = self.channels[CHANNEL_DIST if kind == "DT" else CHANNEL_LIGHT]
+                ch.decim = val
+                ch.reset_decimation()
+                self._send_text(f"OK:{kind}:{val}\r\n")
+            else:
+                self._send_text(f"ERROR:{kind}:Fuera de rango (1-{MAX_DECIM})\r\n")
+        elif kind == "BR":
+            val = _atoi(value)
+            if val in STANDARD_BAUD_RATES:
+                self._send_text(f"OK:BR:{val}\r\n")
+                if self._br_deadline is None:
+                    self._baud_previous = self.baud_rate
+                self._baud_next = val  # UART_Set_Baud espera a vaciar la transmisión
+            else:
+                self._send_text(f"ERROR:BR:Baudios no soportados: {value}\r\n")
+        elif kind == "PING":
+            self._br_deadline = None
+            self._send_text(f"OK:PING:{value[:24]}\r\n")
+        elif kind == "TS":
+            if value in ("0", "1"):
+                self.send_tick = int(value)
+                self._send_text(f"OK:TS:{value}\r\n")
+            else:
+                self._send_text(f"ERROR:TS:Valor invalido: {value}\r\n")
+        elif kind == "ACQ":
+            if value[0] in "SB":
+                self.acq = value[0]
+                for ch in self.channels.values():
+                    ch.reset_block()
+                self._send_text(f"OK:ACQ:{self.acq}\r\n")
+            else:
+                self._send_text(f"ERROR:ACQ:Modo de adquisicion invalido: {value}\r\n")
+        elif kind == "FMT":
+            if value[0] in "AB":
+                self._send_text(f"OK:FMT:{value[0]}\r\n")
+                if self.fmt != value[0]:
+                    for ch in self.channels.values():
+                        ch.seq = 0
+                self.fmt = value[0]
+            else:
+                self._send_text(f"ERROR:FMT:Formato invalido: {value}\r\n")
+        else:
+            self._send_text(f"ERROR:{kind}:Comando desconocido\r\n")
+
+    def _update_timers(self, now):
+        """actualizar_timers: restart a channel's schedule when its period changes."""
+        factor = UNIT_US[self.time_unit]
+        names = {CHANNEL_DIST: "temp", CHANNEL_LIGHT: "intensidad lumínica"}
+        for channel, ch in self.channels.items():
+            period = min(max(self.times[channel] * factor, 1), 0xFFFFFFFF)
+            if period != ch.period_us:
+                ch.period_us = period
+                ch.sim.set_period(period / 1e6)
+                ch.sim.start(now + period / 1e6)
+                self._send_text(f"INFO:Timer {names[channel]} actualizado: {period} us\r\n")
+
+    # ----- Muestreo -----
+
+    def _acquire(self, now):
+        """Everything TIM2/TIM5 (or the ADC DMA) produced up to ``now``, queued for TX."""
+        messages = []  # (µs, bytes) en orden de muestreo
+        free = TX_SIZE - 1 - len(self._tx)
+        for channel, ch in self.channels.items():
+            us, raw = ch.sample(now, self._t0)
+            if not self.acquiring or len(raw) == 0:
+                continue
+            # Solo se codifica lo que puede caber: el resto se descarta igual,
+            # consumiendo su número de secuencia como en la placa
+            if self.acq == "B":
+                first_us, rows = ch.blocks(us, raw)
+                seq = (ch.block_seq + np.arange(len(rows))) & 0xFFFF
+                ch.block_seq += len(rows)
+                room = free // (BLOCK_HEADER_DTYPE.itemsize + 2 * BLOCK_SAMPLES + 2)
+                self.tx_overruns += max(len(rows) - room, 0)
+                if room and len(rows):
+                    blocks = encode_blocks(channel, seq[:room], first_us[:room], ch.period_us, rows[:room])
+                    messages.extend(zip(first_us[:room].tolist(), blocks))
+                continue
+
+            us, raw = ch.decimate(us, raw)
+            if len(raw) == 0:
+                continue
+            ticks = us // 1000
+            if self.fmt == "B":
+                seq = (ch.seq + np.arange(len(raw))) & 0xFFFF
+                ch.seq += len(raw)
+                room = free // FRAME_LEN
+                self.tx_overruns += max(len(raw) - room, 0)
+                data = encode_frames(channel, seq[:room], ticks[:room] & 0xFFFFFFFF, raw[:room])
+                messages.extend((t, data[i * FRAME_LEN:(i + 1) * FRAME_LEN])
+                                for i, t in enumerate(us[:room].tolist()))
+                continue
+
+            values = ch.convert(raw.astype(np.float64))
+            if ch.filtered:
+                _, values = ch.filter.process(ticks, values)
+            room = free // len(ch.prefix) + 1
+            self.tx_overruns += max(len(values) - room, 0)
+            for t, tick, value in zip(us[:room].tolist(), ticks[:room].tolist(), values[:room].tolist()):
+                line = f"{ch.prefix}{value:.2f},{tick}\r\n" if self.send_tick else f"{ch.prefix}{value:.2f}\r\n"
+                messages.append((t, line.encode("utf-8")))
+
+        # Cada mensaje entra en el buffer en su instante, con lo transmitido hasta entonces ya fuera
+        messages.sort(key=lambda m: m[0])
+        for t, data in messages:
+            self._advance(self._t0 + t / 1e6)
+            self._send(data)
+
+    def run(self):
+        while self.running:
+            readable, _, _ = select.select([self._master], [], [], self.tick_s)
+            now = time.monotonic()
+            with self._lock:
+                matched = not self.strict_baud or self.host_baud_rate() == self.baud_rate
+                if readable:
+                    try:
+                        data = os.read(self._master, 4096)
+                    except OSError:
+                        data = b""  # host aún sin abrir o recién cerrado
+                    if matched:
+                        self._receive(data)
+
+                self._acquire(now)
+                self._advance(now)
+                if self._baud_next is None and self._commands:
+                    while self._commands and self._baud_next is None:
+                        self.handle_command(self._commands.pop(0))
+                    self._update_timers(now)
+                    self._advance(now)
+                self._deliver(matched)
+
+                if self._baud_next is not None and not self._tx:
+                    self.baud_rate, self._baud_next = self._baud_next, None
+                    self._br_deadline = now + DEVICE_REVERT_S
+                elif self._br_deadline is not None and now > self._br_deadline and not self._tx:
+                    # BR sin PING de confirmación: vuelve a la velocidad anterior
+                    self._br_deadline = None
+                    self.baud_rate = self._baud_previous
+                    self._send_text(f"INFO:BR revertido a {self.baud_rate}\r\n")
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def _atoi(text):
+    """C ``atoi``: leading integer of ``text``, 0 if none."""
+    digits = ""
+    for i, c in enumerate(text.strip()):
+        if c.isdigit() or (i == 0 and c in "+-"):
+            digits += c
+        else:
+            break
+    try:
+        return int(digits)
+    except ValueError:
+        return 0
+
+
+def throughput_test(seconds=5.0, period=1, unit="m", baud=921600, fmt="A", acq="S", pings=20, seed=0):
+    """Drive the virtual board through the real host stack and measure it.
+
+    Opens the pty with pyserial, negotiates ``baud`` with BR/PING, then runs
+    SerialReader + CommandChannel exactly as interface.py does. Returns
+    samples/s received per channel, drops (TX overruns on the device, frame
+    sequence gaps on the host) and command round-trip latency.
+    """
+    import serial
+
+    from command_channel import CommandChannel, parse_status
+    from serial_ingest import SerialReader, SPSCQueue
+    from serial_link import try_baud_rate
+
+    device = VirtualDevice(seed=seed)
+    device.start()
+    conn = serial.Serial(device.port, baudrate=9600, timeout=0.05)
+    reader = None
+    try:
+        conn.reset_input_buffer()
+        if baud != conn.baudrate and not try_baud_rate(conn, baud):
+            raise RuntimeError(f"Sin eco a {baud} baudios")
+        queue = SPSCQueue(maxlen=1 << 16)
+        reader = SerialReader(conn, queue)
+        reader.commands = CommandChannel(conn)
+        reader.set_binary(fmt == "B" or acq == "B")
+        reader.start()
+        send = reader.commands.send
+        for cmd in (f"TU:{unit}", f"T1:{period}", f"T2:{period}", f"FMT:{fmt}", f"ACQ:{acq}", "a"):
+            send(cmd).result(2.0)
+        queue.clear()
+
+        counts, latencies, lost = {}, [], []
+
+        def on_reply(future, sent):
+            if future.exception() is None:
+                latencies.append((time.perf_counter() - sent) * 1000)
+            else:
+                lost.append(future)  # con el enlace saturado la respuesta se descarta como en la placa
+
+        start = time.monotonic()
+        for i in range(pings):
+            # PING repartidos a lo largo de la prueba, sin bloquear la lectura
+            while time.monotonic() < start + i * seconds / pings:
+                for batch in queue.drain():
+                    for name, (times, _) in batch.channels.items():
+                        counts[name] = counts.get(name, 0) + len(times)
+                time.sleep(0.005)
+            sent = time.perf_counter()
+            send(f"PING:{i:04d}").add_done_callback(lambda f, sent=sent: on_reply(f, sent))
+        while time.monotonic() < start + seconds:
+            for batch in queue.drain():
+                for name, (times, _) in batch.channels.items():
+                    counts[name] = counts.get(name, 0) + len(times)
+            time.sleep(0.005)
+        elapsed = time.monotonic() - start
+        bytes_sent = device.bytes_sent
+        send("b").result(5.0)
+        status = parse_status(send("STATUS").result(5.0))
+    finally:
+        if reader is not None:
+            reader.stop()
+        conn.close()
+        device.stop()
+
+    return {
+        "samples_per_s": {name: n / elapsed for name, n in counts.items()},
+        "demanded_per_s": 2 * 1e6 / (period * UNIT_US[unit]),
+        "tx_overruns": status.get("TXO"),
+        "dropped_frames": reader.decoder.dropped_frames,
+        "bytes_per_s": bytes_sent / elapsed,
+        "ping_ms": {"median": float(np.median(latencies)), "max": float(np.max(latencies))} if latencies else None,
+        "pings_lost": len(lost),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Placa STM32 virtual sobre un pseudo-terminal")
+    parser.add_argument("--baud", type=int, default=9600, help="velocidad inicial (o la de la prueba con --test)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--noise", type=float, default=0.0, help="ruido gaussiano en cuentas del ADC")
+    parser.add_argument("--link", help="enlace simbólico estable hacia el pty (p. ej. /tmp/stm32)")
+    parser.add_argument("--test", action="store_true", help="prueba de rendimiento de extremo a extremo y salir")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--period", type=int, default=1, help="T1 y T2 de la prueba")
+    parser.add_argument("--unit", choices=sorted(UNIT_US), default="m", help="TU de la prueba")
+    parser.add_argument("--fmt", choices=("A", "B"), default="A")
+    parser.add_argument("--acq", choices=("S", "B"), default="S")
+    args = parser.parse_args()
+
+    if args.test:
+        result = throughput_test(args.seconds, args.period, args.unit, args.baud, args.fmt, args.acq, seed=args.seed)
+        for key, value in result.items():
+            print(f"{key}: {value}")
+        return
+
+    device = VirtualDevice(baud_rate=args.baud, seed=args.seed, noise=args.noise)
+    port = device.port
+    if args.link:
+        if os.path.islink(args.link):
+            os.remove(args.link)
+        os.symlink(device.port, args.link)
+        port = args.link
+    device.start()
+    print(f"Placa virtual en {port} ({args.baud} baudios). Ctrl+C para salir.")
+    try:
+        while device.is_alive():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.stop()
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+
+
+if __name__ == "__main__":
+    main()